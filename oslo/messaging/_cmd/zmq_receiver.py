@@ -24,6 +24,7 @@ import sys
 from oslo.config import cfg
 
 from oslo.messaging._drivers import impl_zmq
+from oslo.messaging._drivers import zmq_proxy
 from oslo.messaging._executors import impl_eventlet  # FIXME(markmc)
 
 CONF = cfg.CONF
@@ -35,6 +36,15 @@ def main():
     CONF(sys.argv[1:], project='oslo')
     logging.basicConfig(level=logging.DEBUG)
 
-    with contextlib.closing(impl_zmq.ZmqProxy(CONF)) as reactor:
+    if CONF.rpc_zmq_proxy_workers or CONF.rpc_zmq_concurrency == 'native':
+        # Threads are green threads once monkey patched, and the blocking
+        # calls of the workers would hold up each other, so the workers
+        # run as processes.
+        CONF.set_override('rpc_zmq_proxy_use_processes', True)
+        proxy = zmq_proxy.ZmqProxyDevice(CONF)
+    else:
+        proxy = impl_zmq.ZmqProxy(CONF)
+
+    with contextlib.closing(proxy) as reactor:
         reactor.consume_in_thread()
         reactor.wait()
@@ -25,6 +25,7 @@ uses AMQP, but is deprecated and predates this code.
 
 import collections
 import logging
+import os
 import threading
 import uuid
 
@@ -106,11 +107,15 @@ class ConnectionContext(rpc_common.Connection):
     deleted.  With that we can return Connections to the pool on exceptions
     and so forth without making the caller be responsible for catching them.
     If possible the function makes sure to return a connection to the pool.
+
+    A context inherited by a forked child is left alone, since its connection
+    is still in use by the parent.
     """
 
     def __init__(self, conf, connection_pool, pooled=True, server_params=None):
         """Create a new connection, or get one from the pool."""
         self.connection = None
+        self._pid = os.getpid()
         self.conf = conf
         self.connection_pool = connection_pool
         if pooled:
@@ -130,7 +135,11 @@ class ConnectionContext(rpc_common.Connection):
         If it did not come from a pool, close it.
         """
         if self.connection:
-            if self.pooled:
+            if self._pid != os.getpid():
+                # Neither reset nor close the socket of the parent, nor let
+                # the connection be collected, which would close it.
+                pool._inherited.append(self.connection)
+            elif self.pooled:
                 # Reset the connection so it's ready for the next caller
                 # to grab from the pool
                 self.connection.reset()
@@ -15,8 +15,11 @@
 
 __all__ = ['AMQPDriverBase']
 
+import functools
 import logging
+import os
 import threading
+import time
 import uuid
 
 from six import moves
@@ -25,9 +28,18 @@ from oslo import messaging
 from oslo.messaging._drivers import amqp as rpc_amqp
 from oslo.messaging._drivers import base
 from oslo.messaging._drivers import common as rpc_common
+from oslo.messaging.openstack.common import excutils
 
 LOG = logging.getLogger(__name__)
 
+# Upper bound, in seconds, on how long the reply polling thread blocks, so
+# that calls made with send_async() time out promptly.
+_REPLY_POLL_INTERVAL = 1.0
+
+# Upper bound, in seconds, on how long the consumer threads of a listener
+# with several connections block before acknowledging received messages.
+_CONSUME_INTERVAL = 0.1
+
 
 class AMQPIncomingMessage(base.IncomingMessage):
 
@@ -90,24 +102,125 @@ class AMQPListener(base.Listener):
         self.incoming = []
 
     def __call__(self, message):
+        self.incoming.append(self._to_incoming(message))
+
+    def _to_incoming(self, message):
         # FIXME(markmc): logging isn't driver specific
         rpc_common._safe_log(LOG.debug, 'received %s', dict(message))
 
         unique_id = self.msg_id_cache.check_duplicate_message(message)
         ctxt = rpc_amqp.unpack_context(self.conf, message)
 
-        self.incoming.append(AMQPIncomingMessage(self,
-                                                 ctxt.to_dict(),
-                                                 message,
-                                                 unique_id,
-                                                 ctxt.msg_id,
-                                                 ctxt.reply_q))
-
-    def poll(self):
+        return AMQPIncomingMessage(self,
+                                   ctxt.to_dict(),
+                                   message,
+                                   unique_id,
+                                   ctxt.msg_id,
+                                   ctxt.reply_q)
+
+    def consumers(self):
+        """Return the connections to declare consumers on, and callbacks."""
+        return [(self.conn, self)]
+
+    def poll(self, timeout=None):
+        deadline = None
+        if timeout is not None:
+            deadline = time.time() + timeout
         while True:
             if self.incoming:
                 return self.incoming.pop(0)
-            self.conn.consume(limit=1)
+            if deadline is None:
+                self.conn.consume(limit=1)
+                continue
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return None
+            try:
+                self.conn.consume(limit=1, timeout=remaining)
+            except rpc_common.Timeout:
+                return None
+
+
+class _AMQPConsumer(object):
+    """Consumes messages from one of the connections of a listener."""
+
+    def __init__(self, listener, conn):
+        self.listener = listener
+        self.conn = conn
+        self.deferred = moves.queue.Queue()
+
+    def __call__(self, message):
+        incoming = self.listener._to_incoming(message)
+        # Connections can't be used from several threads, messages are
+        # acknowledged and requeued by the thread consuming from theirs.
+        incoming.acknowledge_callback = functools.partial(
+            self.deferred.put, message.acknowledge)
+        incoming.requeue_callback = functools.partial(
+            self.deferred.put, message.requeue)
+        self.listener.incoming.put(incoming)
+
+    @excutils.forever_retry_uncaught_exceptions
+    def run(self):
+        while not self.listener.stopped.is_set():
+            self._run_deferred()
+            try:
+                self.conn.consume(limit=1, timeout=_CONSUME_INTERVAL)
+            except rpc_common.Timeout:
+                pass
+
+    def _run_deferred(self):
+        while not self.deferred.empty():
+            self.deferred.get()()
+
+    def close(self):
+        self._run_deferred()
+        # The messages which weren't acknowledged go back to their queues.
+        self.conn.close()
+
+
+class AMQPConsumersListener(AMQPListener):
+    """A listener consuming from the same queues on several connections.
+
+    Each connection is consumed from by a thread of its own, which decodes
+    the messages and queues them for poll(), so that a server isn't limited
+    by the throughput of one connection.
+    """
+
+    def __init__(self, driver, conns):
+        super(AMQPConsumersListener, self).__init__(driver, conns[0])
+        self.incoming = moves.queue.Queue()
+        self._consumers = [_AMQPConsumer(self, conn) for conn in conns]
+        self._threads = []
+        self._lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def consumers(self):
+        return [(consumer.conn, consumer) for consumer in self._consumers]
+
+    def _start_consumers(self):
+        with self._lock:
+            if self._threads:
+                return
+            for consumer in self._consumers:
+                thread = threading.Thread(target=consumer.run)
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+
+    def poll(self, timeout=None):
+        self._start_consumers()
+        try:
+            return self.incoming.get(timeout=timeout)
+        except moves.queue.Empty:
+            return None
+
+    def cleanup(self):
+        self.stopped.set()
+        with self._lock:
+            for thread in self._threads:
+                thread.join()
+            for consumer in self._consumers:
+                consumer.close()
 
 
 class ReplyWaiters(object):
@@ -158,6 +271,47 @@ class ReplyWaiters(object):
         del self._queues[msg_id]
 
 
+class ReplyCallback(object):
+
+    """Collects the reply to a message sent with send_async().
+
+    It takes the place of the queue of a calling thread in ReplyWaiters, so
+    replies are passed to it by whichever thread polls the reply queue.
+    """
+
+    def __init__(self, waiter, msg_id, callback, timeout):
+        self.waiter = waiter
+        self.msg_id = msg_id
+        self.callback = callback
+        self.deadline = None
+        if timeout is not None:
+            self.deadline = time.time() + timeout
+        self.result = None
+
+    def put(self, message_data):
+        if message_data is ReplyWaiters.WAKE_UP:
+            return
+
+        reply, ending = self.waiter._process_reply(message_data)
+        if not ending:
+            self.result = reply
+        else:
+            self.done(self.result)
+
+    def done(self, result):
+        # The reply may arrive as the call times out, only the first of
+        # them is passed on.
+        if not self.waiter.unlisten_async(self.msg_id):
+            return
+        try:
+            if isinstance(result, Exception):
+                self.callback(failure=result)
+            else:
+                self.callback(reply=result)
+        except Exception:
+            LOG.exception("Unhandled exception in reply callback")
+
+
 class ReplyWaiter(object):
 
     def __init__(self, conf, reply_q, conn, allowed_remote_exmods):
@@ -170,6 +324,13 @@ class ReplyWaiter(object):
         self.incoming = []
         self.msg_id_cache = rpc_amqp._MsgIdCache()
         self.waiters = ReplyWaiters()
+        # The callbacks are added and removed by the calling threads while
+        # the polling thread expires them.
+        self.callbacks = {}
+        self._callbacks_lock = threading.Lock()
+
+        self._poller = None
+        self._poller_lock = threading.Lock()
 
         conn.declare_direct_consumer(reply_q, self)
 
@@ -184,6 +345,65 @@ class ReplyWaiter(object):
     def unlisten(self, msg_id):
         self.waiters.remove(msg_id)
 
+    def listen_async(self, msg_id, callback, timeout):
+        reply = ReplyCallback(self, msg_id, callback, timeout)
+        with self._callbacks_lock:
+            self.callbacks[msg_id] = reply
+            self.waiters.add(msg_id, reply)
+        self._start_poller()
+
+    def unlisten_async(self, msg_id):
+        """Stop waiting for a reply, return whether we were waiting."""
+        with self._callbacks_lock:
+            if self.callbacks.pop(msg_id, None) is None:
+                return False
+            self.waiters.remove(msg_id)
+        return True
+
+    def _start_poller(self):
+        with self._poller_lock:
+            if self._poller is not None:
+                return
+            self._poller = threading.Thread(target=self._poll_forever)
+            self._poller.daemon = True
+            self._poller.start()
+
+    @excutils.forever_retry_uncaught_exceptions
+    def _poll_forever(self):
+        # No thread waits for the replies to send_async() calls, so this
+        # thread takes over polling the connection for good. The calling
+        # threads of send() then get their replies passed on by it.
+        with self.conn_lock:
+            while True:
+                while self.incoming:
+                    message_data = self.incoming.pop(0)
+                    msg_id = message_data.pop('_msg_id', None)
+                    self.waiters.put(msg_id, message_data)
+
+                timeout = self._expire_callbacks()
+                try:
+                    self.conn.consume(limit=1, timeout=timeout)
+                except rpc_common.Timeout:
+                    pass
+
+    def _expire_callbacks(self):
+        """Time out callbacks, return how long until the next one expires."""
+        now = time.time()
+        timeout = _REPLY_POLL_INTERVAL
+        with self._callbacks_lock:
+            replies = list(self.callbacks.values())
+        for reply in replies:
+            if reply.deadline is None:
+                continue
+            if reply.deadline <= now:
+                reply.done(messaging.MessagingTimeout(
+                    'Timed out waiting for a reply to message ID %s'
+                    % reply.msg_id))
+            else:
+                timeout = min(timeout, reply.deadline - now)
+        # A zero timeout would not wait for replies at all.
+        return max(timeout, 0.01)
+
     def _process_reply(self, data):
         result = None
         ending = False
@@ -305,6 +525,10 @@ class AMQPDriverBase(base.BaseDriver):
 
         self._connection_pool = connection_pool
 
+        self._init_reply_q()
+
+    def _init_reply_q(self):
+        self._pid = os.getpid()
         self._reply_q_lock = threading.Lock()
         self._reply_q = None
         self._reply_q_conn = None
@@ -341,6 +565,12 @@ class AMQPDriverBase(base.BaseDriver):
                                           server_params=server_params)
 
     def _get_reply_q(self):
+        # The reply queue of the parent is consumed by its waiter thread,
+        # which does not exist in a forked child, so the child declares its
+        # own.
+        if self._pid != os.getpid():
+            self._init_reply_q()
+
         with self._reply_q_lock:
             if self._reply_q is not None:
                 return self._reply_q
@@ -359,7 +589,7 @@ class AMQPDriverBase(base.BaseDriver):
 
     def _send(self, target, ctxt, message,
               wait_for_reply=None, timeout=None,
-              envelope=True, notify=False):
+              envelope=True, notify=False, callback=None):
 
         # FIXME(markmc): remove this temporary hack
         class Context(object):
@@ -372,7 +602,7 @@ class AMQPDriverBase(base.BaseDriver):
         context = Context(ctxt)
         msg = message
 
-        if wait_for_reply:
+        if wait_for_reply or callback:
             msg_id = uuid.uuid4().hex
             msg.update({'_msg_id': msg_id})
             LOG.debug('MSG_ID is %s' % (msg_id))
@@ -386,6 +616,8 @@ class AMQPDriverBase(base.BaseDriver):
 
         if wait_for_reply:
             self._waiter.listen(msg_id)
+        elif callback:
+            self._waiter.listen_async(msg_id, callback, timeout)
 
         try:
             with self._get_connection() as conn:
@@ -404,6 +636,10 @@ class AMQPDriverBase(base.BaseDriver):
                 if isinstance(result, Exception):
                     raise result
                 return result
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                if callback:
+                    self._waiter.unlisten_async(msg_id)
         finally:
             if wait_for_reply:
                 self._waiter.unlisten(msg_id)
@@ -411,30 +647,43 @@ class AMQPDriverBase(base.BaseDriver):
     def send(self, target, ctxt, message, wait_for_reply=None, timeout=None):
         return self._send(target, ctxt, message, wait_for_reply, timeout)
 
+    def send_async(self, target, ctxt, message, callback, timeout=None):
+        self._send(target, ctxt, message, timeout=timeout, callback=callback)
+
     def send_notification(self, target, ctxt, message, version):
         return self._send(target, ctxt, message,
                           envelope=(version == 2.0), notify=True)
 
-    def listen(self, target):
-        conn = self._get_connection(pooled=False)
-
-        listener = AMQPListener(self, conn)
-
-        conn.declare_topic_consumer(target.topic, listener)
-        conn.declare_topic_consumer('%s.%s' % (target.topic, target.server),
-                                    listener)
-        conn.declare_fanout_consumer(target.topic, listener)
+    def _listener(self, consumers):
+        if consumers > 1:
+            return AMQPConsumersListener(
+                self, [self._get_connection(pooled=False)
+                       for i in moves.range(consumers)])
+        return AMQPListener(self, self._get_connection(pooled=False))
+
+    def listen(self, target, consumers=1):
+        listener = self._listener(consumers)
+
+        for i, (conn, callback) in enumerate(listener.consumers()):
+            conn.declare_topic_consumer(target.topic, callback)
+            conn.declare_topic_consumer('%s.%s' % (target.topic,
+                                                   target.server),
+                                        callback)
+            # Each fanout consumer gets a copy of the messages.
+            if i == 0:
+                conn.declare_fanout_consumer(target.topic, callback)
 
         return listener
 
-    def listen_for_notifications(self, targets_and_priorities):
-        conn = self._get_connection(pooled=False)
+    def listen_for_notifications(self, targets_and_priorities, consumers=1):
+        listener = self._listener(consumers)
 
-        listener = AMQPListener(self, conn)
-        for target, priority in targets_and_priorities:
-            conn.declare_topic_consumer('%s.%s' % (target.topic, priority),
-                                        callback=listener,
-                                        exchange_name=target.exchange)
+        for conn, callback in listener.consumers():
+            for target, priority in targets_and_priorities:
+                conn.declare_topic_consumer('%s.%s' % (target.topic,
+                                                       priority),
+                                            callback=callback,
+                                            exchange_name=target.exchange)
         return listener
 
     def cleanup(self):
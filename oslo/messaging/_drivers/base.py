@@ -14,6 +14,7 @@
 #    under the License.
 
 import abc
+import threading
 
 import six
 
@@ -53,8 +54,15 @@ class Listener(object):
         self.driver = driver
 
     @abc.abstractmethod
-    def poll(self):
-        "Blocking until a message is pending and return IncomingMessage."
+    def poll(self, timeout=None):
+        """Blocking until a message is pending and return IncomingMessage.
+
+        If timeout isn't None, None is returned once timeout seconds passed
+        without a message.
+        """
+
+    def cleanup(self):
+        "Release the resources of a listener which is no longer polled."
 
 
 @six.add_metaclass(abc.ABCMeta)
@@ -77,16 +85,42 @@ class BaseDriver(object):
              wait_for_reply=None, timeout=None, envelope=False):
         """Send a message to the given target."""
 
+    def send_async(self, target, ctxt, message, callback, timeout=None):
+        """Send a message to the given target without waiting for a reply.
+
+        callback(reply=None, failure=None) is called with the reply, or the
+        exception raised by the call, from a driver thread.
+
+        By default, a thread waits for the reply to each message. Drivers
+        which can wait for many replies at once override this.
+        """
+        def wait_for_reply():
+            try:
+                reply = self.send(target, ctxt, message,
+                                  wait_for_reply=True, timeout=timeout)
+            except Exception as e:
+                callback(failure=e)
+            else:
+                callback(reply=reply)
+
+        thread = threading.Thread(target=wait_for_reply)
+        thread.daemon = True
+        thread.start()
+
     @abc.abstractmethod
     def send_notification(self, target, ctxt, message, version):
         """Send a notification message to the given target."""
 
     @abc.abstractmethod
-    def listen(self, target):
-        """Construct a Listener for the given target."""
+    def listen(self, target, consumers=1):
+        """Construct a Listener for the given target.
+
+        Drivers which can consume from the same queues over several
+        connections use consumers connections, the others ignore it.
+        """
 
     @abc.abstractmethod
-    def listen_for_notifications(self, targets_and_priorities):
+    def listen_for_notifications(self, targets_and_priorities, consumers=1):
         """Construct a notification Listener for the given list of
         tuple of (target, priority).
         """
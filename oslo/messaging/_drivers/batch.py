@@ -0,0 +1,77 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import time
+
+from oslo.messaging._drivers import base
+
+
+class IncomingBatch(object):
+    """A batch of messages returned by BatchListener.poll()."""
+
+    def __init__(self, listener, messages):
+        self.conf = listener.conf
+        self.listener = listener
+        self.messages = messages
+
+    def acknowledge(self):
+        for message in self.messages:
+            message.acknowledge()
+
+    def requeue(self):
+        for message in self.messages:
+            message.requeue()
+
+
+class BatchListener(base.Listener):
+
+    """Polls a listener for batches of messages.
+
+    A batch holds at most batch_size messages. Once its first message is
+    received, a batch is returned when it is full or, if batch_timeout isn't
+    None, batch_timeout seconds later.
+
+    The listener is polled from the thread calling poll(), like any other
+    listener, as the connection of e.g. an AMQP listener can't be shared
+    with a thread of our own while messages are acknowledged.
+    """
+
+    def __init__(self, listener, batch_size=1, batch_timeout=1.0):
+        super(BatchListener, self).__init__(listener.driver)
+        self.listener = listener
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+
+    def poll(self, timeout=None):
+        incoming = self.listener.poll(timeout=timeout)
+        if incoming is None:
+            return None
+
+        messages = [incoming]
+        deadline = None
+        if self.batch_timeout is not None:
+            deadline = time.time() + self.batch_timeout
+
+        while len(messages) < self.batch_size:
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+            incoming = self.listener.poll(timeout=remaining)
+            if incoming is None:
+                break
+            messages.append(incoming)
+        return IncomingBatch(self, messages)
+
+    def cleanup(self):
+        self.listener.cleanup()
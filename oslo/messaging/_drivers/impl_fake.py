@@ -38,6 +38,17 @@ class FakeIncomingMessage(base.IncomingMessage):
         self.requeue_callback()
 
 
+class FakeReplyCallback(object):
+    """Passes a reply to the callback of send_async() in place of a queue."""
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    def put(self, reply_and_failure):
+        reply, failure = reply_and_failure
+        self.callback(reply=reply, failure=failure)
+
+
 class FakeListener(base.Listener):
 
     def __init__(self, driver, exchange_manager, targets):
@@ -45,7 +56,10 @@ class FakeListener(base.Listener):
         self._exchange_manager = exchange_manager
         self._targets = targets
 
-    def poll(self):
+    def poll(self, timeout=None):
+        deadline = None
+        if timeout is not None:
+            deadline = time.time() + timeout
         while True:
             for target in self._targets:
                 exchange = self._exchange_manager.get_exchange(target.exchange)
@@ -54,6 +68,8 @@ class FakeListener(base.Listener):
                     message = FakeIncomingMessage(self, ctxt, message,
                                                   reply_q, requeue)
                     return message
+            if deadline is not None and time.time() >= deadline:
+                return None
             time.sleep(.05)
 
 
@@ -165,10 +181,21 @@ class FakeDriver(base.BaseDriver):
     def send(self, target, ctxt, message, wait_for_reply=None, timeout=None):
         return self._send(target, ctxt, message, wait_for_reply, timeout)
 
+    def send_async(self, target, ctxt, message, callback, timeout=None):
+        # The reply is passed to the callback by the server's thread. Calls
+        # made this way don't time out with the fake driver.
+        self._check_serialize(message)
+
+        exchange = self._exchange_manager.get_exchange(target.exchange)
+        exchange.deliver_message(target.topic, ctxt, message,
+                                 server=target.server,
+                                 fanout=target.fanout,
+                                 reply_q=FakeReplyCallback(callback))
+
     def send_notification(self, target, ctxt, message, version):
         self._send(target, ctxt, message)
 
-    def listen(self, target):
+    def listen(self, target, consumers=1):
         exchange = target.exchange or self._default_exchange
         listener = FakeListener(self, self._exchange_manager,
                                 [messaging.Target(topic=target.topic,
@@ -178,7 +205,8 @@ class FakeDriver(base.BaseDriver):
                                                   exchange=exchange)])
         return listener
 
-    def listen_for_notifications(self, targets_and_priorities):
+    def listen_for_notifications(self, targets_and_priorities,
+                                 consumers=1):
         targets = [messaging.Target(topic='%s.%s' % (target.topic, priority),
                                     exchange=target.exchange)
                    for target, priority in targets_and_priorities]
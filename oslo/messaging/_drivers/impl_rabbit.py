@@ -94,6 +94,12 @@ rabbit_opts = [
                default=0,
                help='Maximum number of RabbitMQ connection retries. '
                     'Default is 0 (infinite retry count).'),
+    cfg.IntOpt('rabbit_qos_prefetch_count',
+               default=0,
+               help='Maximum number of unacknowledged messages which '
+                    'RabbitMQ sends to a consumer. Messages beyond it '
+                    'stay in the queue, for other consumers to take. '
+                    'Default is 0 (no limit).'),
     cfg.BoolOpt('rabbit_ha_queues',
                 default=False,
                 help='Use HA queues in RabbitMQ (x-ha-policy: all). '
@@ -554,10 +560,7 @@ class Connection(object):
         self.do_consume = True
         self.consumer_num = itertools.count(1)
         self.connection.connect()
-        self.channel = self.connection.channel()
-        # work around 'memory' transport bug in 1.1.3
-        if self.memory_transport:
-            self.channel._new_queue('ae.undeliver')
+        self._set_channel(self.connection.channel())
         for consumer in self.consumers:
             consumer.reconnect(self.channel)
         LOG.info(_('Connected to AMQP server on %(hostname)s:%(port)d') %
@@ -656,11 +659,17 @@ class Connection(object):
     def reset(self):
         """Reset a connection so it can be used again."""
         self.channel.close()
-        self.channel = self.connection.channel()
+        self._set_channel(self.connection.channel())
+        self.consumers = []
+
+    def _set_channel(self, channel):
+        self.channel = channel
         # work around 'memory' transport bug in 1.1.3
         if self.memory_transport:
             self.channel._new_queue('ae.undeliver')
-        self.consumers = []
+        if self.conf.rabbit_qos_prefetch_count > 0:
+            self.channel.basic_qos(0, self.conf.rabbit_qos_prefetch_count,
+                                   False)
 
     def declare_consumer(self, consumer_cls, topic, callback):
         """Create a Consumer using the class that was passed in and
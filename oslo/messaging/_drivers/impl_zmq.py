@@ -13,6 +13,8 @@
 #    under the License.
 
 import collections
+import contextlib
+import itertools
 import logging
 import os
 import pprint
@@ -20,6 +22,7 @@ import re
 import socket
 import sys
 import threading
+import time
 import types
 import uuid
 
@@ -37,6 +40,7 @@ from oslo.messaging.openstack.common import importutils
 from oslo.messaging.openstack.common import jsonutils
 
 zmq = importutils.try_import('eventlet.green.zmq')
+native_zmq = importutils.try_import('zmq')
 
 # for convenience, are not modified.
 pformat = pprint.pformat
@@ -69,6 +73,11 @@ zmq_opts = [
     cfg.IntOpt('rpc_zmq_contexts', default=1,
                help='Number of ZeroMQ contexts, defaults to 1.'),
 
+    cfg.StrOpt('rpc_zmq_concurrency', default='eventlet',
+               help='Concurrency model of the ZeroMQ driver, either '
+                    '"eventlet" or "native" for native threads, which does '
+                    'not require monkey patching.'),
+
     cfg.IntOpt('rpc_zmq_topic_backlog', default=None,
                help='Maximum number of ingress messages to locally buffer '
                     'per topic. Default is unlimited.'),
@@ -76,6 +85,35 @@ zmq_opts = [
     cfg.StrOpt('rpc_zmq_ipc_dir', default='/var/run/openstack',
                help='Directory for holding IPC sockets.'),
 
+    cfg.IntOpt('rpc_zmq_proxy_workers', default=0,
+               help='Number of native workers forwarding messages in the '
+                    'ZeroMQ receiver, sharded by topic. If 0, the receiver '
+                    'runs as a single eventlet process.'),
+
+    cfg.BoolOpt('rpc_zmq_direct', default=False,
+                help='Bind a TCP endpoint for each topic consumer and '
+                     'register it with the matchmaker, so that messages are '
+                     'delivered straight to the consuming process rather '
+                     'than through the local ZeroMQ receiver. Requires a '
+                     'matchmaker which supports registration, e.g. Redis.'),
+
+    cfg.IntOpt('rpc_zmq_direct_min_port', default=49152,
+               help='Lowest port a direct topic consumer may bind to.'),
+
+    cfg.IntOpt('rpc_zmq_direct_max_port', default=65536,
+               help='Upper bound (exclusive) of the ports a direct topic '
+                    'consumer may bind to.'),
+
+    cfg.BoolOpt('rpc_zmq_proxy_use_processes', default=False,
+                help='Run the ZeroMQ receiver workers as separate processes '
+                     'rather than threads. The oslo-messaging-zmq-receiver '
+                     'command always runs them as processes.'),
+
+    cfg.IntOpt('rpc_zmq_proxy_stats_interval', default=60,
+               help='Seconds between per-topic throughput and drop reports '
+                    'from the ZeroMQ receiver and its workers. 0 disables '
+                    'the reports.'),
+
     cfg.StrOpt('rpc_zmq_host', default=socket.gethostname(),
                help='Name of this node. Must be a valid hostname, FQDN, or '
                     'IP address. Must match "host" option, if running Nova.'),
@@ -84,12 +122,81 @@ zmq_opts = [
                default=30,
                help='Seconds to wait before a cast expires (TTL). '
                     'Only supported by impl_zmq.'),
+
+    cfg.IntOpt('rpc_zmq_fanout_concurrency', default=64,
+               help='Maximum number of hosts a message is sent to at once '
+                    'when the matchmaker returns more than one.'),
+
+    cfg.IntOpt('rpc_zmq_sndhwm', default=None,
+               help='Maximum number of outgoing messages queued by a '
+                    'ZeroMQ socket. Default is the ZeroMQ default.'),
+
+    cfg.IntOpt('rpc_zmq_rcvhwm', default=None,
+               help='Maximum number of incoming messages queued by a '
+                    'ZeroMQ socket. Default is the ZeroMQ default.'),
+
+    cfg.IntOpt('rpc_zmq_linger', default=-1,
+               help='Seconds to wait for pending messages to be sent after '
+                    'a ZeroMQ socket is closed. -1 waits forever.'),
+
+    cfg.IntOpt('rpc_zmq_send_retries', default=10,
+               help='Number of times a message is retried when the '
+                    'outgoing queue of a ZeroMQ socket is full, before '
+                    'giving up.'),
+
+    cfg.FloatOpt('rpc_zmq_send_retry_interval', default=0.1,
+                 help='Seconds to wait between retries of a message whose '
+                      'ZeroMQ socket is full.'),
 ]
 
 CONF = cfg.CONF
 
 ZMQ_CTX = None  # ZeroMQ Context, must be global.
 matchmaker = None  # memoized matchmaker object
+fanout_pool = None  # memoized pool for sending casts
+cast_clients = {}  # memoized (ZmqClient, lock) pairs, by address
+_cast_clients_lock = threading.Lock()
+_pid = os.getpid()  # process which created the globals above
+
+# Upper bound, in seconds, on how long native consumer threads block in
+# poll(), so that close() is noticed promptly.
+_POLL_INTERVAL = 1.0
+
+
+class ZmqBackpressureError(base.TransportDriverError):
+    """Raised when a socket's high-water mark prevents sending a message.
+
+    This means the peer isn't keeping up with us, so callers should slow
+    down rather than retry straight away.
+    """
+
+
+def _split_host_port(addr):
+    """Split host:port, [host]:port or a bare host into (host, port).
+
+    port is None if addr has none. IPv6 literals contain colons, so they
+    only carry a port when enclosed in brackets.
+    """
+    if addr.startswith('['):
+        host, _sep, rest = addr[1:].partition(']')
+        if rest.startswith(':'):
+            return host, int(rest[1:])
+        return host, None
+    if addr.count(':') == 1:
+        host, port = addr.split(':')
+        return host, int(port)
+    return addr, None
+
+
+def _quote_host(host):
+    """Enclose IPv6 literals in brackets, as ZeroMQ endpoints expect."""
+    if ':' in host:
+        return '[%s]' % host
+    return host
+
+
+def _join_host_port(host, port):
+    return '%s:%s' % (_quote_host(host), port)
 
 
 def _serialize(data):
@@ -107,10 +214,119 @@ def _serialize(data):
 
 def _deserialize(data):
     """Deserialization wrapper."""
-    LOG.debug(_("Deserializing: %s"), data)
     return jsonutils.loads(data)
 
 
+def _frame_bytes(frame):
+    """Return the contents of a frame received with copy=False.
+
+    pyzmq caches the bytes of a zmq.Frame, so a frame is copied out of the
+    underlying libzmq message at most once, and only when it is decoded.
+    Plain strings (i.e. frames received with copy=True) are returned as-is.
+    """
+    return getattr(frame, 'bytes', frame)
+
+
+def _is_native():
+    return CONF.rpc_zmq_concurrency == 'native'
+
+
+@contextlib.contextmanager
+def _timeout(seconds):
+    """Raise rpc_common.Timeout if the block takes longer than seconds.
+
+    Native sockets can't be interrupted, so they enforce the timeout
+    themselves instead. See ZmqSocket.
+    """
+    if _is_native():
+        yield
+    else:
+        with Timeout(seconds, exception=rpc_common.Timeout):
+            yield
+
+
+class NativePool(object):
+    """A bounded pool of native threads, standing in for a GreenPool."""
+
+    def __init__(self, size):
+        self.size = size
+        self._queue = moves.queue.Queue(size)
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def spawn_n(self, func, *args):
+        with self._lock:
+            if len(self._threads) < self.size:
+                thread = threading.Thread(target=self._worker)
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+
+        # Blocks once every thread is busy and the queue is full, like
+        # GreenPool.spawn_n() does.
+        self._queue.put((func, args))
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+
+            func, args = item
+            try:
+                func(*args)
+            except Exception:
+                LOG.exception(_("Unhandled exception in zmq worker thread"))
+
+    def stop(self):
+        with self._lock:
+            for thread in self._threads:
+                self._queue.put(None)
+            self._threads = []
+
+
+def _parallel_map(func, items, concurrency):
+    """Return [func(item) for item in items], making concurrent calls.
+
+    At most concurrency calls are made at once, either in greenthreads or,
+    if native, in threads.
+    """
+    if not _is_native():
+        pool = eventlet.greenpool.GreenPool(concurrency)
+        return list(pool.imap(func, items))
+
+    results = [None] * len(items)
+    semaphore = threading.BoundedSemaphore(concurrency)
+
+    def run(index, item):
+        try:
+            results[index] = func(item)
+        finally:
+            semaphore.release()
+
+    threads = []
+    for index, item in enumerate(items):
+        semaphore.acquire()
+        thread = threading.Thread(target=run, args=(index, item))
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def _proxy_topic(topic):
+    """Map a topic received by the proxy to its IPC topic and socket type."""
+    if topic.startswith('fanout~'):
+        return topic.split('.', 1)[0], zmq.PUB
+    elif topic.startswith('zmq_replies'):
+        return topic, zmq.PUB
+    else:
+        return topic, zmq.PUSH
+
+
 class ZmqSocket(object):
     """A tiny wrapper around ZeroMQ.
 
@@ -118,9 +334,11 @@ class ZmqSocket(object):
     Can be used as a Context (supports the 'with' statement).
     """
 
-    def __init__(self, addr, zmq_type, bind=True, subscribe=None):
+    def __init__(self, addr, zmq_type, bind=True, subscribe=None,
+                 port_range=None, timeout=None):
         self.sock = _get_ctxt().socket(zmq_type)
         self.addr = addr
+        self.port = None
         self.type = zmq_type
         self.subscriptions = []
 
@@ -139,6 +357,25 @@ class ZmqSocket(object):
         for f in do_sub:
             self.subscribe(f)
 
+        # These only apply to connections made after they're set.
+        if CONF.rpc_zmq_sndhwm is not None:
+            self.sock.setsockopt(zmq.SNDHWM, CONF.rpc_zmq_sndhwm)
+        if CONF.rpc_zmq_rcvhwm is not None:
+            self.sock.setsockopt(zmq.RCVHWM, CONF.rpc_zmq_rcvhwm)
+        if CONF.rpc_zmq_linger >= 0:
+            self.sock.setsockopt(zmq.LINGER, CONF.rpc_zmq_linger * 1000)
+
+        # ZeroMQ only accepts IPv6 addresses once asked to.
+        if '[' in addr:
+            self.sock.setsockopt(zmq.IPV6, 1)
+
+        # Native sockets enforce timeouts themselves, raising zmq.Again.
+        if timeout and _is_native():
+            timeout_ms = int(timeout * 1000)
+            self.sock.setsockopt(zmq.RCVTIMEO, timeout_ms)
+            self.sock.setsockopt(zmq.SNDTIMEO, timeout_ms)
+            self.sock.setsockopt(zmq.LINGER, timeout_ms)
+
         str_data = {'addr': addr, 'type': self.socket_s(),
                     'subscribe': subscribe, 'bind': bind}
 
@@ -147,7 +384,11 @@ class ZmqSocket(object):
         LOG.debug(_("-> bind: %(bind)s"), str_data)
 
         try:
-            if bind:
+            if bind and port_range:
+                self.port = int(self.sock.bind_to_random_port(addr,
+                                                              *port_range))
+                self.addr = '%s:%s' % (addr, self.port)
+            elif bind:
                 self.sock.bind(addr)
             else:
                 self.sock.connect(addr)
@@ -210,16 +451,37 @@ class ZmqSocket(object):
         return self.sock.recv_multipart(**kwargs)
 
     def send(self, data, **kwargs):
+        """Send a multipart message without blocking on a full socket.
+
+        Sending is retried rpc_zmq_send_retries times while the socket is at
+        its high-water mark, after which ZmqBackpressureError is raised.
+        """
         if not self.can_send:
             raise RPCException(_("You cannot send on this socket."))
-        self.sock.send_multipart(data, **kwargs)
+
+        sleep = time.sleep if _is_native() else eventlet.sleep
+        retries = max(0, CONF.rpc_zmq_send_retries)
+        for attempt in moves.range(retries + 1):
+            if attempt:
+                sleep(CONF.rpc_zmq_send_retry_interval)
+            try:
+                # A multipart message is queued atomically, so either all
+                # frames were sent or none were.
+                self.sock.send_multipart(data, flags=zmq.NOBLOCK, **kwargs)
+                return
+            except zmq.Again:
+                LOG.debug(_("Socket %s is full, retrying"), self.addr)
+
+        raise ZmqBackpressureError(_("Socket %(addr)s remained full after "
+                                     "%(retries)d retries") %
+                                   {'addr': self.addr, 'retries': retries})
 
 
 class ZmqClient(object):
     """Client for ZMQ sockets."""
 
-    def __init__(self, addr):
-        self.outq = ZmqSocket(addr, zmq.PUSH, bind=False)
+    def __init__(self, addr, timeout=None):
+        self.outq = ZmqSocket(addr, zmq.PUSH, bind=False, timeout=timeout)
 
     def cast(self, msg_id, topic, data, envelope):
         msg_id = msg_id or 0
@@ -230,9 +492,12 @@ class ZmqClient(object):
             return
 
         rpc_envelope = rpc_common.serialize_msg(data[1])
-        zmq_msg = moves.reduce(lambda x, y: x + y, rpc_envelope.items())
-        self.outq.send(map(bytes,
-                       (msg_id, topic, 'impl_zmq_v2', data[0]) + zmq_msg))
+        zmq_msg = itertools.chain((msg_id, topic, 'impl_zmq_v2', data[0]),
+                                  *six.iteritems(rpc_envelope))
+
+        # copy=False lets libzmq reference the serialized payload rather
+        # than copying it into a new message.
+        self.outq.send([bytes(frame) for frame in zmq_msg], copy=False)
 
     def close(self):
         self.outq.close()
@@ -372,10 +637,16 @@ class ZmqBaseReactor(ConsumerBase):
         self.sockets = []
         self.subscribe = {}
 
-        self.pool = eventlet.greenpool.GreenPool(conf.rpc_thread_pool_size)
+        self.native = _is_native()
+        self.running = False
+        if self.native:
+            self.pool = NativePool(conf.rpc_thread_pool_size)
+        else:
+            self.pool = eventlet.greenpool.GreenPool(
+                conf.rpc_thread_pool_size)
 
     def register(self, proxy, in_addr, zmq_type_in,
-                 in_bind=True, subscribe=None):
+                 in_bind=True, subscribe=None, port_range=None):
 
         LOG.info(_("Registering reactor"))
 
@@ -384,12 +655,13 @@ class ZmqBaseReactor(ConsumerBase):
 
         # Items push in.
         inq = ZmqSocket(in_addr, zmq_type_in, bind=in_bind,
-                        subscribe=subscribe)
+                        subscribe=subscribe, port_range=port_range)
 
         self.proxies[inq] = proxy
         self.sockets.append(inq)
 
         LOG.info(_("In reactor registered"))
+        return inq
 
     def consume_in_thread(self):
         def _consume(sock):
@@ -397,21 +669,46 @@ class ZmqBaseReactor(ConsumerBase):
             while True:
                 self.consume(sock)
 
+        def _consume_native(sock):
+            LOG.info(_("Consuming socket"))
+            while self.running:
+                if sock.sock.poll(_POLL_INTERVAL * 1000):
+                    self.consume(sock)
+
+        self.running = True
         for k in self.proxies.keys():
-            self.threads.append(
-                self.pool.spawn(_consume, k)
-            )
+            if self.native:
+                thread = threading.Thread(target=_consume_native, args=(k,))
+                thread.daemon = True
+                thread.start()
+                self.threads.append(thread)
+            else:
+                self.threads.append(
+                    self.pool.spawn(_consume, k)
+                )
 
     def wait(self):
         for t in self.threads:
-            t.wait()
+            if self.native:
+                while t.is_alive():
+                    t.join(_POLL_INTERVAL)
+            else:
+                t.wait()
 
     def close(self):
+        if self.native:
+            # Sockets aren't thread safe, so let the consumer threads
+            # finish with them before closing them.
+            self.running = False
+            self.wait()
+            self.pool.stop()
+
         for s in self.sockets:
             s.close()
 
-        for t in self.threads:
-            t.kill()
+        if not self.native:
+            for t in self.threads:
+                t.kill()
 
 
 class ZmqProxy(ZmqBaseReactor):
@@ -421,25 +718,28 @@ class ZmqProxy(ZmqBaseReactor):
     """
 
     def __init__(self, conf):
+        if _is_native():
+            raise RPCException(_("ZmqProxy requires eventlet, set "
+                                 "rpc_zmq_proxy_workers to run a native "
+                                 "receiver instead."))
+
         super(ZmqProxy, self).__init__(conf)
         pathsep = set((os.path.sep or '', os.path.altsep or '', '/', '\\'))
         self.badchars = re.compile(r'[%s]' % re.escape(''.join(pathsep)))
 
         self.topic_proxy = {}
+        self.dropped = {}
+
+    def _drop(self, topic, reason):
+        self.dropped[topic] = self.dropped.get(topic, 0) + 1
+        LOG.error(_("%(reason)s for topic %(topic)s. Dropping message.") %
+                  {'reason': reason, 'topic': topic})
 
     def consume(self, sock):
         ipc_dir = CONF.rpc_zmq_ipc_dir
 
         data = sock.recv(copy=False)
-        topic = data[1].bytes
-
-        if topic.startswith('fanout~'):
-            sock_type = zmq.PUB
-            topic = topic.split('.', 1)[0]
-        elif topic.startswith('zmq_replies'):
-            sock_type = zmq.PUB
-        else:
-            sock_type = zmq.PUSH
+        topic, sock_type = _proxy_topic(data[1].bytes)
 
         if topic not in self.topic_proxy:
             def publisher(waiter):
@@ -472,8 +772,18 @@ class ZmqProxy(ZmqBaseReactor):
                 waiter.send(True)
 
                 while(True):
-                    data = self.topic_proxy[topic].get()
-                    out_sock.send(data, copy=False)
+                    deadline, data = self.topic_proxy[topic].get()
+                    while True:
+                        try:
+                            out_sock.send(data, copy=False)
+                            break
+                        except ZmqBackpressureError:
+                            # The sender has given up on the message.
+                            if time.time() >= deadline:
+                                self._drop(topic, _("Message expired"))
+                                break
+                            LOG.warn(_("Consumers of topic %s are not "
+                                       "keeping up"), topic)
 
             wait_sock_creation = eventlet.event.Event()
             eventlet.spawn(publisher, wait_sock_creation)
@@ -484,18 +794,19 @@ class ZmqProxy(ZmqBaseReactor):
                 LOG.error(_("Topic socket file creation failed."))
                 return
 
+        # All the topics are received here, so a topic which is backed up
+        # must not block the others: its messages are dropped instead.
         try:
-            self.topic_proxy[topic].put_nowait(data)
+            self.topic_proxy[topic].put_nowait(
+                (time.time() + CONF.rpc_cast_timeout, data))
         except eventlet.queue.Full:
-            LOG.error(_("Local per-topic backlog buffer full for topic "
-                        "%(topic)s. Dropping message.") % {'topic': topic})
+            self._drop(topic, _("Local per-topic backlog buffer full"))
 
     def consume_in_thread(self):
         """Runs the ZmqProxy service."""
         ipc_dir = CONF.rpc_zmq_ipc_dir
-        consume_in = "tcp://%s:%s" % \
-            (CONF.rpc_zmq_bind_address,
-             CONF.rpc_zmq_port)
+        consume_in = "tcp://%s" % _join_host_port(CONF.rpc_zmq_bind_address,
+                                                  CONF.rpc_zmq_port)
         consumption_proxy = InternalContext(None)
 
         try:
@@ -524,7 +835,7 @@ class ZmqProxy(ZmqBaseReactor):
 def unflatten_envelope(packenv):
     """Unflattens the RPC envelope.
 
-    Takes a list and returns a dictionary.
+    Takes a list (or any iterable) and returns a dictionary.
     i.e. [1,2,3,4] => {1: 2, 3: 4}
     """
     i = iter(packenv)
@@ -547,26 +858,29 @@ class ZmqReactor(ZmqBaseReactor):
         super(ZmqReactor, self).__init__(conf)
 
     def consume(self, sock):
-        #TODO(ewindisch): use zero-copy (i.e. references, not copying)
-        data = sock.recv()
-        LOG.debug(_("CONSUMER RECEIVED DATA: %s"), data)
+        # Frames are received by reference and only the ones we actually
+        # decode are copied out of libzmq.
+        data = sock.recv(copy=False)
+        style = _frame_bytes(data[2])
+        LOG.debug(_("CONSUMER RECEIVED %(style)s MESSAGE ON %(topic)s"),
+                  {'style': style, 'topic': _frame_bytes(data[1])})
 
         proxy = self.proxies[sock]
 
-        if data[2] == 'cast':  # Legacy protocol
-            packenv = data[3]
+        if style == 'cast':  # Legacy protocol
+            packenv = _frame_bytes(data[3])
 
             ctx, msg = _deserialize(packenv)
             request = rpc_common.deserialize_msg(msg)
             ctx = RpcContext.unmarshal(ctx)
-        elif data[2] == 'impl_zmq_v2':
-            packenv = data[4:]
+        elif style == 'impl_zmq_v2':
+            packenv = moves.map(_frame_bytes, data[4:])
 
             msg = unflatten_envelope(packenv)
             request = rpc_common.deserialize_msg(msg)
 
             # Unmarshal only after verifying the message.
-            ctx = RpcContext.unmarshal(data[3])
+            ctx = RpcContext.unmarshal(_frame_bytes(data[3]))
         else:
             LOG.error(_("ZMQ Envelope version unsupported or unknown."))
             return
@@ -579,9 +893,14 @@ class Connection(rpc_common.Connection):
 
     def __init__(self, conf):
         self.topics = []
+        self.direct_hosts = {}
         self.reactor = ZmqReactor(conf)
 
     def create_consumer(self, topic, proxy, fanout=False):
+        if CONF.rpc_zmq_direct and '.' not in topic:
+            self._create_direct_consumer(topic, proxy)
+            return
+
         # Register with matchmaker.
         _get_matchmaker().register(topic, CONF.rpc_zmq_host)
 
@@ -610,13 +929,38 @@ class Connection(rpc_common.Connection):
                               subscribe=subscribe, in_bind=False)
         self.topics.append(topic)
 
+    def _create_direct_consumer(self, topic, proxy):
+        """Consume a topic and its fanouts from a TCP endpoint of our own.
+
+        The endpoint is registered with the matchmaker as host:port, which
+        _multi_send() connects to directly. Messages sent to this specific
+        server (i.e. topic.host) and replies still arrive through the local
+        receiver, as the direct exchanges can't know the port.
+        """
+        if topic in self.direct_hosts:
+            LOG.info(_("Skipping topic registration. Already registered."))
+            return
+
+        port_range = (CONF.rpc_zmq_direct_min_port,
+                      CONF.rpc_zmq_direct_max_port)
+        inq = self.reactor.register(
+            proxy, "tcp://%s" % _quote_host(CONF.rpc_zmq_bind_address),
+            zmq.PULL, port_range=port_range)
+
+        host = _join_host_port(CONF.rpc_zmq_host, inq.port)
+        _get_matchmaker().register(topic, host)
+        self.direct_hosts[topic] = host
+
     def close(self):
         _get_matchmaker().stop_heartbeat()
         for topic in self.topics:
             _get_matchmaker().unregister(topic, CONF.rpc_zmq_host)
+        for topic, host in self.direct_hosts.items():
+            _get_matchmaker().unregister(topic, host)
 
         self.reactor.close()
         self.topics = []
+        self.direct_hosts = {}
 
     def wait(self):
         self.reactor.wait()
@@ -626,22 +970,49 @@ class Connection(rpc_common.Connection):
         self.reactor.consume_in_thread()
 
 
+def _get_cast_client(addr):
+    """Return the client casts to addr are sent through, and its lock.
+
+    Casts to an address share one long-lived socket, so that its high-water
+    mark applies. A socket per cast never fills up; unsent messages pile up
+    inside libzmq instead.
+    """
+    _check_fork()
+    with _cast_clients_lock:
+        if addr not in cast_clients:
+            if _is_native():
+                lock = threading.Lock()
+            else:
+                lock = eventlet.semaphore.Semaphore()
+            client = ZmqClient(addr, timeout=CONF.rpc_cast_timeout)
+            cast_clients[addr] = (client, lock)
+        return cast_clients[addr]
+
+
+def _drop_cast_client(addr, client):
+    """Close a broken cast client, so the next cast opens a new one."""
+    with _cast_clients_lock:
+        if cast_clients.get(addr, (None, None))[0] is client:
+            del cast_clients[addr]
+    client.close()
+
+
 def _cast(addr, context, topic, msg, timeout=None, envelope=False,
           _msg_id=None, allowed_remote_exmods=[]):
     timeout_cast = timeout or CONF.rpc_cast_timeout
     payload = [RpcContext.marshal(context), msg]
 
-    with Timeout(timeout_cast, exception=rpc_common.Timeout):
+    with _timeout(timeout_cast):
+        conn, lock = _get_cast_client(addr)
         try:
-            conn = ZmqClient(addr)
-
-            # assumes cast can't return an exception
-            conn.cast(_msg_id, topic, payload, envelope)
+            with lock:
+                # assumes cast can't return an exception
+                conn.cast(_msg_id, topic, payload, envelope)
+        except zmq.Again:
+            raise rpc_common.Timeout()
         except zmq.ZMQError:
+            _drop_cast_client(addr, conn)
             raise RPCException("Cast failed. ZMQ Socket Exception")
-        finally:
-            if 'conn' in vars():
-                conn.close()
 
 
 def _call(addr, context, topic, msg, timeout=None,
@@ -672,13 +1043,13 @@ def _call(addr, context, topic, msg, timeout=None,
 
     # Messages arriving async.
     # TODO(ewindisch): have reply consumer with dynamic subscription mgmt
-    with Timeout(timeout, exception=rpc_common.Timeout):
+    with _timeout(timeout):
         try:
             msg_waiter = ZmqSocket(
                 "ipc://%s/zmq_topic_zmq_replies.%s" %
                 (CONF.rpc_zmq_ipc_dir,
                  CONF.rpc_zmq_host),
-                zmq.SUB, subscribe=msg_id, bind=False
+                zmq.SUB, subscribe=msg_id, bind=False, timeout=timeout
             )
 
             LOG.debug(_("Sending cast"))
@@ -686,20 +1057,24 @@ def _call(addr, context, topic, msg, timeout=None,
 
             LOG.debug(_("Cast sent; Waiting reply"))
             # Blocks until receives reply
-            msg = msg_waiter.recv()
-            LOG.debug(_("Received message: %s"), msg)
+            msg = msg_waiter.recv(copy=False)
+            style = _frame_bytes(msg[2])
+            LOG.debug(_("Received %s message"), style)
             LOG.debug(_("Unpacking response"))
 
-            if msg[2] == 'cast':  # Legacy version
-                raw_msg = _deserialize(msg[-1])[-1]
-            elif msg[2] == 'impl_zmq_v2':
-                rpc_envelope = unflatten_envelope(msg[4:])
+            if style == 'cast':  # Legacy version
+                raw_msg = _deserialize(_frame_bytes(msg[-1]))[-1]
+            elif style == 'impl_zmq_v2':
+                rpc_envelope = unflatten_envelope(
+                    moves.map(_frame_bytes, msg[4:]))
                 raw_msg = rpc_common.deserialize_msg(rpc_envelope)
             else:
                 raise rpc_common.UnsupportedRpcEnvelopeVersion(
                     _("Unsupported or unknown ZMQ envelope returned."))
 
             responses = raw_msg['args']['response']
+        except zmq.Again:
+            raise rpc_common.Timeout()
         # ZMQError trumps the Timeout error.
         except zmq.ZMQError:
             raise RPCException("ZMQ Socket Error")
@@ -721,16 +1096,39 @@ def _call(addr, context, topic, msg, timeout=None,
     return responses[-1]
 
 
+HostReply = collections.namedtuple('HostReply',
+                                   ['topic', 'host', 'reply', 'failure'])
+
+
+def _collect_reply(replies):
+    """Raise the first failure of a list of HostReply, or the last reply.
+
+    This is how a call sent to several hosts has always behaved.
+    """
+    for reply in replies:
+        if reply.failure:
+            six.reraise(*reply.failure)
+    return replies[-1].reply
+
+
 def _multi_send(method, context, topic, msg, timeout=None,
-                envelope=False, _msg_id=None, allowed_remote_exmods=[]):
+                envelope=False, _msg_id=None, allowed_remote_exmods=[],
+                routing_key=None):
     """Wraps the sending of messages.
 
-    Dispatches to the matchmaker and sends message to all relevant hosts.
+    Dispatches to the matchmaker and sends message to all relevant hosts,
+    at most rpc_zmq_fanout_concurrency at a time. Casts to several hosts are
+    sent in the background. Calls wait for every host and return a HostReply
+    for each of them, in the order the matchmaker returned them.
+
+    The routing key, if any, is passed to the matchmaker so that it can
+    send messages with the same key to the same host.
     """
     conf = CONF
     LOG.debug(_("%(msg)s") % {'msg': ' '.join(map(pformat, (topic, msg)))})
 
-    queues = _get_matchmaker().queues(topic)
+    matchmaker = _get_matchmaker()
+    queues = matchmaker.queues(topic, routing_key)
     LOG.debug(_("Sending message(s) to: %s"), queues)
 
     # Don't stack if we have no matchmaker results
@@ -740,19 +1138,50 @@ def _multi_send(method, context, topic, msg, timeout=None,
         # this exception and a timeout isn't too big a lie.
         raise rpc_common.Timeout(_("No match from matchmaker."))
 
+    def _addr(ip_addr):
+        # Direct consumers register themselves as host:port.
+        host, port = _split_host_port(ip_addr)
+        if port is None:
+            port = conf.rpc_zmq_port
+        return "tcp://%s" % _join_host_port(host, port)
+
+    def _measured(ip_addr, *args):
+        # The reply latency of calls, and the time casts take to be sent,
+        # which grows when the host pushes back, tell a load-aware
+        # matchmaker how busy the host is.
+        matchmaker.host_load.started(ip_addr)
+        start = time.time()
+        try:
+            return method(_addr(ip_addr), *args)
+        finally:
+            matchmaker.host_load.finished(ip_addr, time.time() - start)
+
+    # A cast to a single host is sent straight away, so that errors such as
+    # ZmqBackpressureError reach the caller.
+    if method.__name__ == '_cast' and len(queues) == 1:
+        _topic, ip_addr = queues[0]
+        _measured(ip_addr, context, _topic, msg, timeout, envelope, _msg_id)
+        return None
+
     # This supports brokerless fanout (addresses > 1)
-    return_val = None
-    for queue in queues:
-        _topic, ip_addr = queue
-        _addr = "tcp://%s:%s" % (ip_addr, conf.rpc_zmq_port)
+    if method.__name__ == '_cast':
+        for _topic, ip_addr in queues:
+            _get_fanout_pool().spawn_n(_measured, ip_addr, context, _topic,
+                                       msg, timeout, envelope, _msg_id)
+        return None
 
-        if method.__name__ == '_cast':
-            eventlet.spawn_n(method, _addr, context,
-                             _topic, msg, timeout, envelope, _msg_id)
-        else:
-            return_val = method(_addr, context, _topic, msg, timeout, envelope)
+    def _send(queue):
+        _topic, ip_addr = queue
+        try:
+            reply = _measured(ip_addr, context, _topic, msg, timeout,
+                              envelope)
+        except Exception:
+            return HostReply(_topic, ip_addr, None, sys.exc_info())
+        return HostReply(_topic, ip_addr, reply, None)
 
-    return return_val
+    if len(queues) == 1:
+        return [_send(queues[0])]
+    return _parallel_map(_send, queues, conf.rpc_zmq_fanout_concurrency)
 
 
 def create_connection(conf, new=True):
@@ -760,13 +1189,13 @@ def create_connection(conf, new=True):
 
 
 def multicall(conf, *args, **kwargs):
-    """Multiple calls."""
+    """Multiple calls, returning a HostReply for each host."""
     return _multi_send(_call, *args, **kwargs)
 
 
 def call(conf, *args, **kwargs):
     """Send a message, expect a response."""
-    data = _multi_send(_call, *args, **kwargs)
+    data = _collect_reply(_multi_send(_call, *args, **kwargs))
     return data[-1]
 
 
@@ -796,27 +1225,76 @@ def notify(conf, context, topic, msg, envelope):
 
 def cleanup():
     """Clean up resources in use by implementation."""
+    global cast_clients
+    for conn, lock in cast_clients.values():
+        conn.close()
+    cast_clients = {}
+
     global ZMQ_CTX
     if ZMQ_CTX:
         ZMQ_CTX.term()
     ZMQ_CTX = None
 
     global matchmaker
+    if matchmaker:
+        matchmaker.cleanup()
     matchmaker = None
 
+    global fanout_pool
+    if isinstance(fanout_pool, NativePool):
+        fanout_pool.stop()
+    fanout_pool = None
+
+
+def _check_fork():
+    """Drop the globals inherited from the parent in a forked child.
+
+    Neither the context, nor the threads of the matchmaker and fanout pool,
+    survive a fork. The context and cast sockets are not closed, as that
+    would close the sockets of the parent.
+    """
+    global _pid, ZMQ_CTX, matchmaker, fanout_pool
+    global cast_clients, _cast_clients_lock
+    if _pid != os.getpid():
+        _pid = os.getpid()
+        ZMQ_CTX = None
+        matchmaker = None
+        fanout_pool = None
+        cast_clients = {}
+        _cast_clients_lock = threading.Lock()
+
+
+def _get_fanout_pool():
+    global fanout_pool
+    _check_fork()
+    if fanout_pool is None:
+        if _is_native():
+            fanout_pool = NativePool(CONF.rpc_zmq_fanout_concurrency)
+        else:
+            fanout_pool = eventlet.greenpool.GreenPool(
+                CONF.rpc_zmq_fanout_concurrency)
+    return fanout_pool
+
 
 def _get_ctxt():
     if not zmq:
         raise ImportError("Failed to import eventlet.green.zmq")
 
     global ZMQ_CTX
+    _check_fork()
     if not ZMQ_CTX:
-        ZMQ_CTX = zmq.Context(CONF.rpc_zmq_contexts)
+        if _is_native():
+            if not native_zmq:
+                raise ImportError("Failed to import zmq")
+            ZMQ_CTX = native_zmq.Context(CONF.rpc_zmq_contexts)
+        else:
+            ZMQ_CTX = zmq.Context(CONF.rpc_zmq_contexts)
     return ZMQ_CTX
 
 
 def _get_matchmaker(*args, **kwargs):
     global matchmaker
+    _check_fork()
     if not matchmaker:
         mm = CONF.rpc_zmq_matchmaker
         if mm.endswith('matchmaker.MatchMakerRing'):
@@ -839,8 +1317,8 @@ class ZmqIncomingMessage(base.IncomingMessage):
         self.received = None
 
     def reply(self, reply=None, failure=None, log_failure=True):
-        self.received = self.ReceivedReply(reply, failure, log_failure)
         with self.condition:
+            self.received = self.ReceivedReply(reply, failure, log_failure)
             self.condition.notify()
 
     def requeue(self):
@@ -869,8 +1347,10 @@ class ZmqListener(base.Listener):
 
         self.incoming_queue.put(incoming)
 
+        # With native threads the reply may arrive before we get to wait.
         with incoming.condition:
-            incoming.condition.wait()
+            while incoming.received is None:
+                incoming.condition.wait()
 
         assert incoming.received
 
@@ -879,15 +1359,15 @@ class ZmqListener(base.Listener):
         else:
             return incoming.received.reply
 
-    def poll(self):
-        while True:
-            return self.incoming_queue.get()
+    def poll(self, timeout=None):
+        try:
+            return self.incoming_queue.get(timeout=timeout)
+        except moves.queue.Empty:
+            return None
 
 
 class ZmqDriver(base.BaseDriver):
 
-    # FIXME(markmc): allow this driver to be used without eventlet
-
     def __init__(self, conf, url, default_exchange=None,
                  allowed_remote_exmods=[]):
         conf.register_opts(zmq_opts)
@@ -934,10 +1414,11 @@ class ZmqDriver(base.BaseDriver):
 
         reply = _multi_send(method, context, topic, message,
                             envelope=envelope,
-                            allowed_remote_exmods=self._allowed_remote_exmods)
+                            allowed_remote_exmods=self._allowed_remote_exmods,
+                            routing_key=target.routing_key)
 
         if wait_for_reply:
-            return reply[-1]
+            return _collect_reply(reply)[-1]
 
     def send(self, target, ctxt, message, wait_for_reply=None, timeout=None):
         return self._send(target, ctxt, message, wait_for_reply, timeout)
@@ -948,7 +1429,7 @@ class ZmqDriver(base.BaseDriver):
         target = target(topic=target.topic.replace('.', '-'))
         return self._send(target, ctxt, message, envelope=(version == 2.0))
 
-    def listen(self, target):
+    def listen(self, target, consumers=1):
         conn = create_connection(self.conf)
 
         listener = ZmqListener(self)
@@ -962,7 +1443,8 @@ class ZmqDriver(base.BaseDriver):
 
         return listener
 
-    def listen_for_notifications(self, targets_and_priorities):
+    def listen_for_notifications(self, targets_and_priorities,
+                                 consumers=1):
         # NOTE(sileht): this listener implementation is limited
         # because zeromq doesn't support requeing message
         conn = create_connection(self.conf)
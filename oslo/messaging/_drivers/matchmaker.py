@@ -18,8 +18,10 @@ return keys for direct exchanges, per (approximate) AMQP parlance.
 
 import contextlib
 import logging
+import random
+import threading
+import time
 
-import eventlet
 from oslo.config import cfg
 
 # FIXME(markmc): remove this
@@ -32,6 +34,15 @@ matchmaker_opts = [
     cfg.IntOpt('matchmaker_heartbeat_ttl',
                default=600,
                help='Heartbeat time-to-live.'),
+    cfg.BoolOpt('matchmaker_load_aware',
+                default=False,
+                help='Send each message on a topic to the less loaded of two '
+                     'randomly chosen hosts, judging load by the recent '
+                     'reply latency and outstanding calls of each host.'),
+    cfg.IntOpt('matchmaker_load_ttl',
+               default=30,
+               help='Seconds after which the load measured for a host is '
+                    'forgotten, if no calls were made to it since.'),
 ]
 
 CONF = cfg.CONF
@@ -56,6 +67,22 @@ class Exchange(object):
     def run(self, key):
         raise NotImplementedError()
 
+    def candidates(self, key):
+        """Return all the queues run() may choose from for key.
+
+        Used for load-aware selection. Exchanges which don't choose a host
+        return None, and run() is used instead.
+        """
+        return None
+
+    def route(self, key, routing_key):
+        """Look up key for a message with a routing key.
+
+        Exchanges which can keep messages with the same routing key on the
+        same host override this. By default, the routing key is ignored.
+        """
+        return self.run(key)
+
 
 class Binding(object):
     """A binding on which to perform a lookup."""
@@ -66,6 +93,46 @@ class Binding(object):
         raise NotImplementedError()
 
 
+class HostLoad(object):
+    """Tracks the recent latency and outstanding messages of each host.
+
+    The latency of a call is the time until its reply, the latency of a
+    cast the time it took to send it, which grows while the host pushes
+    back. The load of a host is its moving average latency times the number
+    of messages to it which are in flight, plus one. Hosts we know nothing
+    recent about have no load, so that they get tried.
+    """
+    # Weight of the latest latency in the moving average.
+    alpha = 0.3
+
+    def __init__(self):
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def started(self, host):
+        with self._lock:
+            latency, outstanding, updated = self._hosts.get(host,
+                                                            (0.0, 0, 0))
+            self._hosts[host] = (latency, outstanding + 1, updated)
+
+    def finished(self, host, elapsed):
+        with self._lock:
+            latency, outstanding, updated = self._hosts.get(host,
+                                                            (0.0, 1, 0))
+            if updated:
+                latency += self.alpha * (elapsed - latency)
+            else:
+                latency = elapsed
+            self._hosts[host] = (latency, max(0, outstanding - 1),
+                                 time.time())
+
+    def load(self, host):
+        latency, outstanding, updated = self._hosts.get(host, (0.0, 0, 0))
+        if time.time() - updated > CONF.matchmaker_load_ttl:
+            latency = 0.0
+        return latency * (outstanding + 1)
+
+
 class MatchMakerBase(object):
     """Match Maker Base Class.
 
@@ -75,6 +142,7 @@ class MatchMakerBase(object):
     def __init__(self):
         # Array of tuples. Index [2] toggles negation, [3] is last-if-true
         self.bindings = []
+        self.host_load = HostLoad()
 
         self.no_heartbeat_msg = _('Matchmaker does not implement '
                                   'registration or heartbeat.')
@@ -123,6 +191,10 @@ class MatchMakerBase(object):
         """Destroys the heartbeat greenthread."""
         pass
 
+    def cleanup(self):
+        """Release the resources, e.g. threads, held by the matchmaker."""
+        pass
+
     def add_binding(self, binding, rule, last=True):
         self.bindings.append((binding, rule, False, last))
 
@@ -131,20 +203,42 @@ class MatchMakerBase(object):
     #def add_negate_binding(self, binding, rule, last=True):
     #    self.bindings.append((binding, rule, True, last))
 
-    def queues(self, key):
+    def queues(self, key, routing_key=None):
         workers = []
 
         # bit is for negate bindings - if we choose to implement it.
         # last stops processing rules if this matches.
         for (binding, exchange, bit, last) in self.bindings:
             if binding.test(key):
-                workers.extend(exchange.run(key))
+                if routing_key is not None:
+                    workers.extend(exchange.route(key, routing_key))
+                elif CONF.matchmaker_load_aware:
+                    workers.extend(self._least_loaded(exchange, key))
+                else:
+                    workers.extend(exchange.run(key))
 
                 # Support last.
                 if last:
                     return workers
         return workers
 
+    def _least_loaded(self, exchange, key):
+        """Pick the less loaded of two random candidates of an exchange.
+
+        Comparing two random hosts avoids herding every sender onto the
+        same least loaded host, while still steering away from slow ones.
+        """
+        candidates = exchange.candidates(key)
+        if candidates is None:
+            return exchange.run(key)
+        if len(candidates) < 2:
+            return candidates
+
+        first, second = random.sample(candidates, 2)
+        if self.host_load.load(second[1]) < self.host_load.load(first[1]):
+            return [second]
+        return [first]
+
 
 class HeartbeatMatchMakerBase(MatchMakerBase):
     """Base for a heart-beat capable MatchMaker.
@@ -155,6 +249,7 @@ class HeartbeatMatchMakerBase(MatchMakerBase):
     def __init__(self):
         self.hosts = set()
         self._heart = None
+        self._heart_stopped = threading.Event()
         self.host_topic = {}
 
         super(HeartbeatMatchMakerBase, self).__init__()
@@ -218,25 +313,29 @@ class HeartbeatMatchMakerBase(MatchMakerBase):
     def start_heartbeat(self):
         """Implementation of MatchMakerBase.start_heartbeat.
 
-        Launches greenthread looping send_heartbeats(),
+        Launches a thread looping send_heartbeats(),
         yielding for CONF.matchmaker_heartbeat_freq seconds
-        between iterations.
+        between iterations. The thread is a greenthread if
+        the threading module is monkey patched.
         """
         if not self.hosts:
             raise MatchMakerException(
                 _("Register before starting heartbeat."))
 
         def do_heartbeat():
-            while True:
+            while not self._heart_stopped.is_set():
                 self.send_heartbeats()
-                eventlet.sleep(CONF.matchmaker_heartbeat_freq)
+                self._heart_stopped.wait(CONF.matchmaker_heartbeat_freq)
 
-        self._heart = eventlet.spawn(do_heartbeat)
+        self._heart_stopped.clear()
+        self._heart = threading.Thread(target=do_heartbeat)
+        self._heart.daemon = True
+        self._heart.start()
 
     def stop_heartbeat(self):
-        """Destroys the heartbeat greenthread."""
+        """Stops the heartbeat thread."""
         if self._heart:
-            self._heart.kill()
+            self._heart_stopped.set()
 
 
 class DirectBinding(Binding):
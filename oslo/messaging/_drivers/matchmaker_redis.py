@@ -16,6 +16,11 @@ The MatchMaker classes should accept a Topic or Fanout exchange key and
 return keys for direct exchanges, per (approximate) AMQP parlance.
 """
 
+import logging
+import random
+import threading
+import time
+
 from oslo.config import cfg
 
 from oslo.messaging._drivers import matchmaker as mm_common
@@ -34,6 +39,12 @@ matchmaker_redis_opts = [
     cfg.StrOpt('password',
                default=None,
                help='Password for Redis server (optional).'),
+    cfg.IntOpt('cache_ttl',
+               default=0,
+               help='Seconds the members of a topic are cached for. The '
+                    'cache is invalidated through Redis pub/sub whenever '
+                    'a member registers, unregisters or expires, which '
+                    'takes a listener thread. 0 disables the cache.'),
 ]
 
 CONF = cfg.CONF
@@ -41,6 +52,31 @@ opt_group = cfg.OptGroup(name='matchmaker_redis',
                          title='Options for Redis-based MatchMaker')
 CONF.register_group(opt_group)
 CONF.register_opts(matchmaker_redis_opts, opt_group)
+LOG = logging.getLogger(__name__)
+
+# FIXME(markmc): remove this
+_ = lambda s: s
+
+# Channel on which the topics whose members changed are published.
+_INVALIDATE_CHANNEL = 'oslo.messaging.matchmaker_redis.invalidate'
+
+# Published by Redis when a key expires, if keyspace notifications are
+# enabled with "notify-keyspace-events Ex". Heartbeat keys are named
+# topic.host, so this lets us notice hosts that stopped heartbeating.
+_EXPIRED_PATTERN = '__keyevent@*__:expired'
+
+# Upper bound, in seconds, on how long the invalidation listener blocks, so
+# that stop_cache() is noticed promptly.
+_POLL_INTERVAL = 1.0
+
+
+def _is_alive(ttl):
+    """Whether a heartbeat key with the given TTL is alive.
+
+    Depending on the versions of Redis and redis-py, TTL of a key which
+    doesn't exist, or has no expiry, returns None, -1 or -2.
+    """
+    return ttl is not None and ttl >= 0
 
 
 class RedisExchange(mm_common.Exchange):
@@ -56,29 +92,24 @@ class RedisTopicExchange(RedisExchange):
     i.e. "compute.host" sends a message to "compute" running on "host"
     """
     def run(self, topic):
-        while True:
-            member_name = self.redis.srandmember(topic)
+        members = self.matchmaker.members(topic)
+        if not members:
+            return []
 
-            if not member_name:
-                # If this happens, there are no
-                # longer any members.
-                break
+        member_name = random.choice(members)
+        host = member_name.split('.', 1)[1]
+        return [(member_name, host)]
 
-            if not self.matchmaker.is_alive(topic, member_name):
-                continue
-
-            host = member_name.split('.', 1)[1]
-            return [(member_name, host)]
-        return []
+    def candidates(self, topic):
+        return [(member_name, member_name.split('.', 1)[1])
+                for member_name in self.matchmaker.members(topic)]
 
 
 class RedisFanoutExchange(RedisExchange):
     """Return a list of all hosts."""
     def run(self, topic):
         topic = topic.split('~', 1)[1]
-        hosts = self.redis.smembers(topic)
-        good_hosts = filter(
-            lambda host: self.matchmaker.is_alive(topic, host), hosts)
+        good_hosts = self.matchmaker.members(topic)
 
         return [(x, x.split('.', 1)[1]) for x in good_hosts]
 
@@ -100,25 +131,175 @@ class MatchMakerRedis(mm_common.HeartbeatMatchMakerBase):
         self.add_binding(mm_common.DirectBinding(), mm_common.DirectExchange())
         self.add_binding(mm_common.TopicBinding(), RedisTopicExchange(self))
 
+        # topic -> (expiry time, list of live members)
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+        self._cache_generation = 0
+        self._subscribed = False
+        self._listener = None
+        self._listener_stopped = None
+
+    def start_cache(self):
+        """Start listening for changes to the members of cached topics.
+
+        Called on the first lookup when matchmaker_redis.cache_ttl is set.
+        The cache is only used while we are subscribed, as we could miss
+        invalidations otherwise.
+        """
+        # Each listener gets its own event, so that one being stopped
+        # doesn't keep running alongside its replacement.
+        stopped = self._listener_stopped = threading.Event()
+        self._listener = threading.Thread(target=self._listen,
+                                          args=(stopped,))
+        self._listener.daemon = True
+        self._listener.start()
+
+    def stop_cache(self):
+        """Stop the invalidation listener and empty the cache."""
+        with self._cache_lock:
+            if self._listener is not None:
+                self._listener_stopped.set()
+                self._listener = None
+        self._set_subscribed(False)
+
+    def cleanup(self):
+        self.stop_cache()
+
+    def _set_subscribed(self, subscribed, stopped=None):
+        with self._cache_lock:
+            # A listener which was stopped mustn't touch the state of its
+            # replacement.
+            if stopped is not None and stopped.is_set():
+                return
+            self._subscribed = subscribed
+            self._cache = {}
+            self._cache_generation += 1
+
+    def _listen(self, stopped):
+        while not stopped.is_set():
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(_INVALIDATE_CHANNEL)
+                pubsub.psubscribe(_EXPIRED_PATTERN)
+                self._set_subscribed(True, stopped)
+
+                while not stopped.is_set():
+                    message = pubsub.get_message(timeout=_POLL_INTERVAL)
+                    if message:
+                        self._invalidate(message)
+            except redis.RedisError:
+                if self._subscribed:
+                    LOG.exception(_("Lost the Redis matchmaker invalidation "
+                                    "channel, not caching lookups"))
+                self._set_subscribed(False, stopped)
+                stopped.wait(_POLL_INTERVAL)
+            finally:
+                pubsub.close()
+
+    def _invalidate(self, message):
+        if message['type'] == 'pmessage':
+            # The expired key is topic.host
+            topic = message['data'].split('.', 1)[0]
+        else:
+            topic = message['data']
+
+        with self._cache_lock:
+            self._cache.pop(topic, None)
+            self._cache_generation += 1
+
+    def members(self, topic):
+        """Return the live members, i.e. "topic.host" keys, of a topic.
+
+        Lookups are answered from a local cache for up to
+        matchmaker_redis.cache_ttl seconds, or until Redis tells us the
+        members of the topic changed.
+        """
+        if CONF.matchmaker_redis.cache_ttl <= 0:
+            return self._live_members(topic,
+                                      list(self.redis.smembers(topic)))
+
+        now = time.time()
+        with self._cache_lock:
+            if self._listener is None:
+                self.start_cache()
+            cached = self._cache.get(topic)
+            if cached is not None and cached[0] > now:
+                return cached[1]
+            generation = self._cache_generation
+            subscribed = self._subscribed
+
+        members = self._live_members(topic, list(self.redis.smembers(topic)))
+
+        # Don't cache what may have changed while we were looking it up.
+        with self._cache_lock:
+            if subscribed and generation == self._cache_generation:
+                self._cache[topic] = (now + CONF.matchmaker_redis.cache_ttl,
+                                      members)
+        return members
+
+    def _live_members(self, topic, members):
+        """Return the members whose heartbeat hasn't expired.
+
+        Expired members are removed from the topic. This costs at most two
+        round trips, however many members the topic has.
+        """
+        with self.redis.pipeline(transaction=False) as pipe:
+            for member in members:
+                pipe.ttl(member)
+            ttls = pipe.execute()
+
+        alive = []
+        dead = []
+        for member, ttl in zip(members, ttls):
+            if _is_alive(ttl):
+                alive.append(member)
+            else:
+                dead.append(member)
+
+        if dead:
+            self._expire_members(topic, dead)
+        return alive
+
+    def send_heartbeats(self):
+        """Refresh the expiry of all of our keys in a single round trip."""
+        key_hosts = list(self.host_topic)
+        if not key_hosts:
+            return
+
+        with self.redis.pipeline(transaction=False) as pipe:
+            for key, host in key_hosts:
+                pipe.expire('%s.%s' % (key, host),
+                            CONF.matchmaker_heartbeat_ttl)
+            results = pipe.execute()
+
+        for (key, host), refreshed in zip(key_hosts, results):
+            if not refreshed:
+                # The key might have been pruned, see ack_alive().
+                self.register(key, host)
+
     def ack_alive(self, key, host):
         topic = "%s.%s" % (key, host)
         if not self.redis.expire(topic, CONF.matchmaker_heartbeat_ttl):
             # If we could not update the expiration, the key
             # might have been pruned. Re-register, creating a new
             # key in Redis.
-            self.register(self.topic_host[host], host)
+            self.register(key, host)
 
     def is_alive(self, topic, host):
-        if self.redis.ttl(host) == -1:
+        if not _is_alive(self.redis.ttl(host)):
             self.expire(topic, host)
             return False
         return True
 
     def expire(self, topic, host):
+        self._expire_members(topic, [host])
+
+    def _expire_members(self, topic, members):
         with self.redis.pipeline() as pipe:
             pipe.multi()
-            pipe.delete(host)
-            pipe.srem(topic, host)
+            pipe.delete(*members)
+            pipe.srem(topic, *members)
+            pipe.publish(_INVALIDATE_CHANNEL, topic)
             pipe.execute()
 
     def backend_register(self, key, key_host):
@@ -131,6 +312,7 @@ class MatchMakerRedis(mm_common.HeartbeatMatchMakerBase):
             # because only keys can expire.
             pipe.set(key_host, '')
 
+            pipe.publish(_INVALIDATE_CHANNEL, key)
             pipe.execute()
 
     def backend_unregister(self, key, key_host):
@@ -138,4 +320,5 @@ class MatchMakerRedis(mm_common.HeartbeatMatchMakerBase):
             pipe.multi()
             pipe.srem(key, key_host)
             pipe.delete(key_host)
+            pipe.publish(_INVALIDATE_CHANNEL, key)
             pipe.execute()
@@ -16,11 +16,19 @@ The MatchMaker classes should except a Topic or Fanout exchange key and
 return keys for direct exchanges, per (approximate) AMQP parlance.
 """
 
+import bisect
+import hashlib
 import itertools
 import json
 import logging
+import os
+import struct
+import threading
+import time
 
 from oslo.config import cfg
+import six
+from six import moves
 
 from oslo.messaging._drivers import matchmaker as mm
 
@@ -34,6 +42,16 @@ matchmaker_opts = [
                deprecated_group='DEFAULT',
                default='/etc/oslo/matchmaker_ring.json',
                help='Matchmaker ring file (JSON).'),
+    cfg.IntOpt('hash_replicas',
+               default=100,
+               help='Number of points each host of a topic gets on the '
+                    'consistent hash ring used to route messages with a '
+                    'routing key.'),
+    cfg.IntOpt('ringfile_poll_interval',
+               default=10,
+               help='Seconds between checks of the ringfile for changes, '
+                    'which are then loaded without a restart. 0 disables '
+                    'reloading.'),
 ]
 
 CONF = cfg.CONF
@@ -41,28 +59,128 @@ CONF.register_opts(matchmaker_opts, 'matchmaker_ring')
 LOG = logging.getLogger(__name__)
 
 
+def _hash(value):
+    if isinstance(value, six.text_type):
+        value = value.encode('utf-8')
+    return struct.unpack('>I', hashlib.md5(value).digest()[:4])[0]
+
+
+class HashRing(object):
+    """A consistent hash ring of the hosts of a topic.
+
+    Each host is placed at a number of (pseudo-random) points on the ring,
+    and a key maps to the host of the first point following the key's hash.
+    Adding or removing a host therefore only moves the keys which map to
+    that host's points, about 1/n of the keys for n hosts.
+    """
+    def __init__(self, hosts, replicas):
+        points = sorted((_hash('%s-%d' % (host, i)), host)
+                        for host in hosts
+                        for i in moves.range(replicas))
+        self.hashes = [point[0] for point in points]
+        self.hosts = [point[1] for point in points]
+
+    def get_host(self, key):
+        if not self.hosts:
+            return None
+        index = bisect.bisect(self.hashes, _hash(key)) % len(self.hashes)
+        return self.hosts[index]
+
+
+class RingState(object):
+    """The hosts of each topic and the lookup structures built from them.
+
+    A RingState is never modified once built, except for adding hash rings
+    on first use, so a reloaded ring is swapped in by replacing the whole
+    state.
+    """
+    def __init__(self, ring):
+        self.ring = ring
+        self.ring0 = {}
+        for k in self.ring.keys():
+            self.ring0[k] = itertools.cycle(self.ring[k])
+        self.hash_rings = {}
+
+    def hash_ring(self, key):
+        hash_ring = self.hash_rings.get(key)
+        if hash_ring is None:
+            hash_ring = HashRing(self.ring[key],
+                                 CONF.matchmaker_ring.hash_replicas)
+            self.hash_rings[key] = hash_ring
+        return hash_ring
+
+
 class RingExchange(mm.Exchange):
-    """Match Maker where hosts are loaded from a static JSON formatted file.
+    """Match Maker where hosts are loaded from a JSON formatted file.
 
     __init__ takes optional ring dictionary argument, otherwise
-    loads the ringfile from CONF.mathcmaker_ringfile.
+    loads the ringfile from CONF.matchmaker_ring.ringfile. The ringfile is
+    checked for changes at most every matchmaker_ring.ringfile_poll_interval
+    seconds, and reloaded if it was modified.
     """
     def __init__(self, ring=None):
         super(RingExchange, self).__init__()
 
+        self._ringfile = None
+        self._mtime = None
+        self._next_check = 0
+        self._reload_lock = threading.Lock()
+
         if ring:
-            self.ring = ring
+            self._state = RingState(ring)
         else:
-            fh = open(CONF.matchmaker_ring.ringfile, 'r')
-            self.ring = json.load(fh)
-            fh.close()
-
-        self.ring0 = {}
-        for k in self.ring.keys():
-            self.ring0[k] = itertools.cycle(self.ring[k])
+            self._ringfile = CONF.matchmaker_ring.ringfile
+            self._mtime = os.stat(self._ringfile).st_mtime
+            self._state = RingState(self._load())
+
+    @property
+    def ring(self):
+        return self._state.ring
+
+    @property
+    def ring0(self):
+        return self._state.ring0
+
+    def _load(self):
+        with open(self._ringfile, 'r') as fh:
+            return json.load(fh)
+
+    def _get_state(self):
+        """Return the current ring, reloading the ringfile if it changed.
+
+        Callers must only use the returned state for a lookup, so that they
+        never see parts of two different rings.
+        """
+        interval = CONF.matchmaker_ring.ringfile_poll_interval
+        now = time.time()
+        if self._ringfile and interval > 0 and now >= self._next_check:
+            # Only one thread checks, the others use the current ring.
+            if self._reload_lock.acquire(False):
+                try:
+                    self._next_check = now + interval
+                    self._reload()
+                finally:
+                    self._reload_lock.release()
+        return self._state
+
+    def _reload(self):
+        try:
+            mtime = os.stat(self._ringfile).st_mtime
+            if mtime == self._mtime:
+                return
+            state = RingState(self._load())
+        except (IOError, OSError, ValueError):
+            # The file may be being rewritten, try again next time.
+            LOG.exception(_("Failed to reload ringfile %s, keeping the "
+                            "current ring"), self._ringfile)
+            return
+
+        self._mtime = mtime
+        self._state = state
+        LOG.info(_("Reloaded ringfile %s"), self._ringfile)
 
     def _ring_has(self, key):
-        return key in self.ring0
+        return key in self._get_state().ring0
 
 
 class RoundRobinRingExchange(RingExchange):
@@ -71,13 +189,40 @@ class RoundRobinRingExchange(RingExchange):
         super(RoundRobinRingExchange, self).__init__(ring)
 
     def run(self, key):
-        if not self._ring_has(key):
+        state = self._get_state()
+        if key not in state.ring0:
             LOG.warn(
                 _("No key defining hosts for topic '%s', "
                   "see ringfile") % (key, )
             )
             return []
-        host = next(self.ring0[key])
+        host = next(state.ring0[key])
+        return [(key + '.' + host, host)]
+
+    def candidates(self, key):
+        state = self._get_state()
+        if key not in state.ring:
+            return None
+        return [(key + '.' + host, host) for host in state.ring[key]]
+
+
+class ConsistentHashRingExchange(RoundRobinRingExchange):
+    """A Topic Exchange sending messages with a routing key to a fixed host.
+
+    Messages with the same routing key are sent to the same host for as long
+    as it is in the ring. Messages without a routing key are sent round-robin.
+    """
+    def __init__(self, ring=None):
+        super(ConsistentHashRingExchange, self).__init__(ring)
+
+    def route(self, key, routing_key):
+        state = self._get_state()
+        if key not in state.ring:
+            return self.run(key)
+
+        host = state.hash_ring(key).get_host(routing_key)
+        if host is None:
+            return []
         return [(key + '.' + host, host)]
 
 
@@ -89,19 +234,20 @@ class FanoutRingExchange(RingExchange):
     def run(self, key):
         # Assume starts with "fanout~", strip it for lookup.
         nkey = key.split('fanout~')[1:][0]
-        if not self._ring_has(nkey):
+        state = self._get_state()
+        if nkey not in state.ring:
             LOG.warn(
                 _("No key defining hosts for topic '%s', "
                   "see ringfile") % (nkey, )
             )
             return []
-        return map(lambda x: (key + '.' + x, x), self.ring[nkey])
+        return map(lambda x: (key + '.' + x, x), state.ring[nkey])
 
 
 class MatchMakerRing(mm.MatchMakerBase):
-    """Match Maker where hosts are loaded from a static hashmap."""
+    """Match Maker where hosts are loaded from a hashmap or the ringfile."""
     def __init__(self, ring=None):
         super(MatchMakerRing, self).__init__()
         self.add_binding(mm.FanoutBinding(), FanoutRingExchange(ring))
         self.add_binding(mm.DirectBinding(), mm.DirectExchange())
-        self.add_binding(mm.TopicBinding(), RoundRobinRingExchange(ring))
+        self.add_binding(mm.TopicBinding(), ConsistentHashRingExchange(ring))
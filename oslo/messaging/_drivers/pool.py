@@ -15,10 +15,17 @@
 
 import abc
 import collections
+import os
 import threading
 
 import six
 
+# Items inherited from a parent process. They share their sockets with the
+# parent, so they are kept referenced for the life of the process: once
+# collected, e.g. an amqp connection shuts its socket down, which would tear
+# down the connection of the parent.
+_inherited = []
+
 
 @six.add_metaclass(abc.ABCMeta)
 class Pool(object):
@@ -29,19 +36,36 @@ class Pool(object):
     when using native threads without the GIL.
 
     Resizing is not supported.
+
+    The pool is reset when it is first used in a child process: the items
+    created by the parent share their sockets with it, so they are set aside
+    in _inherited rather than handed out, and new ones are created in the
+    child.
     """
 
     def __init__(self, max_size=4):
         super(Pool, self).__init__()
 
         self._max_size = max_size
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
         self._current_size = 0
         self._cond = threading.Condition()
 
         self._items = collections.deque()
 
+    def _check_pid(self):
+        # The lock may have been held by another thread of the parent when
+        # it forked, so it is replaced rather than acquired.
+        if self._pid != os.getpid():
+            _inherited.extend(self._items)
+            self._reset()
+
     def put(self, item):
         """Return an item to the pool."""
+        self._check_pid()
         with self._cond:
             self._items.appendleft(item)
             self._cond.notify()
@@ -51,6 +75,7 @@ class Pool(object):
 
         This may cause the calling thread to block.
         """
+        self._check_pid()
         with self._cond:
             while True:
                 try:
@@ -76,6 +101,7 @@ class Pool(object):
 
     def iter_free(self):
         """Iterate over free items."""
+        self._check_pid()
         with self._cond:
             while True:
                 try:
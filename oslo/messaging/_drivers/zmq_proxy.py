@@ -0,0 +1,489 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+A multi-core ZeroMQ receiver.
+
+ZmqProxy forwards messages from one greenthread per topic within a single
+eventlet process. ZmqProxyDevice instead shards incoming messages by topic
+across a number of native worker threads or processes, each of which forwards
+its topics to their IPC sockets from a zmq poller loop.
+
+Rather than dropping messages when a topic backs up, a worker stops reading
+its shard once rpc_zmq_topic_backlog messages are pending for one of its
+topics. The receiver then parks the messages of that shard, up to the same
+backlog, while it keeps forwarding the other shards. Messages are only
+dropped once the parked backlog of their shard is full, or once they are
+older than rpc_cast_timeout, i.e. once the sender has given up on them.
+"""
+
+import collections
+import logging
+import multiprocessing
+import os
+import re
+import threading
+import time
+import zlib
+
+from six import moves
+
+from oslo.messaging._drivers import impl_zmq
+from oslo.messaging.openstack.common import excutils
+from oslo.messaging.openstack.common import importutils
+
+zmq = importutils.try_import('zmq')
+
+LOG = logging.getLogger(__name__)
+
+# FIXME(markmc): remove this
+_ = lambda s: s
+
+# Upper bound, in seconds, on how long the forwarding loops block, so that
+# close() is noticed promptly.
+_POLL_INTERVAL = 1.0
+
+# Number of messages read from a socket before servicing the other sockets.
+_BATCH_SIZE = 128
+
+# Backlog of a topic, and of the messages parked for a shard, when
+# rpc_zmq_topic_backlog isn't set.
+_DEFAULT_BACKLOG = 1000
+
+# It takes some time for subscribers to connect to a new PUB socket, so the
+# first messages sent to a fanout topic are held back for this many seconds.
+_PUB_WARMUP = 0.5
+
+_PATHSEP = set((os.path.sep or '', os.path.altsep or '', '/', '\\'))
+_BADCHARS = re.compile(r'[%s]' % re.escape(''.join(_PATHSEP)))
+
+
+def _backlog(conf):
+    return conf.rpc_zmq_topic_backlog or _DEFAULT_BACKLOG
+
+
+class _TopicForwarder(object):
+    """The outgoing socket, pending messages and counters of a topic."""
+
+    def __init__(self, sock, ready_at):
+        self.sock = sock
+        self.ready_at = ready_at
+        self.pending = collections.deque()
+        self.forwarded = 0
+        self.dropped = 0
+        self.reported = 0
+
+
+class ProxyWorker(object):
+    """Forwards the messages of a shard of topics to their IPC sockets."""
+
+    def __init__(self, conf, in_addr, stats_queue=None):
+        self.conf = conf
+        self.in_addr = in_addr
+        self.topics = {}
+        self.bound = threading.Event()
+        self.stats_queue = stats_queue
+        self._backed_up = set()
+        self._running = False
+        self._last_report = time.time()
+        self._last_publish = 0
+
+    def run(self, ctxt=None):
+        """Run the forwarding loop until stop() is called.
+
+        The context is shared with the receiver when running as a thread, so
+        that inproc sockets can be used. A worker process creates its own.
+        """
+        if ctxt is None:
+            ctxt = zmq.Context()
+
+        self._running = True
+        inq = ctxt.socket(zmq.PULL)
+        inq.set_hwm(_backlog(self.conf))
+        inq.bind(self.in_addr)
+        self.bound.set()
+
+        try:
+            self._forward_loop(ctxt, inq)
+        finally:
+            inq.close(linger=0)
+            for forwarder in self.topics.values():
+                forwarder.sock.close(linger=0)
+
+    def stop(self):
+        self._running = False
+
+    def stats(self):
+        """Return the forwarded, dropped and pending counts of each topic."""
+        return dict((topic, {'forwarded': forwarder.forwarded,
+                             'dropped': forwarder.dropped,
+                             'pending': len(forwarder.pending)})
+                    for topic, forwarder in self.topics.items())
+
+    def _forward_loop(self, ctxt, inq):
+        backlog = _backlog(self.conf)
+
+        while self._running:
+            now = time.time()
+            timeout = _POLL_INTERVAL
+            poller = zmq.Poller()
+            blocked = False
+
+            for forwarder in self._backed_up:
+                if len(forwarder.pending) >= backlog:
+                    blocked = True
+                if forwarder.ready_at > now:
+                    timeout = min(timeout, forwarder.ready_at - now)
+                else:
+                    poller.register(forwarder.sock, zmq.POLLOUT)
+                deadline = forwarder.pending[0][0]
+                timeout = max(0, min(timeout, deadline - now))
+
+            # Once a topic is backed up, stop reading from the receiver so
+            # that it, and in turn the senders, block on their high-water
+            # marks.
+            if not blocked:
+                poller.register(inq, zmq.POLLIN)
+
+            events = dict(poller.poll(timeout * 1000))
+            if events.get(inq):
+                self._receive(ctxt, inq)
+            self._flush(time.time())
+            self._report(time.time())
+            self._publish(time.time())
+
+    def _receive(self, ctxt, inq):
+        backlog = _backlog(self.conf)
+        for i in moves.range(_BATCH_SIZE):
+            try:
+                data = inq.recv_multipart(copy=False, flags=zmq.NOBLOCK)
+            except zmq.Again:
+                return
+
+            topic, sock_type = impl_zmq._proxy_topic(data[1].bytes)
+            forwarder = self.topics.get(topic)
+            if forwarder is None:
+                forwarder = self._create_forwarder(ctxt, topic, sock_type)
+                if forwarder is None:
+                    continue
+
+            now = time.time()
+            deadline = now + self.conf.rpc_cast_timeout
+            if (forwarder.pending or forwarder.ready_at > now or
+                    not self._send(forwarder, data)):
+                forwarder.pending.append((deadline, data))
+                self._backed_up.add(forwarder)
+                # Stop reading the shard until the topic catches up.
+                if len(forwarder.pending) >= backlog:
+                    return
+
+    def _create_forwarder(self, ctxt, topic, sock_type):
+        LOG.info(_("Creating proxy for topic: %s"), topic)
+
+        # The topic is received over the network, don't trust this input.
+        if _BADCHARS.search(topic) is not None:
+            LOG.warn(_("Topic contained dangerous characters."))
+            return None
+
+        sock = ctxt.socket(sock_type)
+        sock.set_hwm(_backlog(self.conf))
+        try:
+            sock.bind("ipc://%s/zmq_topic_%s" %
+                      (self.conf.rpc_zmq_ipc_dir, topic))
+        except zmq.ZMQError:
+            LOG.error(_("Topic socket file creation failed."))
+            sock.close(linger=0)
+            return None
+
+        ready_at = time.time()
+        if sock_type == zmq.PUB:
+            ready_at += _PUB_WARMUP
+
+        forwarder = _TopicForwarder(sock, ready_at)
+        self.topics[topic] = forwarder
+        return forwarder
+
+    def _send(self, forwarder, data):
+        try:
+            forwarder.sock.send_multipart(data, copy=False, flags=zmq.NOBLOCK)
+        except zmq.Again:
+            return False
+        forwarder.forwarded += 1
+        return True
+
+    def _flush(self, now):
+        for forwarder in list(self._backed_up):
+            if forwarder.ready_at > now:
+                continue
+
+            while forwarder.pending:
+                deadline, data = forwarder.pending[0]
+                if deadline < now:
+                    forwarder.dropped += 1
+                    LOG.error(_("Message for topic %(topic)s expired while "
+                                "waiting for a consumer. Dropping message.") %
+                              {'topic': data[1].bytes})
+                elif not self._send(forwarder, data):
+                    break
+                forwarder.pending.popleft()
+
+            if not forwarder.pending:
+                self._backed_up.discard(forwarder)
+
+    def _report(self, now):
+        interval = self.conf.rpc_zmq_proxy_stats_interval
+        elapsed = now - self._last_report
+        if not interval or elapsed < interval:
+            return
+
+        for topic, forwarder in sorted(self.topics.items()):
+            count = forwarder.forwarded - forwarder.reported
+            forwarder.reported = forwarder.forwarded
+            if not (count or forwarder.pending):
+                continue
+            LOG.info(_("Topic %(topic)s: %(rate).1f msg/s, %(forwarded)d "
+                       "forwarded, %(dropped)d dropped, %(pending)d "
+                       "pending"),
+                     {'topic': topic, 'rate': count / elapsed,
+                      'forwarded': forwarder.forwarded,
+                      'dropped': forwarder.dropped,
+                      'pending': len(forwarder.pending)})
+        self._last_report = now
+
+    def _publish(self, now):
+        # A worker process hands its counters over to the receiver, which
+        # can't see them otherwise.
+        if (self.stats_queue is None or
+                now - self._last_publish < _POLL_INTERVAL):
+            return
+        self.stats_queue.put(self.stats())
+        self._last_publish = now
+
+
+class ZmqProxyDevice(object):
+    """A topic-sharded, multi-core alternative to ZmqProxy.
+
+    Messages received on rpc_zmq_port are sharded by topic across
+    rpc_zmq_proxy_workers workers, so all messages for a topic are forwarded
+    in order by the same worker.
+
+    Messages dropped by the receiver, because the backlog parked for their
+    worker is full, are counted per topic in the dropped attribute and
+    logged every rpc_zmq_proxy_stats_interval seconds. See stats() for the
+    counters of the workers.
+    """
+
+    def __init__(self, conf):
+        if not zmq:
+            raise ImportError("Failed to import zmq")
+
+        self.conf = conf
+        self.workers = []
+        self.dropped = {}
+        self._workers = []
+        self._thread = None
+        self._ctxt = None
+        self._running = False
+        self._stats_queue = None
+        self._process_stats = {}
+        self._stats_lock = threading.Lock()
+        self._reported = {}
+        self._last_report = time.time()
+
+    def _worker_addr(self, index):
+        if self.conf.rpc_zmq_proxy_use_processes:
+            return "ipc://%s/zmq_proxy_worker_%d" % (
+                self.conf.rpc_zmq_ipc_dir, index)
+        return "inproc://zmq_proxy_worker_%d" % index
+
+    def consume_in_thread(self):
+        """Runs the ZmqProxyDevice service."""
+        ipc_dir = self.conf.rpc_zmq_ipc_dir
+        try:
+            os.makedirs(ipc_dir)
+        except os.error:
+            if not os.path.isdir(ipc_dir):
+                with excutils.save_and_reraise_exception():
+                    LOG.error(_("Required IPC directory does not exist at"
+                                " %s") % (ipc_dir, ))
+
+        self._running = True
+        use_processes = self.conf.rpc_zmq_proxy_use_processes
+        if use_processes:
+            self._stats_queue = multiprocessing.Queue()
+        for i in moves.range(max(1, self.conf.rpc_zmq_proxy_workers)):
+            self.workers.append(ProxyWorker(self.conf, self._worker_addr(i),
+                                            self._stats_queue))
+
+        # Worker processes are forked before any context is created, as
+        # contexts are not fork safe.
+        if use_processes:
+            for worker in self.workers:
+                self._start_worker(multiprocessing.Process, worker.run)
+
+        self._ctxt = zmq.Context(self.conf.rpc_zmq_contexts)
+
+        if not use_processes:
+            for worker in self.workers:
+                self._start_worker(threading.Thread, worker.run,
+                                   (self._ctxt, ))
+                worker.bound.wait()
+
+        self._thread = threading.Thread(target=self._forward_loop)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _start_worker(self, cls, target, args=()):
+        worker = cls(target=target, args=args)
+        worker.daemon = True
+        worker.start()
+        self._workers.append(worker)
+
+    def _forward_loop(self):
+        backlog = _backlog(self.conf)
+
+        in_addr = "tcp://%s" % impl_zmq._join_host_port(
+            self.conf.rpc_zmq_bind_address, self.conf.rpc_zmq_port)
+        inq = self._ctxt.socket(zmq.PULL)
+        inq.set_hwm(backlog)
+        # ZeroMQ only accepts IPv6 addresses once asked to.
+        if '[' in in_addr:
+            inq.setsockopt(zmq.IPV6, 1)
+        inq.bind(in_addr)
+
+        outqs = []
+        for worker in self.workers:
+            outq = self._ctxt.socket(zmq.PUSH)
+            outq.set_hwm(backlog)
+            outq.connect(worker.in_addr)
+            outqs.append(outq)
+        parked = [collections.deque() for outq in outqs]
+
+        try:
+            while self._running:
+                poller = zmq.Poller()
+                poller.register(inq, zmq.POLLIN)
+                for outq, pending in zip(outqs, parked):
+                    if pending:
+                        poller.register(outq, zmq.POLLOUT)
+
+                events = dict(poller.poll(_POLL_INTERVAL * 1000))
+                for outq, pending in zip(outqs, parked):
+                    if pending and events.get(outq):
+                        self._flush_parked(outq, pending)
+                if events.get(inq):
+                    self._receive(inq, outqs, parked, backlog)
+                self._collect_stats()
+                self._report(time.time())
+        finally:
+            inq.close(linger=0)
+            for outq in outqs:
+                outq.close(linger=0)
+
+    def _receive(self, inq, outqs, parked, backlog):
+        for i in moves.range(_BATCH_SIZE):
+            try:
+                data = inq.recv_multipart(copy=False, flags=zmq.NOBLOCK)
+            except zmq.Again:
+                return
+
+            topic, sock_type = impl_zmq._proxy_topic(data[1].bytes)
+            shard = (zlib.crc32(topic) & 0xffffffff) % len(outqs)
+            pending = parked[shard]
+
+            # The worker of the shard is backed up, its messages are parked
+            # so that the other shards keep being forwarded.
+            if pending or not self._send(outqs[shard], data):
+                if len(pending) >= backlog:
+                    self.dropped[topic] = self.dropped.get(topic, 0) + 1
+                    LOG.error(_("Backlog of receiver worker %(shard)d full. "
+                                "Dropping message for topic %(topic)s.") %
+                              {'shard': shard, 'topic': topic})
+                else:
+                    pending.append(data)
+
+    def _flush_parked(self, outq, pending):
+        while pending and self._send(outq, pending[0]):
+            pending.popleft()
+
+    @staticmethod
+    def _send(outq, data):
+        try:
+            outq.send_multipart(data, copy=False, flags=zmq.NOBLOCK)
+        except zmq.Again:
+            return False
+        return True
+
+    def _collect_stats(self):
+        if self._stats_queue is None:
+            return
+        while True:
+            try:
+                stats = self._stats_queue.get_nowait()
+            except moves.queue.Empty:
+                return
+            with self._stats_lock:
+                self._process_stats.update(stats)
+
+    def _report(self, now):
+        interval = self.conf.rpc_zmq_proxy_stats_interval
+        if not interval or now - self._last_report < interval:
+            return
+
+        for topic, dropped in sorted(self.dropped.items()):
+            count = dropped - self._reported.get(topic, 0)
+            if count:
+                LOG.warn(_("Topic %(topic)s: %(count)d messages dropped by "
+                           "the receiver, %(dropped)d in total"),
+                         {'topic': topic, 'count': count,
+                          'dropped': dropped})
+            self._reported[topic] = dropped
+        self._last_report = now
+
+    def stats(self):
+        """Return the forwarded, dropped and pending counts of each topic.
+
+        The counters of worker processes are up to _POLL_INTERVAL seconds
+        old. The dropped counts include the messages dropped by the
+        receiver.
+        """
+        if self._stats_queue is not None:
+            with self._stats_lock:
+                stats = dict((topic, dict(counts)) for topic, counts
+                             in self._process_stats.items())
+        else:
+            stats = {}
+            for worker in self.workers:
+                stats.update(worker.stats())
+
+        for topic, dropped in list(self.dropped.items()):
+            counts = stats.setdefault(topic, {'forwarded': 0, 'dropped': 0,
+                                              'pending': 0})
+            counts['dropped'] += dropped
+        return stats
+
+    def wait(self):
+        for thread in [self._thread] + self._workers:
+            while thread is not None and thread.is_alive():
+                thread.join(_POLL_INTERVAL)
+
+    def close(self):
+        self._running = False
+        for worker in self.workers:
+            worker.stop()
+        for process in self._workers:
+            if isinstance(process, multiprocessing.Process):
+                process.terminate()
+
+        self.wait()
+        if self._ctxt is not None:
+            self._ctxt.term()
+            self._ctxt = None
@@ -13,18 +13,152 @@
 #    under the License.
 
 import abc
+import collections
+import contextlib
+import logging
+import sys
+import threading
 
+from oslo.config import cfg
 import six
 
+LOG = logging.getLogger(__name__)
+
+_pool_opts = [
+    cfg.IntOpt('rpc_thread_pool_size',
+               default=64,
+               help='Size of the thread pool of the eventlet and threading '
+                    'executors.'),
+]
+
+
+def run_with(ctxt, callback):
+    """Run the body of a with statement whose context was entered."""
+    try:
+        try:
+            callback()
+        except Exception:
+            if not ctxt.__exit__(*sys.exc_info()):
+                raise
+        else:
+            ctxt.__exit__(None, None, None)
+    except Exception:
+        LOG.exception("Unhandled exception while handling a message")
+
+
+@contextlib.contextmanager
+def release_on_exit(ctxt, release):
+    """Wrap the context of a message so that release() is called on exit.
+
+    Executors use it to release the slot a message took in a pool once the
+    message was dispatched.
+    """
+    try:
+        with ctxt as callback:
+            yield callback
+    finally:
+        release()
+
+
+class SequentialLanes(object):
+    """Runs the messages with the same sequence key one after the other.
+
+    The messages of a key are run in the order they were added, by a
+    single worker for as long as messages of that key keep arriving.
+    Messages with different keys are run by different workers.
+
+    A message queued behind the running one of its key takes a slot of the
+    backlog semaphore, if one is given, until it was run. Executors call
+    wait_for_backlog() before polling, so that they stop polling while the
+    backlog is full rather than buffering messages without limit.
+    """
+
+    def __init__(self, backlog=None):
+        self._lanes = {}
+        self._lock = threading.Lock()
+        self._backlog = backlog
+
+    def add(self, key, ctxt, callback):
+        """Add a message whose dispatcher context was entered.
+
+        Returns True if a worker must be started to run() the lane of the
+        key, False if the message was queued behind the running one.
+        """
+        with self._lock:
+            lane = self._lanes.get(key)
+            if lane is not None:
+                # The poller waited for a free slot, and is the only one
+                # taking them, so this doesn't block.
+                if self._backlog is not None:
+                    self._backlog.acquire()
+                lane.append((ctxt, callback, True))
+                return False
+            self._lanes[key] = collections.deque([(ctxt, callback, False)])
+            return True
+
+    def run(self, key):
+        """Run the messages of a key until there are none left."""
+        while True:
+            with self._lock:
+                ctxt, callback, queued = self._lanes[key][0]
+            try:
+                run_with(ctxt, callback)
+            finally:
+                if queued and self._backlog is not None:
+                    self._backlog.release()
+            with self._lock:
+                lane = self._lanes[key]
+                lane.popleft()
+                if not lane:
+                    del self._lanes[key]
+                    return
+
+    def wait_for_backlog(self):
+        """Wait until a message can be queued behind a running one."""
+        if self._backlog is not None:
+            self._backlog.acquire()
+            self._backlog.release()
+
 
 @six.add_metaclass(abc.ABCMeta)
 class ExecutorBase(object):
 
+    # Whether messages keep being received and dispatched while a message
+    # waits in a worker of the executor, which batched() endpoint methods
+    # rely on.
+    concurrent = False
+
+    # Whether start() returns while the executor keeps handling messages on
+    # its own, without the caller running e.g. an event loop, which worker
+    # processes rely on.
+    background = False
+
     def __init__(self, conf, listener, dispatcher):
         self.conf = conf
         self.listener = listener
         self.dispatcher = dispatcher
 
+    def _get_pool(self, incoming):
+        """Return the name and size of the pool to dispatch a message in.
+
+        None is returned for messages dispatched in the default pool.
+        """
+        get_pool = getattr(self.dispatcher, 'get_executor_pool', None)
+        if get_pool is None:
+            return None
+        return get_pool(incoming)
+
+    def _get_sequence_key(self, incoming):
+        """Return the key of the messages to run in sequence with a message.
+
+        None is returned for messages which can run concurrently with any
+        other.
+        """
+        get_key = getattr(self.dispatcher, 'get_sequence_key', None)
+        if get_key is None:
+            return None
+        return get_key(incoming)
+
     @abc.abstractmethod
     def start(self):
         "Start polling for incoming messages."
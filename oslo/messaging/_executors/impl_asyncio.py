@@ -0,0 +1,190 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import threading
+
+import greenlet
+from oslo.config import cfg
+
+from oslo.messaging._executors import base
+from oslo.messaging import _utils as utils
+from oslo.messaging import localcontext
+from oslo.messaging.openstack.common import excutils
+
+asyncio = utils.asyncio
+
+_asyncio_opts = [
+    cfg.IntOpt('rpc_asyncio_max_in_flight',
+               default=64,
+               help='Maximum number of messages the asyncio executor '
+                    'dispatches at once. It stops polling for messages '
+                    'while that many are in flight.'),
+]
+
+
+def _ensure_future(coro_or_future, loop):
+    # asyncio.async() was renamed to ensure_future() in python 3.4.4, and
+    # async is a keyword from python 3.7.
+    ensure_future = (getattr(asyncio, 'ensure_future', None) or
+                     getattr(asyncio, 'async'))
+    return ensure_future(coro_or_future, loop=loop)
+
+
+class AsyncioExecutor(base.ExecutorBase):
+
+    """A message executor which dispatches messages on an asyncio event loop.
+
+    This is an executor for services built on asyncio. It dispatches
+    messages on the event loop of the thread which called start(), which the
+    service is expected to run. Messages are polled for from a native thread,
+    so that a blocking poll() does not block the loop.
+
+    Each message is dispatched in its own greenlet on the loop's thread.
+    Endpoint methods may be coroutines, or return futures: the greenlet of
+    the message is then suspended until the result is available, and the
+    loop carries on with other messages in the meantime. The reply is sent
+    from the loop once the dispatcher resumes. Endpoint methods which are
+    not coroutines block the loop while they run.
+
+    Like the eventlet and threading executors, it only polls for a message
+    once fewer than rpc_asyncio_max_in_flight messages are being
+    dispatched, so that the excess stays on the broker.
+
+    The stop() method stops dispatching new messages, any message returned
+    by a poll() in progress is requeued. The wait() method waits for the
+    dispatched messages to be processed. It runs the event loop if it isn't
+    running, so it must not be called from the loop while it is running.
+    """
+
+    def __init__(self, conf, listener, dispatcher):
+        super(AsyncioExecutor, self).__init__(conf, listener, dispatcher)
+        if asyncio is None:
+            raise ImportError("Failed to import asyncio, the trollius "
+                              "package is required on python 2")
+
+        self.conf.register_opts(_asyncio_opts)
+        self._loop = None
+        self._thread = None
+        self._stopping = threading.Event()
+        self._in_flight = 0
+        # Not per run: messages of a previous run still hold their slot.
+        self._free_slots = threading.Semaphore(
+            self.conf.rpc_asyncio_max_in_flight)
+        self._stopped = threading.Event()
+        self._drained = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self._thread is not None:
+            return
+
+        self._loop = asyncio.get_event_loop()
+        self._drained = asyncio.Future(loop=self._loop)
+        # Each run has its own event, so that a polling thread of a previous
+        # run still blocked in poll() requeues the message it gets.
+        stopping = self._stopping = threading.Event()
+        self._stopped.clear()
+
+        @excutils.forever_retry_uncaught_exceptions
+        def _executor_thread():
+            while not stopping.is_set():
+                self._free_slots.acquire()
+                if stopping.is_set():
+                    self._free_slots.release()
+                    return
+                incoming = self.listener.poll()
+                # stop() and wait() must not race with dispatching.
+                with self._lock:
+                    accepted = not stopping.is_set()
+                    if accepted:
+                        self._in_flight += 1
+                if not accepted:
+                    self._free_slots.release()
+                    incoming.requeue()
+                    continue
+
+                # The dispatcher is entered here rather than on the loop, as
+                # it may block until an endpoint method is under its
+                # concurrency limit.
+                try:
+                    ctxt = self.dispatcher(incoming,
+                                           executor_callback=self._wait_for)
+                    callback = ctxt.__enter__()
+                except Exception:
+                    self._loop.call_soon_threadsafe(self._done)
+                    raise
+                self._loop.call_soon_threadsafe(self._spawn, ctxt, callback)
+
+        self._thread = threading.Thread(target=_executor_thread)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _spawn(self, ctxt, callback):
+        greenlet.greenlet(self._process).switch(ctxt, callback)
+
+    def _process(self, ctxt, callback):
+        try:
+            base.run_with(ctxt, callback)
+        finally:
+            self._done()
+
+    def _done(self):
+        with self._lock:
+            self._in_flight -= 1
+        self._free_slots.release()
+        self._check_stopped()
+
+    def _wait_for(self, func, *args, **kwargs):
+        result = func(*args, **kwargs)
+        if not (asyncio.iscoroutine(result) or
+                isinstance(result, asyncio.Future)):
+            return result
+
+        # Switch back to the loop until the endpoint is done. The dispatcher
+        # set the local context of this message in the thread, the other
+        # messages handled by the loop in the meantime must not see it.
+        future = _ensure_future(result, self._loop)
+        current = greenlet.getcurrent()
+        future.add_done_callback(lambda f: current.switch())
+        ctxt = localcontext.get_local_context(None)
+        localcontext.clear_local_context()
+        try:
+            current.parent.switch()
+        finally:
+            localcontext.set_local_context(ctxt)
+        return future.result()
+
+    def _check_stopped(self):
+        with self._lock:
+            if not self._stopping.is_set() or self._in_flight:
+                return
+        self._stopped.set()
+        if not self._drained.done():
+            self._drained.set_result(None)
+
+    def stop(self):
+        if self._thread is None:
+            return
+        with self._lock:
+            self._stopping.set()
+        self._loop.call_soon_threadsafe(self._check_stopped)
+
+    def wait(self):
+        if self._thread is None:
+            return
+        if self._loop.is_running():
+            # Called from another thread than the loop's.
+            while not self._stopped.wait(1.0):
+                pass
+        else:
+            self._loop.run_until_complete(self._drained)
+        self._thread = None
@@ -13,23 +13,58 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+import logging
 import sys
+import time
 
 import eventlet
 from eventlet import greenpool
+from eventlet import semaphore
 import greenlet
-
 from oslo.config import cfg
+from six import moves
 
 from oslo.messaging._executors import base
 from oslo.messaging.openstack.common import excutils
 
-_eventlet_opts = [
-    cfg.IntOpt('rpc_thread_pool_size',
-               default=64,
-               help='Size of RPC greenthread pool.'),
+LOG = logging.getLogger(__name__)
+
+_autoscale_opts = [
+    cfg.BoolOpt('rpc_thread_pool_autoscale',
+                default=False,
+                help='Grow and shrink the greenthread pool of the eventlet '
+                     'executor between rpc_thread_pool_min_size and '
+                     'rpc_thread_pool_max_size, starting from '
+                     'rpc_thread_pool_size, depending on how busy it is.'),
+    cfg.IntOpt('rpc_thread_pool_min_size',
+               default=8,
+               help='Minimum size of an autoscaled greenthread pool.'),
+    cfg.IntOpt('rpc_thread_pool_max_size',
+               default=256,
+               help='Maximum size of an autoscaled greenthread pool.'),
+    cfg.IntOpt('rpc_thread_pool_autoscale_interval',
+               default=5,
+               help='Seconds between the resizes of an autoscaled '
+                    'greenthread pool. Must be positive.'),
 ]
 
+_eventlet_opts = base._pool_opts + _autoscale_opts
+
+# The pool grows by this many greenthreads while messages wait for it,
+_AIMD_INCREASE = 4
+# and shrinks by this factor once the endpoints slow down as it grows,
+_AIMD_DECREASE = 0.5
+# i.e. once their latency is this many times their usual latency.
+_LATENCY_FACTOR = 2.0
+# The pool is deemed to hold up messages if the executor waited for a free
+# greenthread for this fraction of an interval.
+_QUEUEING_THRESHOLD = 0.1
+# It is deemed too large below this average utilization.
+_IDLE_UTILIZATION = 0.5
+# Weight of an interval in the usual latency of the endpoints.
+_LATENCY_WEIGHT = 0.2
+
 
 def spawn_with(ctxt, pool):
     """This is the equivalent of a with statement
@@ -60,22 +95,162 @@ def spawn_with(ctxt, pool):
     return thread
 
 
+class _MeasuredGreenPool(greenpool.GreenPool):
+    """A GreenPool which measures how busy it is."""
+
+    def __init__(self, size):
+        super(_MeasuredGreenPool, self).__init__(size)
+        self.calls = 0
+        self.busy = 0.0
+
+    def spawn(self, function, *args, **kwargs):
+        def measured():
+            start = time.time()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.calls += 1
+                self.busy += time.time() - start
+        return super(_MeasuredGreenPool, self).spawn(measured)
+
+    def resize(self, new_size):
+        # GreenPool.resize() doesn't wake up the greenthreads waiting for
+        # a free greenthread when the pool grows.
+        for i in moves.range(new_size - self.size):
+            self.size += 1
+            self.sem.release()
+        if new_size < self.size:
+            super(_MeasuredGreenPool, self).resize(new_size)
+
+
+class PoolAutoscaler(object):
+    """Sizes a greenthread pool with additive increase/multiplicative decrease.
+
+    At each interval, the pool grows by _AIMD_INCREASE greenthreads if
+    messages waited for it, and it is shrunk by _AIMD_DECREASE if the
+    latency of the endpoints grew to _LATENCY_FACTOR times their usual
+    latency, e.g. because they contend for a database. A pool which is
+    mostly idle shrinks by _AIMD_INCREASE greenthreads.
+
+    The last decisions are kept in the decisions attribute, and logged, to
+    help tuning the pool.
+    """
+
+    Decision = collections.namedtuple('Decision',
+                                      ['time', 'size', 'new_size', 'reason',
+                                       'queueing', 'utilization',
+                                       'latency'])
+
+    def __init__(self, min_size, max_size):
+        self.min_size = min_size
+        self.max_size = max(min_size, max_size)
+        self.usual_latency = None
+        self.decisions = collections.deque(maxlen=100)
+
+    def decide(self, size, queueing, utilization, latency):
+        """Return the new size of a pool.
+
+        :param size: the current size of the pool
+        :param queueing: the fraction of the interval the executor waited
+                         for a free greenthread
+        :param utilization: the average fraction of the pool which was busy
+        :param latency: the average duration of the calls which completed,
+                        None if no call did
+        """
+        reason = None
+        new_size = size
+        if (latency is not None and self.usual_latency is not None and
+                latency > self.usual_latency * _LATENCY_FACTOR):
+            new_size = int(size * _AIMD_DECREASE)
+            reason = 'latency'
+        elif queueing > _QUEUEING_THRESHOLD:
+            new_size = size + _AIMD_INCREASE
+            reason = 'queueing'
+        elif utilization < _IDLE_UTILIZATION:
+            new_size = size - _AIMD_INCREASE
+            reason = 'idle'
+        new_size = max(self.min_size, min(self.max_size, new_size))
+
+        # The latency at which the pool was backed off from isn't usual,
+        # unless it can't be backed off any further.
+        if latency is not None and new_size >= size:
+            if self.usual_latency is None:
+                self.usual_latency = latency
+            else:
+                self.usual_latency += (latency -
+                                       self.usual_latency) * _LATENCY_WEIGHT
+
+        decision = self.Decision(time.time(), size, new_size, reason,
+                                 queueing, utilization, latency)
+        self.decisions.append(decision)
+        if new_size != size:
+            LOG.info('Resizing the executor pool from %(size)d to '
+                     '%(new_size)d (%(reason)s): queueing %(queueing).2f, '
+                     'utilization %(utilization).2f, latency %(latency)s',
+                     decision._asdict())
+        return new_size
+
+
 class EventletExecutor(base.ExecutorBase):
 
     """A message executor which integrates with eventlet.
 
     This is an executor which polls for incoming messages from a greenthread
-    and dispatches each message in its own greenthread.
+    and dispatches each message in its own greenthread. It only polls for a
+    message once a greenthread of the pool is free to dispatch it, so that
+    the excess of a burst of messages is left with the broker.
+
+    The messages of endpoint methods given a pool by executor_pool() are
+    dispatched in a pool of that name instead. Up to as many of them as the
+    size of the pool wait for one of its greenthreads to be free without
+    holding up the other messages. Polling stops while a pool has that many
+    messages waiting.
+
+    Messages of endpoint methods marked as sequential() are run one after
+    the other, in the order they were received, if they have the same
+    sequence key. They are run by a single greenthread while messages with
+    their key keep arriving. Polling stops while twice rpc_thread_pool_size
+    messages are waiting behind the running ones of their key.
+
+    With rpc_thread_pool_autoscale set, a PoolAutoscaler resizes the default
+    pool every rpc_thread_pool_autoscale_interval seconds, see pool_size and
+    the decisions of the autoscaler attribute.
 
     The stop() method kills the message polling greenthread and the wait()
     method waits for all message dispatch greenthreads to complete.
     """
 
+    concurrent = True
+    background = True
+
     def __init__(self, conf, listener, dispatcher):
         super(EventletExecutor, self).__init__(conf, listener, dispatcher)
         self.conf.register_opts(_eventlet_opts)
         self._thread = None
-        self._greenpool = greenpool.GreenPool(self.conf.rpc_thread_pool_size)
+        self.autoscaler = None
+        if self.conf.rpc_thread_pool_autoscale:
+            if self.conf.rpc_thread_pool_autoscale_interval <= 0:
+                raise ValueError('rpc_thread_pool_autoscale_interval must '
+                                 'be positive')
+            self.autoscaler = PoolAutoscaler(
+                self.conf.rpc_thread_pool_min_size,
+                self.conf.rpc_thread_pool_max_size)
+            self._greenpool = _MeasuredGreenPool(
+                max(self.autoscaler.min_size,
+                    min(self.autoscaler.max_size,
+                        self.conf.rpc_thread_pool_size)))
+        else:
+            self._greenpool = greenpool.GreenPool(
+                self.conf.rpc_thread_pool_size)
+        self._autoscale_thread = None
+        self._waited = 0.0
+        self._greenpools = {}
+        self._backlogs = {}
+        self._pending = greenpool.GreenPool(sys.maxsize)
+        # Messages waiting behind the running one of their sequence key are
+        # bounded like those waiting for a named pool.
+        self._lanes = base.SequentialLanes(
+            semaphore.Semaphore(2 * self.conf.rpc_thread_pool_size))
 
     def start(self):
         if self._thread is not None:
@@ -85,25 +260,116 @@ class EventletExecutor(base.ExecutorBase):
         def _executor_thread():
             try:
                 while True:
+                    self._wait_for_free_thread()
                     incoming = self.listener.poll()
-                    spawn_with(ctxt=self.dispatcher(incoming),
-                               pool=self._greenpool)
+                    pool = self._get_greenpool(incoming)
+                    key = self._get_sequence_key(incoming)
+                    if key is not None:
+                        ctxt = self._admit(pool, self.dispatcher(incoming))
+                        callback = ctxt.__enter__()
+                        if self._lanes.add(key, ctxt, callback):
+                            self._spawn(pool, self._lanes.run, key)
+                    elif pool is self._greenpool:
+                        spawn_with(ctxt=self.dispatcher(incoming), pool=pool)
+                    else:
+                        # Wait for a thread of the pool without holding up
+                        # the messages of the other pools.
+                        ctxt = self._admit(pool, self.dispatcher(incoming))
+                        self._pending.spawn_n(spawn_with, ctxt=ctxt,
+                                              pool=pool)
             except greenlet.GreenletExit:
                 return
 
         self._thread = eventlet.spawn(_executor_thread)
+        if self.autoscaler is not None:
+            self._autoscale_thread = eventlet.spawn(self._autoscale)
+
+    @property
+    def pool_size(self):
+        "The current size of the default greenthread pool."
+        return self._greenpool.size
+
+    def _autoscale(self):
+        interval = self.conf.rpc_thread_pool_autoscale_interval
+        pool = self._greenpool
+        try:
+            while True:
+                start = time.time()
+                calls, busy, waited = pool.calls, pool.busy, self._waited
+                eventlet.sleep(interval)
+                elapsed = time.time() - start
+                if elapsed <= 0:
+                    # e.g. the clock was set back
+                    continue
+                calls = pool.calls - calls
+                latency = (pool.busy - busy) / calls if calls else None
+                pool.resize(self.autoscaler.decide(
+                    pool.size,
+                    queueing=(self._waited - waited) / elapsed,
+                    utilization=(pool.busy - busy) / (pool.size * elapsed),
+                    latency=latency))
+        except greenlet.GreenletExit:
+            return
+
+    def _spawn(self, pool, func, *args, **kwargs):
+        if pool is self._greenpool:
+            pool.spawn(func, *args, **kwargs)
+        else:
+            self._pending.spawn_n(pool.spawn, func, *args, **kwargs)
+
+    def _get_greenpool(self, incoming):
+        pool = self._get_pool(incoming)
+        if pool is None:
+            return self._greenpool
+        name, size = pool
+        if name not in self._greenpools:
+            pool = greenpool.GreenPool(size)
+            # A message of the pool takes a slot from being received until
+            # it was dispatched: size of them run and as many wait.
+            self._backlogs[pool] = semaphore.Semaphore(2 * size)
+            self._greenpools[name] = pool
+        return self._greenpools[name]
+
+    def _admit(self, pool, ctxt):
+        if pool is self._greenpool:
+            return ctxt
+        backlog = self._backlogs[pool]
+        backlog.acquire()
+        return base.release_on_exit(ctxt, backlog.release)
+
+    def _wait_for_free_thread(self):
+        # Only this greenthread spawns into the pool, so a thread is still
+        # free once the message is received.
+        start = time.time()
+        self._greenpool.sem.acquire()
+        self._greenpool.sem.release()
+        # The pool of the next message isn't known yet, so wait until no
+        # pool has its backlog full.
+        for backlog in list(self._backlogs.values()):
+            backlog.acquire()
+            backlog.release()
+        self._lanes.wait_for_backlog()
+        self._waited += time.time() - start
 
     def stop(self):
         if self._thread is None:
             return
         self._thread.kill()
+        if self._autoscale_thread is not None:
+            self._autoscale_thread.kill()
 
     def wait(self):
         if self._thread is None:
             return
+        self._pending.waitall()
         self._greenpool.waitall()
-        try:
-            self._thread.wait()
-        except greenlet.GreenletExit:
-            pass
+        for pool in self._greenpools.values():
+            pool.waitall()
+        for thread in (self._thread, self._autoscale_thread):
+            try:
+                if thread is not None:
+                    thread.wait()
+            except greenlet.GreenletExit:
+                pass
         self._thread = None
+        self._autoscale_thread = None
@@ -0,0 +1,156 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import multiprocessing
+import pickle
+
+from oslo.config import cfg
+import six
+
+from oslo.messaging._executors import impl_thread
+
+_process_opts = [
+    cfg.IntOpt('rpc_process_pool_size',
+               default=None,
+               help='Number of worker processes of the process executor. '
+                    'Defaults to the number of CPUs.'),
+]
+
+# The dispatchers of the process executors, by id. The worker processes
+# inherit them when the pools are forked, so an endpoint method is sent to a
+# worker as the index of its endpoint and its name.
+_dispatchers = {}
+
+
+def _picklable_exception(exc):
+    """Return an exception which can be sent back from a worker process.
+
+    Tracebacks can't be pickled, so they are dropped from the exc_info of
+    exceptions such as ExpectedException. Exceptions which still can't be
+    pickled are replaced by a RuntimeError with the same message.
+    """
+    exc_info = getattr(exc, 'exc_info', None)
+    if isinstance(exc_info, tuple) and len(exc_info) == 3:
+        exc.exc_info = (exc_info[0], exc_info[1], None)
+
+    try:
+        pickle.loads(pickle.dumps(exc))
+    except Exception:
+        return RuntimeError('%s: %s' % (exc.__class__.__name__, exc))
+    return exc
+
+
+def _call_in_worker(key, index, name, args, kwargs):
+    try:
+        endpoint = _dispatchers[key].endpoints[index]
+        return True, getattr(endpoint, name)(*args, **kwargs)
+    except Exception as exc:
+        return False, _picklable_exception(exc)
+
+
+def _dispatch_in_worker(key, index, method, ctxt, args):
+    try:
+        dispatcher = _dispatchers[key]
+        endpoint = dispatcher.endpoints[index]
+        return True, dispatcher._do_dispatch(endpoint, method, ctxt, args,
+                                             None)
+    except Exception as exc:
+        return False, _picklable_exception(exc)
+
+
+class _PoolCallback(object):
+
+    """The executor_callback of a ProcessExecutor.
+
+    It is called with an endpoint method and its arguments, which are sent
+    to a worker process. The RPC dispatcher rather uses call_serialized(), so
+    that the request context and arguments are sent as they were received
+    and only deserialized in the worker process, which serializes the
+    result.
+    """
+
+    def __init__(self, executor):
+        self.executor = executor
+
+    def __call__(self, func, *args, **kwargs):
+        endpoint = six.get_method_self(func)
+        return self.executor._apply(_call_in_worker, endpoint, func.__name__,
+                                    args, kwargs)
+
+    def call_serialized(self, endpoint, method, ctxt, args):
+        return self.executor._apply(_dispatch_in_worker, endpoint, method,
+                                    ctxt, args)
+
+
+class ProcessExecutor(impl_thread.ThreadExecutor):
+
+    """A message executor which calls endpoints in a pool of processes.
+
+    Messages are polled for, acknowledged and replied to in this process,
+    which owns the connection to the messaging transport, just as with the
+    threading executor. Only the endpoint method call is made in one of
+    rpc_process_pool_size worker processes, so CPU bound endpoints are not
+    serialized on the GIL.
+
+    The worker processes are forked when the executor is started, and so
+    get a copy of the endpoints as they are at that time. RPC requests are
+    deserialized, and their results serialized, in the worker processes.
+    The arguments and results of the methods of notification endpoints must
+    be picklable.
+
+    Endpoint methods given a pool by executor_pool() are dispatched in
+    threads of their own pool, but share the worker processes with the
+    other methods.
+    """
+
+    def __init__(self, conf, listener, dispatcher):
+        super(ProcessExecutor, self).__init__(conf, listener, dispatcher)
+        self.conf.register_opts(_process_opts)
+        self._pool = None
+        self._callback = _PoolCallback(self)
+        self._indexes = {}
+
+    def _pool_size(self):
+        # One thread for each worker process to wait for it.
+        return (self.conf.rpc_process_pool_size or
+                multiprocessing.cpu_count())
+
+    def start(self):
+        if self._thread is not None:
+            return
+
+        _dispatchers[id(self)] = self.dispatcher
+        self._indexes = dict((id(endpoint), index) for index, endpoint
+                             in enumerate(self.dispatcher.endpoints))
+        self._pool = multiprocessing.Pool(self._pool_size())
+        super(ProcessExecutor, self).start()
+
+    def _dispatch(self, incoming):
+        return self.dispatcher(incoming,
+                               executor_callback=self._callback)
+
+    def _apply(self, func, endpoint, *args):
+        """Call func in a worker process with the index of the endpoint."""
+        ok, result = self._pool.apply(
+            func, (id(self), self._indexes[id(endpoint)]) + args)
+        if not ok:
+            raise result
+        return result
+
+    def wait(self):
+        if self._thread is None:
+            return
+        super(ProcessExecutor, self).wait()
+        self._pool.close()
+        self._pool.join()
+        self._pool = None
+        _dispatchers.pop(id(self), None)
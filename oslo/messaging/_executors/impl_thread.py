@@ -0,0 +1,194 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import threading
+
+from oslo.messaging._executors import base
+from oslo.messaging.openstack.common import excutils
+from oslo.messaging.openstack.common import importutils
+
+# On python 2, this requires the futures backport.
+futures = importutils.try_import('concurrent.futures')
+
+
+def submit_with(ctxt, executor):
+    """The equivalent of spawn_with() for a concurrent.futures executor.
+
+    The context is entered in the calling thread, while the body of the
+    with statement and the exit of the context run in the pool.
+    """
+    callback = ctxt.__enter__()
+    return executor.submit(base.run_with, ctxt, callback)
+
+
+class ThreadExecutor(base.ExecutorBase):
+
+    """A message executor which dispatches messages to a pool of threads.
+
+    This is an executor which polls for incoming messages from a native
+    thread and dispatches each message in a concurrent.futures thread pool of
+    rpc_thread_pool_size threads. Unlike the eventlet executor, it does not
+    require the process to be monkey patched. Like it, it only polls for a
+    message once a thread of the pool is free to dispatch it.
+
+    The messages of endpoint methods given a pool by executor_pool() are
+    dispatched in a separate pool of that name and size. Up to as many of
+    them as the size of the pool wait for a free thread without holding up
+    the other messages. Polling stops while a pool has that many messages
+    waiting.
+
+    Messages of endpoint methods marked as sequential() are run one after
+    the other, in the order they were received, if they have the same
+    sequence key. A thread runs the messages of a key while they keep
+    arriving, the following ones wait without holding up the other
+    messages. Polling stops while twice rpc_thread_pool_size messages are
+    waiting behind the running ones of their key.
+
+    The stop() method stops the polling thread from dispatching any more
+    messages and the wait() method waits for all dispatched messages to be
+    processed. A poll() which is in progress can't be interrupted, so if it
+    returns a message after stop() was called, the message is requeued.
+    """
+
+    concurrent = True
+    background = True
+
+    def __init__(self, conf, listener, dispatcher):
+        super(ThreadExecutor, self).__init__(conf, listener, dispatcher)
+        if futures is None:
+            raise ImportError("Failed to import concurrent.futures, the "
+                              "futures package is required on python 2")
+
+        self.conf.register_opts(base._pool_opts)
+        self._thread = None
+        self._executor = None
+        self._executors = {}
+        self._backlogs = {}
+        self._lanes = None
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self._thread is not None:
+            return
+
+        # Each run has its own event, so that a polling thread of a previous
+        # run still blocked in poll() requeues the message it gets.
+        stopped = self._stopped = threading.Event()
+        self._executor = futures.ThreadPoolExecutor(self._pool_size())
+        free_threads = threading.Semaphore(self._pool_size())
+        # Messages waiting behind the running one of their sequence key are
+        # bounded like those waiting for a named pool.
+        self._lanes = base.SequentialLanes(
+            threading.Semaphore(2 * self._pool_size()))
+
+        @excutils.forever_retry_uncaught_exceptions
+        def _executor_thread():
+            while not stopped.is_set():
+                free_threads.acquire()
+                self._wait_for_backlogs()
+                incoming = self.listener.poll()
+                # stop() and wait() must not race with dispatching.
+                with self._lock:
+                    if not stopped.is_set():
+                        try:
+                            future = self._submit(incoming)
+                        except Exception:
+                            free_threads.release()
+                            raise
+                        if future is not None:
+                            future.add_done_callback(
+                                lambda f: free_threads.release())
+                        else:
+                            # The message waits in the queue of its pool or
+                            # lane, without holding up the other messages.
+                            free_threads.release()
+                        continue
+                free_threads.release()
+                incoming.requeue()
+
+        self._thread = threading.Thread(target=_executor_thread)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _submit(self, incoming):
+        """Dispatch a message.
+
+        Returns the future of the message if it takes a thread of the
+        default pool, None otherwise.
+        """
+        executor = self._get_executor(incoming)
+        key = self._get_sequence_key(incoming)
+        ctxt = self._dispatch(incoming)
+        if executor is not self._executor:
+            backlog = self._backlogs[executor]
+            backlog.acquire()
+            ctxt = base.release_on_exit(ctxt, backlog.release)
+        if key is None:
+            future = submit_with(ctxt=ctxt, executor=executor)
+        else:
+            callback = ctxt.__enter__()
+            if not self._lanes.add(key, ctxt, callback):
+                return None
+            future = executor.submit(self._lanes.run, key)
+        if executor is not self._executor:
+            return None
+        return future
+
+    def _get_executor(self, incoming):
+        pool = self._get_pool(incoming)
+        if pool is None:
+            return self._executor
+        name, size = pool
+        if name not in self._executors:
+            executor = futures.ThreadPoolExecutor(size)
+            # A message of the pool takes a slot from being received until
+            # it was dispatched: size of them run and as many wait.
+            self._backlogs[executor] = threading.Semaphore(2 * size)
+            self._executors[name] = executor
+        return self._executors[name]
+
+    def _wait_for_backlogs(self):
+        # Only the polling thread takes slots, so the pool of the next
+        # message still has one once it is received.
+        for backlog in list(self._backlogs.values()):
+            backlog.acquire()
+            backlog.release()
+        self._lanes.wait_for_backlog()
+
+    def _pool_size(self):
+        return self.conf.rpc_thread_pool_size
+
+    def _dispatch(self, incoming):
+        return self.dispatcher(incoming)
+
+    def stop(self):
+        if self._thread is None:
+            return
+        # This doesn't take the lock, the polling thread may hold it while
+        # an endpoint method is at its concurrency limit.
+        self._stopped.set()
+
+    def wait(self):
+        if self._thread is None:
+            return
+        # Like EventletExecutor.wait(), this only returns once stop() was
+        # called. The polling thread may still be blocked in poll().
+        while not self._stopped.wait(1.0):
+            pass
+        with self._lock:
+            self._executor.shutdown(wait=True)
+            for executor in self._executors.values():
+                executor.shutdown(wait=True)
+            self._executors = {}
+            self._backlogs = {}
+        self._thread = None
@@ -13,29 +13,60 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from oslo.messaging.openstack.common import importutils
 
-def version_is_compatible(imp_version, version):
-    """Determine whether versions are compatible.
+# On python 2, trollius provides the asyncio API.
+asyncio = (importutils.try_import('asyncio') or
+           importutils.try_import('trollius'))
+
+
+def get_event_loop():
+    """Return the asyncio event loop of the current thread."""
+    if asyncio is None:
+        raise ImportError("Failed to import asyncio, the trollius package is "
+                          "required on python 2")
+    return asyncio.get_event_loop()
+
+
+# Parsed version strings, which are mostly the same few versions. The
+# versions of incoming messages can't be trusted, so the cache is bounded.
+_parsed_versions = {}
+_MAX_PARSED_VERSIONS = 1024
+
+
+def _parse_version(version):
+    """Return the major, minor and revision numbers of a version string."""
+    try:
+        return _parsed_versions[version]
+    except KeyError:
+        pass
 
-    :param imp_version: The version implemented
-    :param version: The version requested by an incoming message.
-    """
     version_parts = version.split('.')
-    imp_version_parts = imp_version.split('.')
     try:
         rev = version_parts[2]
     except IndexError:
         rev = 0
-    try:
-        imp_rev = imp_version_parts[2]
-    except IndexError:
-        imp_rev = 0
+    parsed = (int(version_parts[0]), int(version_parts[1]), int(rev))
+
+    if len(_parsed_versions) >= _MAX_PARSED_VERSIONS:
+        _parsed_versions.clear()
+    _parsed_versions[version] = parsed
+    return parsed
+
+
+def version_is_compatible(imp_version, version):
+    """Determine whether versions are compatible.
+
+    :param imp_version: The version implemented
+    :param version: The version requested by an incoming message.
+    """
+    major, minor, rev = _parse_version(version)
+    imp_major, imp_minor, imp_rev = _parse_version(imp_version)
 
-    if int(version_parts[0]) != int(imp_version_parts[0]):  # Major
+    if major != imp_major:  # Major
         return False
-    if int(version_parts[1]) > int(imp_version_parts[1]):  # Minor
+    if minor > imp_minor:  # Minor
         return False
-    if (int(version_parts[1]) == int(imp_version_parts[1]) and
-            int(rev) > int(imp_rev)):  # Revision
+    if minor == imp_minor and rev > imp_rev:  # Revision
         return False
     return True
@@ -16,6 +16,7 @@
 __all__ = ['Notifier',
            'LoggingNotificationHandler',
            'get_notification_listener',
+           'get_batch_notification_listener',
            'NotificationResult',
            'PublishErrorsHandler']
 
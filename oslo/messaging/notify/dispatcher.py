@@ -19,6 +19,7 @@ import itertools
 import logging
 import sys
 
+from oslo.messaging._drivers import batch
 from oslo.messaging import localcontext
 from oslo.messaging import serializer as msg_serializer
 
@@ -60,29 +61,34 @@ class NotificationDispatcher(object):
         self._targets_priorities = set(itertools.product(self.targets,
                                                          priorities))
 
-    def _listen(self, transport):
-        return transport._listen_for_notifications(self._targets_priorities)
+    def _listen(self, transport, consumers=1):
+        return transport._listen_for_notifications(self._targets_priorities,
+                                                   consumers=consumers)
 
     @contextlib.contextmanager
-    def __call__(self, incoming):
+    def __call__(self, incoming, executor_callback=None):
         result_wrapper = []
 
         yield lambda: result_wrapper.append(
-            self._dispatch_and_handle_error(incoming))
+            self._dispatch_and_handle_error(incoming, executor_callback))
 
         if result_wrapper[0] == NotificationResult.HANDLED:
             incoming.acknowledge()
         else:
             incoming.requeue()
 
-    def _dispatch_and_handle_error(self, incoming):
+    def _dispatch_and_handle_error(self, incoming, executor_callback=None):
         """Dispatch a notification message to the appropriate endpoint method.
 
         :param incoming: the incoming notification message
         :type ctxt: IncomingMessage
+        :param executor_callback: called with the endpoint method and its
+                                  arguments instead of calling the method
+        :type executor_callback: callable
         """
         try:
-            return self._dispatch(incoming.ctxt, incoming.message)
+            return self._dispatch(incoming.ctxt, incoming.message,
+                                  executor_callback)
         except Exception:
             # sys.exc_info() is deleted by LOG.exception().
             exc_info = sys.exc_info()
@@ -90,13 +96,10 @@ class NotificationDispatcher(object):
                       exc_info=exc_info)
             return NotificationResult.HANDLED
 
-    def _dispatch(self, ctxt, message):
-        """Dispatch an RPC message to the appropriate endpoint method.
+    def _extract_user_message(self, ctxt, message):
+        """Return the priority and endpoint arguments of a message.
 
-        :param ctxt: the request context
-        :type ctxt: dict
-        :param message: the message payload
-        :type message: dict
+        None is returned for a message with an unknown priority.
         """
         ctxt = self.serializer.deserialize_context(ctxt)
 
@@ -109,19 +112,128 @@ class NotificationDispatcher(object):
         priority = message.get('priority', '').lower()
         if priority not in PRIORITIES:
             LOG.warning('Unknown priority "%s"' % priority)
-            return
+            return None
 
         payload = self.serializer.deserialize_entity(ctxt,
                                                      message.get('payload'))
+        return priority, (ctxt, publisher_id, event_type, payload, metadata)
+
+    def _dispatch(self, ctxt, message, executor_callback=None):
+        """Dispatch an RPC message to the appropriate endpoint method.
+
+        :param ctxt: the request context
+        :type ctxt: dict
+        :param message: the message payload
+        :type message: dict
+        :param executor_callback: called with the endpoint method and its
+                                  arguments instead of calling the method
+        :type executor_callback: callable
+        """
+        user_message = self._extract_user_message(ctxt, message)
+        if user_message is None:
+            return
+        priority, args = user_message
+        ctxt = args[0]
 
         for callback in self._callbacks_by_priority.get(priority, []):
             localcontext.set_local_context(ctxt)
             try:
-                ret = callback(ctxt, publisher_id, event_type, payload,
-                               metadata)
+                if executor_callback:
+                    ret = executor_callback(callback, *args)
+                else:
+                    ret = callback(*args)
                 ret = NotificationResult.HANDLED if ret is None else ret
                 if self.allow_requeue and ret == NotificationResult.REQUEUE:
                     return ret
             finally:
                 localcontext.clear_local_context()
         return NotificationResult.HANDLED
+
+
+class BatchNotificationDispatcher(NotificationDispatcher):
+    """A message dispatcher which passes batches of notifications.
+
+    The dispatcher listens for batches of at most batch_size notifications,
+    see BatchListener. The notifications of a batch are grouped by priority
+    and each endpoint method of a priority is called once with the list of
+    (ctxt, publisher_id, event_type, payload, metadata) tuples of that
+    priority. The notifications of a priority are acknowledged or requeued
+    together.
+    """
+
+    def __init__(self, targets, endpoints, serializer, allow_requeue,
+                 batch_size=1, batch_timeout=1.0):
+        super(BatchNotificationDispatcher, self).__init__(
+            targets, endpoints, serializer, allow_requeue)
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+
+    def _listen(self, transport, consumers=1):
+        listener = super(BatchNotificationDispatcher, self)._listen(
+            transport, consumers=consumers)
+        return batch.BatchListener(listener, self.batch_size,
+                                   self.batch_timeout)
+
+    @contextlib.contextmanager
+    def __call__(self, incoming, executor_callback=None):
+        results = []
+
+        yield lambda: results.extend(
+            self._dispatch_batch(incoming.messages, executor_callback))
+
+        for messages, result in results:
+            for message in messages:
+                if result == NotificationResult.HANDLED:
+                    message.acknowledge()
+                else:
+                    message.requeue()
+
+    def _dispatch_batch(self, incoming_messages, executor_callback=None):
+        """Dispatch a batch of notifications to the endpoint methods.
+
+        Returns a list of (messages, result) tuples, the messages of each
+        priority in the batch with the result of their endpoint methods.
+        Messages with an unknown priority are returned as handled.
+        """
+        unknown = []
+        by_priority = {}
+        for incoming in incoming_messages:
+            try:
+                user_message = self._extract_user_message(incoming.ctxt,
+                                                          incoming.message)
+            except Exception:
+                LOG.exception('Exception while deserializing a message')
+                user_message = None
+            if user_message is None:
+                unknown.append(incoming)
+                continue
+            priority, args = user_message
+            messages, batch_args = by_priority.setdefault(priority, ([], []))
+            messages.append(incoming)
+            batch_args.append(args)
+
+        results = [(unknown, NotificationResult.HANDLED)]
+        for priority, (messages, batch_args) in sorted(by_priority.items()):
+            try:
+                result = self._dispatch_priority(priority, batch_args,
+                                                 executor_callback)
+            except Exception:
+                # sys.exc_info() is deleted by LOG.exception().
+                exc_info = sys.exc_info()
+                LOG.error('Exception during message handling',
+                          exc_info=exc_info)
+                result = NotificationResult.HANDLED
+            results.append((messages, result))
+        return results
+
+    def _dispatch_priority(self, priority, batch_args,
+                           executor_callback=None):
+        for callback in self._callbacks_by_priority.get(priority, []):
+            if executor_callback:
+                ret = executor_callback(callback, batch_args)
+            else:
+                ret = callback(batch_args)
+            ret = NotificationResult.HANDLED if ret is None else ret
+            if self.allow_requeue and ret == NotificationResult.REQUEUE:
+                return ret
+        return NotificationResult.HANDLED
@@ -36,8 +36,8 @@ handling requests, stop handling requests and wait for all in-process
 requests to complete.
 
 Each notification listener is associated with an executor which integrates the
-listener with a specific I/O handling framework. Currently, there are blocking
-and eventlet executors available.
+listener with a specific I/O handling framework. Currently, there are blocking,
+eventlet, threading and asyncio executors available.
 
 A simple example of a notification listener with multiple endpoints might be::
 
@@ -85,6 +85,21 @@ message.
 The message is acknowledged only if all endpoints either return
 messaging.NotificationResult.HANDLED or None.
 
+A batch notification listener, returned by get_batch_notification_listener(),
+passes the notifications it receives to its endpoints in batches of up to
+batch_size notifications. A batch is dispatched once it is full or
+batch_timeout seconds, one by default, after its first notification was
+received. The notifications of a batch are grouped by priority, and the
+endpoint methods of a priority are called with a list of (ctxt, publisher_id,
+event_type, payload, metadata) tuples::
+
+    class SampleEndpoint(object):
+        def sample(self, messages):
+            store_samples([message[3] for message in messages])
+
+The return value of an endpoint method acknowledges or requeues all the
+notifications of the priority in the batch.
+
 Note that not all transport drivers implement support for requeueing. In order
 to use this feature, applications should assert that the feature is available
 by passing allow_requeue=True to get_notification_listener(). If the driver
@@ -97,7 +112,7 @@ from oslo.messaging import server as msg_server
 
 def get_notification_listener(transport, targets, endpoints,
                               executor='blocking', serializer=None,
-                              allow_requeue=False):
+                              allow_requeue=False, consumers=1, workers=1):
     """Construct a notification listener
 
     The executor parameter controls how incoming messages will be received and
@@ -110,16 +125,73 @@ def get_notification_listener(transport, targets, endpoints,
     :type targets: list of Target
     :param endpoints: a list of endpoint objects
     :type endpoints: list
-    :param executor: name of a message executor - e.g. 'eventlet', 'blocking'
+    :param executor: name of a message executor - e.g. 'eventlet',
+                     'threading', 'blocking'
     :type executor: str
     :param serializer: an optional entity serializer
     :type serializer: Serializer
     :param allow_requeue: whether NotificationResult.REQUEUE support is needed
     :type allow_requeue: bool
+    :param consumers: how many connections to consume notifications over,
+                      only the rabbit and qpid drivers support more than one
+    :type consumers: int
+    :param workers: how many processes to fork to handle notifications, see
+                    MessageHandlingServer.start()
+    :type workers: int
     :raises: NotImplementedError
     """
     transport._require_driver_features(requeue=allow_requeue)
     dispatcher = notify_dispatcher.NotificationDispatcher(targets, endpoints,
                                                           serializer,
                                                           allow_requeue)
-    return msg_server.MessageHandlingServer(transport, dispatcher, executor)
+    return msg_server.MessageHandlingServer(transport, dispatcher, executor,
+                                            consumers=consumers,
+                                            workers=workers)
+
+
+def get_batch_notification_listener(transport, targets, endpoints,
+                                    executor='blocking', serializer=None,
+                                    allow_requeue=False, batch_size=1,
+                                    batch_timeout=1.0, consumers=1,
+                                    workers=1):
+    """Construct a batch notification listener
+
+    The executor parameter controls how incoming messages will be received and
+    dispatched. By default, the most simple executor is used - the blocking
+    executor.
+
+    :param transport: the messaging transport
+    :type transport: Transport
+    :param targets: the exchanges and topics to listen on
+    :type targets: list of Target
+    :param endpoints: a list of endpoint objects
+    :type endpoints: list
+    :param executor: name of a message executor - e.g. 'eventlet',
+                     'threading', 'blocking'
+    :type executor: str
+    :param serializer: an optional entity serializer
+    :type serializer: Serializer
+    :param allow_requeue: whether NotificationResult.REQUEUE support is needed
+    :type allow_requeue: bool
+    :param batch_size: the maximum number of notifications in a batch
+    :type batch_size: int
+    :param batch_timeout: how many seconds to wait for a batch to fill up,
+                          None to wait until it is full, which holds back
+                          the notifications of a partial batch for as long
+                          as no more arrive
+    :type batch_timeout: float
+    :param consumers: how many connections to consume notifications over,
+                      only the rabbit and qpid drivers support more than one
+    :type consumers: int
+    :param workers: how many processes to fork to handle notifications, see
+                    MessageHandlingServer.start()
+    :type workers: int
+    :raises: NotImplementedError
+    """
+    transport._require_driver_features(requeue=allow_requeue)
+    dispatcher = notify_dispatcher.BatchNotificationDispatcher(
+        targets, endpoints, serializer, allow_requeue,
+        batch_size=batch_size, batch_timeout=batch_timeout)
+    return msg_server.MessageHandlingServer(transport, dispatcher, executor,
+                                            consumers=consumers,
+                                            workers=workers)
@@ -23,6 +23,7 @@ from oslo.config import cfg
 import six
 from stevedore import named
 
+from oslo.messaging import _utils as utils
 from oslo.messaging.openstack.common import timeutils
 from oslo.messaging import serializer as msg_serializer
 
@@ -169,6 +170,12 @@ class Notifier(object):
         if self._driver_mgr.extensions:
             self._driver_mgr.map(do_notify)
 
+    def _anotify(self, ctxt, event_type, payload, priority):
+        # The drivers may block while sending, so the notification is sent
+        # from a thread of the default executor of the loop.
+        return utils.get_event_loop().run_in_executor(
+            None, self._notify, ctxt, event_type, payload, priority)
+
     def audit(self, ctxt, event_type, payload):
         """Send a notification at audit level.
 
@@ -261,6 +268,57 @@ class Notifier(object):
         """
         self._notify(ctxt, event_type, payload, 'SAMPLE')
 
+    def aaudit(self, ctxt, event_type, payload):
+        """Send a notification at audit level from an asyncio event loop.
+
+        See audit(), this returns a future which is done once it was sent.
+        """
+        return self._anotify(ctxt, event_type, payload, 'AUDIT')
+
+    def adebug(self, ctxt, event_type, payload):
+        """Send a notification at debug level from an asyncio event loop.
+
+        See debug(), this returns a future which is done once it was sent.
+        """
+        return self._anotify(ctxt, event_type, payload, 'DEBUG')
+
+    def ainfo(self, ctxt, event_type, payload):
+        """Send a notification at info level from an asyncio event loop.
+
+        See info(), this returns a future which is done once it was sent.
+        """
+        return self._anotify(ctxt, event_type, payload, 'INFO')
+
+    def awarn(self, ctxt, event_type, payload):
+        """Send a notification at warning level from an asyncio event loop.
+
+        See warn(), this returns a future which is done once it was sent.
+        """
+        return self._anotify(ctxt, event_type, payload, 'WARN')
+
+    awarning = awarn
+
+    def aerror(self, ctxt, event_type, payload):
+        """Send a notification at error level from an asyncio event loop.
+
+        See error(), this returns a future which is done once it was sent.
+        """
+        return self._anotify(ctxt, event_type, payload, 'ERROR')
+
+    def acritical(self, ctxt, event_type, payload):
+        """Send a notification at critical level from an asyncio event loop.
+
+        See critical(), this returns a future which is done once it was sent.
+        """
+        return self._anotify(ctxt, event_type, payload, 'CRITICAL')
+
+    def asample(self, ctxt, event_type, payload):
+        """Send a notification at sample level from an asyncio event loop.
+
+        See sample(), this returns a future which is done once it was sent.
+        """
+        return self._anotify(ctxt, event_type, payload, 'SAMPLE')
+
 
 class _SubNotifier(Notifier):
 
@@ -28,7 +28,9 @@ from oslo.messaging._drivers import impl_zmq
 from oslo.messaging._drivers import matchmaker
 from oslo.messaging._drivers import matchmaker_redis
 from oslo.messaging._drivers import matchmaker_ring
+from oslo.messaging._executors import impl_asyncio
 from oslo.messaging._executors import impl_eventlet
+from oslo.messaging._executors import impl_process
 from oslo.messaging.notify import notifier
 from oslo.messaging.rpc import client
 from oslo.messaging import transport
@@ -41,7 +43,9 @@ _global_opt_lists = [
     impl_zmq.zmq_opts,
     matchmaker.matchmaker_opts,
     matchmaker_redis.matchmaker_redis_opts,
+    impl_asyncio._asyncio_opts,
     impl_eventlet._eventlet_opts,
+    impl_process._process_opts,
     notifier._notifier_opts,
     client._client_opts,
     transport._transport_opts
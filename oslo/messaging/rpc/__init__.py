@@ -23,8 +23,12 @@ __all__ = [
     'RPCVersionCapError',
     'RemoteError',
     'UnsupportedVersion',
+    'batched',
+    'executor_pool',
     'expected_exceptions',
     'get_rpc_server',
+    'max_concurrency',
+    'sequential',
 ]
 
 from .client import *
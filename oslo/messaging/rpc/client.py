@@ -152,11 +152,80 @@ class _CallContext(object):
             raise ClientSendError(self.target, ex)
         return self.serializer.deserialize_entity(ctxt, result)
 
+    def acast(self, ctxt, method, **kwargs):
+        """Invoke a method from asyncio. See RPCClient.acast()."""
+        loop = utils.get_event_loop()
+        msg = self._make_message(ctxt, method, kwargs)
+        msg_ctxt = self.serializer.serialize_context(ctxt)
+
+        if self.version_cap:
+            self._check_version_cap(msg.get('version'))
+
+        def send():
+            try:
+                self.transport._send(self.target, msg_ctxt, msg)
+            except driver_base.TransportDriverError as ex:
+                raise ClientSendError(self.target, ex)
+
+        # Sending may block on the connection, so it is done by a thread of
+        # the default executor of the loop rather than on the loop itself.
+        return loop.run_in_executor(None, send)
+
+    def acall(self, ctxt, method, **kwargs):
+        """Invoke a method and return a future. See RPCClient.acall()."""
+        loop = utils.get_event_loop()
+        msg = self._make_message(ctxt, method, kwargs)
+        msg_ctxt = self.serializer.serialize_context(ctxt)
+
+        timeout = self.timeout
+        if self.timeout is None:
+            timeout = self.conf.rpc_response_timeout
+
+        if self.version_cap:
+            self._check_version_cap(msg.get('version'))
+
+        future = utils.asyncio.Future(loop=loop)
+
+        def set_result(reply, failure):
+            if future.done():
+                return
+            if failure is not None:
+                future.set_exception(failure)
+                return
+            try:
+                reply = self.serializer.deserialize_entity(ctxt, reply)
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result(reply)
+
+        def callback(reply=None, failure=None):
+            # Called from the driver thread which received the reply.
+            loop.call_soon_threadsafe(set_result, reply, failure)
+
+        def send():
+            try:
+                self.transport._send_async(self.target, msg_ctxt, msg,
+                                           callback, timeout=timeout)
+            except driver_base.TransportDriverError as ex:
+                raise ClientSendError(self.target, ex)
+
+        def sent(send_future):
+            if send_future.cancelled() or future.done():
+                return
+            if send_future.exception() is not None:
+                future.set_exception(send_future.exception())
+
+        # Like acast(), the message is sent from a thread of the default
+        # executor of the loop.
+        loop.run_in_executor(None, send).add_done_callback(sent)
+        return future
+
     @classmethod
     def _prepare(cls, base,
                  exchange=_marker, topic=_marker, namespace=_marker,
                  version=_marker, server=_marker, fanout=_marker,
-                 timeout=_marker, version_cap=_marker):
+                 timeout=_marker, version_cap=_marker, routing_key=_marker):
         """Prepare a method invocation context. See RPCClient.prepare()."""
         kwargs = dict(
             exchange=exchange,
@@ -164,7 +233,8 @@ class _CallContext(object):
             namespace=namespace,
             version=version,
             server=server,
-            fanout=fanout)
+            fanout=fanout,
+            routing_key=routing_key)
         kwargs = dict([(k, v) for k, v in kwargs.items()
                        if v is not cls._marker])
         target = base.target(**kwargs)
@@ -180,12 +250,12 @@ class _CallContext(object):
 
     def prepare(self, exchange=_marker, topic=_marker, namespace=_marker,
                 version=_marker, server=_marker, fanout=_marker,
-                timeout=_marker, version_cap=_marker):
+                timeout=_marker, version_cap=_marker, routing_key=_marker):
         """Prepare a method invocation context. See RPCClient.prepare()."""
         return self._prepare(self,
                              exchange, topic, namespace,
                              version, server, fanout,
-                             timeout, version_cap)
+                             timeout, version_cap, routing_key)
 
 
 class RPCClient(object):
@@ -274,7 +344,7 @@ class RPCClient(object):
 
     def prepare(self, exchange=_marker, topic=_marker, namespace=_marker,
                 version=_marker, server=_marker, fanout=_marker,
-                timeout=_marker, version_cap=_marker):
+                timeout=_marker, version_cap=_marker, routing_key=_marker):
         """Prepare a method invocation context.
 
         Use this method to override client properties for an individual method
@@ -300,11 +370,14 @@ class RPCClient(object):
         :type timeout: int or float
         :param version_cap: raise a RPCVersionCapError version exceeds this cap
         :type version_cap: str
+        :param routing_key: send to the same server as other invocations with
+                            this key, see Target.routing_key
+        :type routing_key: str
         """
         return _CallContext._prepare(self,
                                      exchange, topic, namespace,
                                      version, server, fanout,
-                                     timeout, version_cap)
+                                     timeout, version_cap, routing_key)
 
     def cast(self, ctxt, method, **kwargs):
         """Invoke a method and return immediately.
@@ -360,6 +433,49 @@ class RPCClient(object):
         """
         return self.prepare().call(ctxt, method, **kwargs)
 
+    def acast(self, ctxt, method, **kwargs):
+        """Invoke a method from an asyncio event loop.
+
+        This is cast() for asyncio applications, it returns a future which is
+        done once the message was sent, e.g.::
+
+            await client.acast(ctxt, 'test', arg=arg)
+
+        The message is sent from a thread of the default executor of the
+        event loop, so the loop isn't blocked while it is sent. The future
+        raises ClientSendError if it couldn't be sent.
+
+        :param ctxt: a request context dict
+        :type ctxt: dict
+        :param method: the method name
+        :type method: str
+        :param kwargs: a dict of method arguments
+        :type kwargs: dict
+        """
+        return self.prepare().acast(ctxt, method, **kwargs)
+
+    def acall(self, ctxt, method, **kwargs):
+        """Invoke a method from an asyncio event loop.
+
+        This is call() for asyncio applications, it returns a future for the
+        return value of the method, or the exception call() would raise, e.g.::
+
+            result = await client.acall(ctxt, 'test', arg=arg)
+
+        The future is completed on the event loop of the calling thread. The
+        message is sent from a thread of the default executor of the loop and
+        no thread is blocked waiting for the reply, except with transport
+        drivers which can't wait for many replies at once.
+
+        :param ctxt: a request context dict
+        :type ctxt: dict
+        :param method: the method name
+        :type method: str
+        :param kwargs: a dict of method arguments
+        :type kwargs: dict
+        """
+        return self.prepare().acall(ctxt, method, **kwargs)
+
     def can_send_version(self, version=_marker):
         """Check to see if a version is compatible with the version cap."""
         return self.prepare(version=version).can_send_version()
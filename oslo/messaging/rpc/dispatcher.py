@@ -27,6 +27,7 @@ __all__ = [
 import contextlib
 import logging
 import sys
+import threading
 
 import six
 
@@ -38,6 +39,11 @@ from oslo.messaging import target as msg_target
 
 LOG = logging.getLogger(__name__)
 
+# Upper bound on the number of memoized endpoint lookups. The method, namespace
+# and version of incoming messages can't be trusted, so the cache is cleared
+# when it grows past this.
+_MAX_LOOKUPS = 1024
+
 
 class ExpectedException(Exception):
     """Encapsulates an expected exception raised by an RPC endpoint
@@ -87,6 +93,17 @@ class RPCDispatcher(object):
     of the methods exposed by that object. All public methods on an endpoint
     object are remotely invokable by clients.
 
+    Endpoints and their methods may also have a max_concurrency attribute,
+    see max_concurrency(), limiting how many calls to them run at once, and
+    an executor_pool attribute, see executor_pool(), naming the pool of the
+    executor they are dispatched in. Methods with a sequential attribute,
+    see sequential(), are run in sequence with the calls which have the
+    same key. Methods with a batched attribute, see batched(), are called
+    with batches of requests.
+
+    The endpoints and their targets are indexed when the dispatcher is
+    constructed, and the endpoint found for a method, namespace and version
+    is remembered.
 
     """
 
@@ -102,35 +119,265 @@ class RPCDispatcher(object):
         self._default_target = msg_target.Target()
         self._target = target
 
-    def _listen(self, transport):
-        return transport._listen(self._target)
+        self._limits = {}
+        self._limits_lock = threading.Lock()
 
-    @staticmethod
-    def _is_namespace(target, namespace):
-        return namespace == target.namespace
+        self._batches = {}
+        self._batches_lock = threading.Lock()
+
+        # The endpoints of each namespace, in order, with their targets.
+        self._index = {}
+        for endpoint in endpoints:
+            target = getattr(endpoint, 'target', None)
+            if not target:
+                target = self._default_target
+            self._index.setdefault(target.namespace, []).append(
+                (endpoint, target))
+        self._lookups = {}
+
+    def _listen(self, transport, consumers=1):
+        return transport._listen(self._target, consumers=consumers)
 
     @staticmethod
     def _is_compatible(target, version):
         endpoint_version = target.version or '1.0'
         return utils.version_is_compatible(endpoint_version, version)
 
-    def _do_dispatch(self, endpoint, method, ctxt, args):
+    def _deserialize(self, ctxt, args):
         ctxt = self.serializer.deserialize_context(ctxt)
         new_args = dict()
         for argname, arg in six.iteritems(args):
             new_args[argname] = self.serializer.deserialize_entity(ctxt, arg)
-        result = getattr(endpoint, method)(ctxt, **new_args)
+        return ctxt, new_args
+
+    def _do_dispatch(self, endpoint, method, ctxt, args, executor_callback):
+        call_serialized = getattr(executor_callback, 'call_serialized', None)
+        if call_serialized is not None:
+            # The executor deserializes the arguments and serializes the
+            # result where it calls the method, e.g. in a worker process.
+            return call_serialized(endpoint, method, ctxt, args)
+        ctxt, new_args = self._deserialize(ctxt, args)
+        func = getattr(endpoint, method)
+        if executor_callback:
+            result = executor_callback(func, ctxt, **new_args)
+        else:
+            result = func(ctxt, **new_args)
         return self.serializer.serialize_entity(ctxt, result)
 
-    @contextlib.contextmanager
-    def __call__(self, incoming):
-        incoming.acknowledge()
-        yield lambda: self._dispatch_and_reply(incoming)
+    def _lookup_message(self, message):
+        """Return the endpoint and method name of a message, if any."""
+        method = message.get('method')
+        try:
+            return self._lookup(method,
+                                message.get('namespace'),
+                                message.get('version', '1.0')), method
+        except Exception:
+            # The error is reported when the message is dispatched.
+            return None, None
+
+    def get_executor_pool(self, incoming):
+        """Return the name and size of the pool to dispatch a message in.
+
+        Executors with a pool of workers dispatch the messages of endpoint
+        methods which were given a pool by executor_pool() in that pool,
+        rather than in their default pool. None is returned for the other
+        messages.
+        """
+        endpoint, method = self._lookup_message(incoming.message)
+        if endpoint is None:
+            return None
+
+        for obj in (getattr(endpoint, method), endpoint):
+            pool = getattr(obj, 'executor_pool', None)
+            # Ignore the attributes of e.g. proxies which aren't pools.
+            if (isinstance(pool, tuple) and len(pool) == 2 and
+                    isinstance(pool[1], six.integer_types) and pool[1] >= 1):
+                return pool
+        return None
+
+    def get_sequence_key(self, incoming):
+        """Return the key of the messages to run in sequence with a message.
+
+        For endpoint methods marked as sequential(), the key is made of the
+        value of the argument or request context field given to
+        sequential(). Executors run the messages with the same key one
+        after the other. None is returned for the other messages, and
+        messages whose key value is missing or can't be hashed.
+        """
+        endpoint, method = self._lookup_message(incoming.message)
+        if endpoint is None:
+            return None
+
+        sequential = getattr(getattr(endpoint, method), 'sequential', None)
+        if not isinstance(sequential, tuple) or len(sequential) != 2:
+            return None
+        source, name = sequential
+        if source == 'arg':
+            values = incoming.message.get('args') or {}
+        else:
+            values = incoming.ctxt or {}
+
+        value = values.get(name)
+        if value is None:
+            return None
+        key = (source, name, value)
+        try:
+            hash(key)
+        except TypeError:
+            LOG.warning('Unhashable sequence key %(name)s of method '
+                        '%(method)s, it will not be run in sequence',
+                        {'name': name, 'method': method})
+            return None
+        return key
+
+    def _get_batched(self, message):
+        """Return the batch key, size and timeout of a batched message.
+
+        None is returned for the messages of methods which aren't batched.
+        """
+        endpoint, method = self._lookup_message(message)
+        if endpoint is None:
+            return None
+
+        batched = self._batch_bounds(getattr(endpoint, method))
+        if batched is None:
+            return None
+        size, timeout = batched
+        return (endpoint, method), size, timeout
+
+    @staticmethod
+    def _batch_bounds(func):
+        batched = getattr(func, 'batched', None)
+        # Ignore the attributes of e.g. proxies which aren't batch bounds.
+        if (not isinstance(batched, tuple) or len(batched) != 2 or
+                not isinstance(batched[0], six.integer_types)):
+            return None
+        return batched
+
+    def _has_batched_methods(self):
+        """Return whether any endpoint method is batched()."""
+        for endpoint in self.endpoints:
+            cls = type(endpoint)
+            for name in dir(cls):
+                if self._batch_bounds(getattr(cls, name, None)) is not None:
+                    return True
+        return False
+
+    def _get_limits(self, message):
+        """Return the semaphores limiting concurrent calls of a message."""
+        endpoint, method = self._lookup_message(message)
+        if endpoint is None:
+            return []
+
+        limits = []
+        with self._limits_lock:
+            for obj, key in ((endpoint, id(endpoint)),
+                             (getattr(endpoint, method),
+                              (id(endpoint), method))):
+                # Ignore the attributes of e.g. proxies which aren't limits.
+                max_concurrency = getattr(obj, 'max_concurrency', None)
+                if (not isinstance(max_concurrency, six.integer_types) or
+                        max_concurrency < 1):
+                    continue
+                if key not in self._limits:
+                    self._limits[key] = threading.Semaphore(max_concurrency)
+                limits.append(self._limits[key])
+        return limits
 
-    def _dispatch_and_reply(self, incoming):
+    @contextlib.contextmanager
+    def __call__(self, incoming, executor_callback=None):
+        # Executors enter the dispatcher from their polling thread, so while
+        # the endpoint method is at its concurrency limit, no other message
+        # is accepted and the excess stays queued on the broker.
+        limits = self._get_limits(incoming.message)
+        batched = self._get_batched(incoming.message)
+        for limit in limits:
+            limit.acquire()
+        try:
+            if batched is None:
+                incoming.acknowledge()
+                yield lambda: self._dispatch_and_reply(incoming,
+                                                       executor_callback)
+            else:
+                # Batched messages are acknowledged once their batch has
+                # been handled. They are added to their batch here, so that
+                # only the first message of a batch takes a worker of the
+                # executor to wait for the batch.
+                batch = self._add_to_batch(incoming, batched)
+                if batch is None:
+                    yield lambda: None
+                else:
+                    yield lambda: self._wait_for_batch(batch, batched,
+                                                       executor_callback)
+        finally:
+            for limit in limits:
+                limit.release()
+
+    def _add_to_batch(self, incoming, batched):
+        """Add a message to the batch of its method.
+
+        Returns the new batch if the message is the first of a batch, None
+        if it was added to a pending batch.
+        """
+        key, size, timeout = batched
+        with self._batches_lock:
+            batch = self._batches.get(key)
+            if batch is not None:
+                messages, full = batch
+                messages.append(incoming)
+                if len(messages) >= size:
+                    del self._batches[key]
+                    full.set()
+                return None
+            batch = ([incoming], threading.Event())
+            if size > 1:
+                self._batches[key] = batch
+            return batch
+
+    def _wait_for_batch(self, batch, batched, executor_callback=None):
+        """Wait for a batch to fill up, or for its timeout, and dispatch it."""
+        key, size, timeout = batched
+        messages, full = batch
+        if size > 1:
+            full.wait(timeout)
+        with self._batches_lock:
+            if self._batches.get(key) is batch:
+                del self._batches[key]
+
+        endpoint, method = key
+        self._dispatch_batch(endpoint, method, messages, executor_callback)
+
+    def _dispatch_batch(self, endpoint, method, messages,
+                        executor_callback=None):
+        failure = None
         try:
-            incoming.reply(self._dispatch(incoming.ctxt,
-                                          incoming.message))
+            requests = [self._deserialize(incoming.ctxt,
+                                          incoming.message.get('args', {}))
+                        for incoming in messages]
+            func = getattr(endpoint, method)
+            if executor_callback:
+                executor_callback(func, requests)
+            else:
+                func(requests)
+        except Exception as e:
+            # sys.exc_info() is deleted by LOG.exception().
+            failure = sys.exc_info()
+            LOG.error('Exception during handling of a batch of %(count)d '
+                      'messages: %(e)s', {'count': len(messages), 'e': e},
+                      exc_info=failure)
+
+        for incoming in messages:
+            incoming.acknowledge()
+            if failure is not None:
+                incoming.reply(failure=failure, log_failure=False)
+            else:
+                incoming.reply(None)
+        del failure
+
+    def _dispatch_and_reply(self, incoming, executor_callback=None):
+        try:
+            incoming.reply(self._dispatch(incoming.ctxt, incoming.message,
+                                          executor_callback))
         except ExpectedException as e:
             LOG.debug('Expected exception during message handling (%s)' %
                       e.exc_info[1])
@@ -146,13 +393,16 @@ class RPCDispatcher(object):
             # exc_info.
             del exc_info
 
-    def _dispatch(self, ctxt, message):
+    def _dispatch(self, ctxt, message, executor_callback=None):
         """Dispatch an RPC message to the appropriate endpoint method.
 
         :param ctxt: the request context
         :type ctxt: dict
         :param message: the message payload
         :type message: dict
+        :param executor_callback: called with the endpoint method and its
+                                  arguments instead of calling the method
+        :type executor_callback: callable
         :raises: NoSuchMethod, UnsupportedVersion
         """
         method = message.get('method')
@@ -160,22 +410,46 @@ class RPCDispatcher(object):
         namespace = message.get('namespace')
         version = message.get('version', '1.0')
 
-        found_compatible = False
-        for endpoint in self.endpoints:
-            target = getattr(endpoint, 'target', None)
-            if not target:
-                target = self._default_target
+        endpoint = self._lookup(method, namespace, version)
+        localcontext.set_local_context(ctxt)
+        try:
+            return self._do_dispatch(endpoint, method, ctxt, args,
+                                     executor_callback)
+        finally:
+            localcontext.clear_local_context()
+
+    def _lookup(self, method, namespace, version):
+        """Return the endpoint which exposes a method.
 
-            if not (self._is_namespace(target, namespace) and
-                    self._is_compatible(target, version)):
+        :raises: NoSuchMethod, UnsupportedVersion
+        """
+        key = (method, namespace, version)
+        try:
+            return self._lookups[key]
+        except KeyError:
+            pass
+        except TypeError:
+            # Unhashable fields of a malformed message aren't remembered.
+            return self._find_endpoint(method, namespace, version)
+
+        endpoint = self._find_endpoint(method, namespace, version)
+        if len(self._lookups) >= _MAX_LOOKUPS:
+            self._lookups.clear()
+        self._lookups[key] = endpoint
+        return endpoint
+
+    def _find_endpoint(self, method, namespace, version):
+        found_compatible = False
+        try:
+            endpoints = self._index.get(namespace, [])
+        except TypeError:
+            endpoints = []
+        for endpoint, target in endpoints:
+            if not self._is_compatible(target, version):
                 continue
 
             if hasattr(endpoint, method):
-                localcontext.set_local_context(ctxt)
-                try:
-                    return self._do_dispatch(endpoint, method, ctxt, args)
-                finally:
-                    localcontext.clear_local_context()
+                return endpoint
 
             found_compatible = True
 
@@ -91,16 +91,23 @@ to - primitive types.
 """
 
 __all__ = [
+    'batched',
     'get_rpc_server',
     'expected_exceptions',
+    'executor_pool',
+    'max_concurrency',
+    'sequential',
 ]
 
+import functools
+
 from oslo.messaging.rpc import dispatcher as rpc_dispatcher
 from oslo.messaging import server as msg_server
 
 
 def get_rpc_server(transport, target, endpoints,
-                   executor='blocking', serializer=None):
+                   executor='blocking', serializer=None, consumers=1,
+                   workers=1):
     """Construct an RPC server.
 
     The executor parameter controls how incoming messages will be received and
@@ -113,13 +120,31 @@ def get_rpc_server(transport, target, endpoints,
     :type target: Target
     :param endpoints: a list of endpoint objects
     :type endpoints: list
-    :param executor: name of a message executor - e.g. 'eventlet', 'blocking'
+    :param executor: name of a message executor - e.g. 'eventlet',
+                     'threading', 'blocking'
     :type executor: str
     :param serializer: an optional entity serializer
     :type serializer: Serializer
+    :param consumers: how many connections to consume messages over, so that
+                      a busy server isn't limited by the throughput of one
+                      connection. Only the rabbit and qpid drivers support
+                      more than one.
+    :type consumers: int
+    :param workers: how many processes to fork to handle messages, see
+                    MessageHandlingServer.start()
+    :type workers: int
     """
     dispatcher = rpc_dispatcher.RPCDispatcher(target, endpoints, serializer)
-    return msg_server.MessageHandlingServer(transport, dispatcher, executor)
+    server = msg_server.MessageHandlingServer(transport, dispatcher, executor,
+                                              consumers=consumers,
+                                              workers=workers)
+    # The first message of a batch waits in a worker of the executor for the
+    # others, which would never be received by e.g. the blocking executor.
+    if (dispatcher._has_batched_methods() and
+            not getattr(server._executor_cls, 'concurrent', False)):
+        raise ValueError("Batched endpoint methods can't be dispatched by "
+                         "the %s executor" % executor)
+    return server
 
 
 def expected_exceptions(*exceptions):
@@ -134,6 +159,7 @@ def expected_exceptions(*exceptions):
     client will see the original exception type.
     """
     def outer(func):
+        @functools.wraps(func)
         def inner(*args, **kwargs):
             try:
                 return func(*args, **kwargs)
@@ -147,3 +173,95 @@ def expected_exceptions(*exceptions):
                 raise rpc_dispatcher.ExpectedException()
         return inner
     return outer
+
+
+def max_concurrency(limit):
+    """Decorator limiting the concurrent calls of an RPC endpoint method.
+
+    While limit calls of the method are in progress, the RPC server stops
+    accepting messages, so that they stay queued on the broker where other
+    servers can consume them. A limit on all the methods of an endpoint
+    can be set with a max_concurrency attribute on the endpoint object.
+    """
+    def outer(func):
+        func.max_concurrency = limit
+        return func
+    return outer
+
+
+def executor_pool(name, size):
+    """Decorator dispatching an RPC endpoint method in a pool of its own.
+
+    The eventlet and threading executors dispatch the calls of the method
+    in a pool of size workers named name, shared with the other methods
+    given the same name, rather than in their rpc_thread_pool_size pool.
+    Slow methods can so be kept from holding up the others: while their
+    pool is busy, their messages wait for it without keeping other messages
+    from being dispatched. The size of a pool is set by the first of its
+    methods to be dispatched.
+
+    All the methods of an endpoint can be given a pool with an
+    executor_pool attribute on the endpoint object set to a (name, size)
+    tuple.
+    """
+    def outer(func):
+        func.executor_pool = (name, size)
+        return func
+    return outer
+
+
+def sequential(arg=None, context=None):
+    """Decorator running the calls of an RPC endpoint method in sequence.
+
+    The calls are keyed by the value of the method argument named arg, or
+    of the request context field named context. The eventlet and threading
+    executors run the calls with the same key one after the other, in the
+    order they were received, while the calls with different keys run
+    concurrently. Calls of the methods which are keyed by the same argument
+    or context field name share the sequence of each key, e.g. all the
+    methods keyed by arg='instance_uuid' are run in sequence for a given
+    instance.
+    """
+    if (arg is None) == (context is None):
+        raise ValueError('Exactly one of arg and context must be given')
+
+    def outer(func):
+        if arg is not None:
+            func.sequential = ('arg', arg)
+        else:
+            func.sequential = ('context', context)
+        return func
+    return outer
+
+
+def batched(size, timeout):
+    """Decorator handling the casts of an RPC endpoint method in batches.
+
+    Rather than once per message, the method is called with a list of
+    (ctxt, kwargs) tuples, one for each of up to size messages received
+    within timeout seconds of the first one. This allows e.g. the requests
+    of a batch to be handled in a single database transaction::
+
+        @messaging.batched(size=100, timeout=1.0)
+        def report_state(self, requests):
+            with session.begin():
+                for ctxt, kwargs in requests:
+                    update_state(ctxt, **kwargs)
+
+    The messages of a batch are acknowledged once the method returns. If it
+    raises an exception, the exception is returned to each of the callers,
+    otherwise they are returned None, so the method is only meant to be
+    cast to.
+
+    A worker of the executor waits for each batch to fill up, so methods
+    can only be batched with the eventlet, threading or process executors,
+    get_rpc_server() raises ValueError with the others. The other messages
+    of a batch don't take a worker.
+    """
+    if size < 1 or timeout <= 0:
+        raise ValueError('The size and timeout of batches must be positive')
+
+    def outer(func):
+        func.batched = (size, timeout)
+        return func
+    return outer
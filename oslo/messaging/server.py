@@ -23,11 +23,30 @@ __all__ = [
     'ServerListenError',
 ]
 
+import logging
+import os
+import signal
+import threading
+import time
+
 from stevedore import driver
 
 from oslo.messaging._drivers import base as driver_base
 from oslo.messaging import exceptions
 
+LOG = logging.getLogger(__name__)
+
+# Interval, in seconds, at which worker processes are checked on.
+_SUPERVISE_INTERVAL = 1.0
+# A worker process which exits is restarted after this many seconds, doubled
+# for each restart in a row up to _MAX_RESTART_DELAY.
+_RESTART_DELAY = 1.0
+_MAX_RESTART_DELAY = 60.0
+# A worker process is given up on after this many restarts in a row. Its
+# restarts are no longer in a row once it ran for _STABLE_RUN seconds.
+_MAX_RESTARTS = 10
+_STABLE_RUN = 300.0
+
 
 class MessagingServerError(exceptions.MessagingException):
     """Base class for all MessageHandlingServer exceptions."""
@@ -61,7 +80,8 @@ class MessageHandlingServer(object):
     new tasks.
     """
 
-    def __init__(self, transport, dispatcher, executor='blocking'):
+    def __init__(self, transport, dispatcher, executor='blocking',
+                 consumers=1, workers=1):
         """Construct a message handling server.
 
         The dispatcher parameter is a callable which is invoked with context
@@ -75,14 +95,24 @@ class MessageHandlingServer(object):
         :type transport: Transport
         :param dispatcher: a callable which is invoked for each method
         :type dispatcher: callable
-        :param executor: name of message executor - e.g. 'eventlet', 'blocking'
+        :param executor: name of message executor - e.g. 'eventlet',
+                         'threading', 'blocking'
         :type executor: str
+        :param consumers: how many connections to consume messages over, with
+                          drivers which support it
+        :type consumers: int
+        :param workers: how many processes to fork to handle messages, only
+                        the eventlet, threading and process executors
+                        support more than one
+        :type workers: int
         """
         self.conf = transport.conf
 
         self.transport = transport
         self.dispatcher = dispatcher
         self.executor = executor
+        self.consumers = consumers
+        self.workers = workers
 
         try:
             mgr = driver.DriverManager('oslo.messaging.executors',
@@ -93,6 +123,22 @@ class MessageHandlingServer(object):
             self._executor_cls = mgr.driver
             self._executor = None
 
+        # A worker process waits for SIGTERM once the executor is started,
+        # e.g. the blocking executor would never return from start() and
+        # nothing would run the loop of the asyncio executor.
+        if workers > 1 and not getattr(self._executor_cls, 'background',
+                                       False):
+            raise ValueError("The %s executor can't be run in worker "
+                             "processes" % executor)
+
+        self._supervisor = None
+        self._worker_pids = []
+        self._worker_starts = []
+        self._worker_restarts = []
+        self._worker_restart_at = []
+        self._workers_lock = threading.Lock()
+        self._stopping = False
+
         super(MessageHandlingServer, self).__init__()
 
     def start(self):
@@ -110,17 +156,131 @@ class MessageHandlingServer(object):
         current thread. An RPCServer subclass is available for each I/O
         strategy supported by the library, so choose the subclass appropriate
         for your program.
+
+        With more than one worker, start() forks the worker processes and
+        returns. Each worker listens on the transport over connections of its
+        own and handles messages with its own executor, which must keep
+        handling messages once its start() returned. Only the eventlet,
+        threading and process executors can, the others raise ValueError
+        when the server is created.
+        Workers which exit before stop() is called are restarted, after a
+        delay which doubles with each restart in a row, and are given up on
+        after too many restarts in a row. The transport may be used before
+        the workers are forked, the connections of the parent process are
+        not shared with the workers, which open their own.
         """
-        if self._executor is not None:
+        if self._executor is not None or self._supervisor is not None:
+            return
+        if self.workers > 1:
+            self._start_workers()
             return
+
+        self._executor = self._executor_cls(self.conf, self._listen(),
+                                            self.dispatcher)
+        self._executor.start()
+
+    def _listen(self):
         try:
-            listener = self.dispatcher._listen(self.transport)
+            if self.consumers > 1:
+                return self.dispatcher._listen(self.transport,
+                                               consumers=self.consumers)
+            return self.dispatcher._listen(self.transport)
         except driver_base.TransportDriverError as ex:
             raise ServerListenError(self.target, ex)
 
-        self._executor = self._executor_cls(self.conf, listener,
+    def _start_workers(self):
+        self._stopping = False
+        self._worker_pids = [None] * self.workers
+        self._worker_starts = [None] * self.workers
+        self._worker_restarts = [0] * self.workers
+        self._worker_restart_at = [None] * self.workers
+        with self._workers_lock:
+            for slot in range(self.workers):
+                self._fork_worker(slot)
+
+        self._supervisor = threading.Thread(target=self._supervise)
+        self._supervisor.daemon = True
+        self._supervisor.start()
+
+    def _fork_worker(self, slot):
+        pid = os.fork()
+        if pid:
+            self._worker_pids[slot] = pid
+            self._worker_starts[slot] = time.time()
+            return
+
+        status = 1
+        try:
+            self._run_worker()
+            status = 0
+        except BaseException:
+            LOG.exception('Worker process %d failed', os.getpid())
+        finally:
+            os._exit(status)
+
+    def _run_worker(self):
+        """Handle messages in a worker process until it is sent SIGTERM."""
+        stopped = threading.Event()
+        signal.signal(signal.SIGTERM, lambda signo, frame: stopped.set())
+
+        self._supervisor = None
+        self._worker_pids = []
+        self._executor = self._executor_cls(self.conf, self._listen(),
                                             self.dispatcher)
         self._executor.start()
+        # Signals are only handled between the waits.
+        while not stopped.is_set():
+            stopped.wait(_SUPERVISE_INTERVAL)
+
+        self._executor.stop()
+        self.wait()
+
+    def _supervise(self):
+        while True:
+            with self._workers_lock:
+                for slot, pid in enumerate(self._worker_pids):
+                    if pid is None:
+                        self._restart_worker(slot)
+                        continue
+                    try:
+                        done, status = os.waitpid(pid, os.WNOHANG)
+                    except OSError:
+                        done, status = pid, -1
+                    if not done:
+                        continue
+
+                    self._worker_pids[slot] = None
+                    if not self._stopping:
+                        self._schedule_restart(slot, pid, status)
+
+                if self._stopping and not any(self._worker_pids):
+                    return
+            time.sleep(_SUPERVISE_INTERVAL)
+
+    def _schedule_restart(self, slot, pid, status):
+        now = time.time()
+        if now - self._worker_starts[slot] >= _STABLE_RUN:
+            self._worker_restarts[slot] = 0
+        restarts = self._worker_restarts[slot]
+        if restarts >= _MAX_RESTARTS:
+            LOG.error('Worker process %(pid)d exited with status %(status)d '
+                      'after %(restarts)d restarts in a row, giving up on it',
+                      {'pid': pid, 'status': status, 'restarts': restarts})
+            return
+
+        delay = min(_RESTART_DELAY * 2 ** restarts, _MAX_RESTART_DELAY)
+        LOG.warn('Worker process %(pid)d exited with status %(status)d, '
+                 'restarting it in %(delay).1f seconds',
+                 {'pid': pid, 'status': status, 'delay': delay})
+        self._worker_restarts[slot] = restarts + 1
+        self._worker_restart_at[slot] = now + delay
+
+    def _restart_worker(self, slot):
+        restart_at = self._worker_restart_at[slot]
+        if self._stopping or restart_at is None or time.time() < restart_at:
+            return
+        self._worker_restart_at[slot] = None
+        self._fork_worker(slot)
 
     def stop(self):
         """Stop handling incoming messages.
@@ -129,6 +289,16 @@ class MessageHandlingServer(object):
         the server. However, the server may still be in the process of handling
         some messages.
         """
+        if self._supervisor is not None:
+            with self._workers_lock:
+                self._stopping = True
+                for pid in self._worker_pids:
+                    if pid is None:
+                        continue
+                    try:
+                        os.kill(pid, signal.SIGTERM)
+                    except OSError:
+                        pass
         if self._executor is not None:
             self._executor.stop()
 
@@ -138,7 +308,14 @@ class MessageHandlingServer(object):
         After calling stop(), there may still be some some existing messages
         which have not been completely processed. The wait() method blocks
         until all message processing has completed.
+
+        With worker processes, it waits for them to exit.
         """
+        if self._supervisor is not None:
+            while self._supervisor.is_alive():
+                self._supervisor.join(_SUPERVISE_INTERVAL)
+            self._supervisor = None
         if self._executor is not None:
             self._executor.wait()
+            self._executor.listener.cleanup()
         self._executor = None
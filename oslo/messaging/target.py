@@ -57,16 +57,23 @@ class Target(object):
       servers listening on a topic by setting fanout to ``True``, rather than
       just one of them.
     :type fanout: bool
+    :param routing_key: Clients may supply a key, e.g. the UUID of the entity
+      a message concerns, so that messages with the same key are consistently
+      directed to the same one of the servers listening on a topic. This is a
+      hint which only some transports, e.g. ZeroMQ with a ring matchmaker,
+      act upon.
+    :type routing_key: str
     """
 
     def __init__(self, exchange=None, topic=None, namespace=None,
-                 version=None, server=None, fanout=None):
+                 version=None, server=None, fanout=None, routing_key=None):
         self.exchange = exchange
         self.topic = topic
         self.namespace = namespace
         self.version = version
         self.server = server
         self.fanout = fanout
+        self.routing_key = routing_key
 
     def __call__(self, **kwargs):
         kwargs.setdefault('exchange', self.exchange)
@@ -75,6 +82,7 @@ class Target(object):
         kwargs.setdefault('version', self.version)
         kwargs.setdefault('server', self.server)
         kwargs.setdefault('fanout', self.fanout)
+        kwargs.setdefault('routing_key', self.routing_key)
         return Target(**kwargs)
 
     def __eq__(self, other):
@@ -86,7 +94,7 @@ class Target(object):
     def __repr__(self):
         attrs = []
         for a in ['exchange', 'topic', 'namespace',
-                  'version', 'server', 'fanout']:
+                  'version', 'server', 'fanout', 'routing_key']:
             v = getattr(self, a)
             if v:
                 attrs.append((a, v))
@@ -89,25 +89,38 @@ class Transport(object):
                                  wait_for_reply=wait_for_reply,
                                  timeout=timeout)
 
+    def _send_async(self, target, ctxt, message, callback, timeout=None):
+        if not target.topic:
+            raise exceptions.InvalidTarget('A topic is required to send',
+                                           target)
+        self._driver.send_async(target, ctxt, message, callback,
+                                timeout=timeout)
+
     def _send_notification(self, target, ctxt, message, version):
         if not target.topic:
             raise exceptions.InvalidTarget('A topic is required to send',
                                            target)
         self._driver.send_notification(target, ctxt, message, version)
 
-    def _listen(self, target):
+    def _listen(self, target, consumers=1):
         if not (target.topic and target.server):
             raise exceptions.InvalidTarget('A server\'s target must have '
                                            'topic and server names specified',
                                            target)
+        # Out of tree drivers may not take the consumers argument yet.
+        if consumers > 1:
+            return self._driver.listen(target, consumers=consumers)
         return self._driver.listen(target)
 
-    def _listen_for_notifications(self, targets_and_priorities):
+    def _listen_for_notifications(self, targets_and_priorities, consumers=1):
         for target, priority in targets_and_priorities:
             if not target.topic:
                 raise exceptions.InvalidTarget('A target must have '
                                                'topic specified',
                                                target)
+        if consumers > 1:
+            return self._driver.listen_for_notifications(
+                targets_and_priorities, consumers=consumers)
         return self._driver.listen_for_notifications(targets_and_priorities)
 
     def cleanup(self):
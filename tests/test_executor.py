@@ -16,13 +16,23 @@
 
 import contextlib
 import eventlet
+import os
 import threading
+import time
 
 import mock
+from oslo import messaging
+from six import moves
 import testscenarios
+import testtools
 
+from oslo.messaging._executors import base as executor_base
+from oslo.messaging._executors import impl_asyncio
 from oslo.messaging._executors import impl_blocking
 from oslo.messaging._executors import impl_eventlet
+from oslo.messaging._executors import impl_process
+from oslo.messaging._executors import impl_thread
+from oslo.messaging.rpc import dispatcher as rpc_dispatcher
 from tests import utils as test_utils
 
 load_tests = testscenarios.load_tests_apply_scenarios
@@ -135,3 +145,636 @@ class EventletContextManagerSpawnTest(test_utils.BaseTestCase):
         self.assertEqual(1, self.callback.call_count)
         self.assertEqual(0, self.after.call_count)
         self.assertEqual(0, self.exception_call.call_count)
+
+
+class TestPoolAutoscaler(test_utils.BaseTestCase):
+
+    scenarios = [
+        ('queueing', dict(queueing=0.5, utilization=1.0, latency=1.0,
+                          size=12)),
+        ('idle', dict(queueing=0.0, utilization=0.1, latency=1.0,
+                      size=4)),
+        ('busy', dict(queueing=0.0, utilization=0.9, latency=1.0,
+                      size=8)),
+        ('latency', dict(queueing=0.5, utilization=1.0, latency=3.0,
+                         size=4)),
+        ('no_calls', dict(queueing=0.0, utilization=0.9, latency=None,
+                          size=8)),
+    ]
+
+    def test_decide(self):
+        autoscaler = impl_eventlet.PoolAutoscaler(2, 16)
+        # The usual latency of the endpoints.
+        self.assertEqual(8, autoscaler.decide(8, 0.0, 0.9, 1.0))
+
+        size = autoscaler.decide(8, self.queueing, self.utilization,
+                                 self.latency)
+
+        self.assertEqual(self.size, size)
+        self.assertEqual(self.size, autoscaler.decisions[-1].new_size)
+
+
+class TestPoolAutoscalerBounds(test_utils.BaseTestCase):
+
+    def test_bounds(self):
+        autoscaler = impl_eventlet.PoolAutoscaler(4, 16)
+
+        self.assertEqual(16, autoscaler.decide(14, 1.0, 1.0, 1.0))
+        self.assertEqual(4, autoscaler.decide(6, 0.0, 0.0, 1.0))
+        self.assertEqual(4, autoscaler.decide(6, 0.0, 1.0, 10.0))
+
+    def test_latency_adopted_at_min_size(self):
+        autoscaler = impl_eventlet.PoolAutoscaler(4, 16)
+        autoscaler.decide(8, 0.0, 1.0, 1.0)
+
+        # The endpoints are slower whatever the size of the pool.
+        for i in range(20):
+            autoscaler.decide(4, 1.0, 1.0, 3.0)
+
+        self.assertEqual(8, autoscaler.decide(4, 1.0, 1.0, 3.0))
+
+    def test_resize_wakes_up_waiters(self):
+        pool = impl_eventlet._MeasuredGreenPool(1)
+        release = eventlet.event.Event()
+        pool.spawn(release.wait)
+        spawned = eventlet.spawn(pool.spawn, lambda: None)
+        eventlet.sleep(0)
+        self.assertFalse(spawned.dead)
+
+        pool.resize(2)
+        spawned.wait()
+
+        release.send(None)
+        pool.waitall()
+        self.assertEqual(2, pool.calls)
+
+    def test_executor(self):
+        self.conf.register_opts(impl_eventlet._eventlet_opts)
+        self.config(rpc_thread_pool_autoscale=True,
+                    rpc_thread_pool_size=64,
+                    rpc_thread_pool_max_size=32,
+                    rpc_thread_pool_autoscale_interval=1)
+        listener = mock.Mock(spec=['poll'])
+        listener.poll.side_effect = lambda: eventlet.sleep(10)
+        executor = impl_eventlet.EventletExecutor(self.conf, listener,
+                                                  mock.Mock())
+        self.assertEqual(32, executor.pool_size)
+
+        executor.start()
+        while not executor.autoscaler.decisions:
+            eventlet.sleep(0.01)
+        executor.stop()
+        executor.wait()
+
+        # The pool is shrunk while it is idle.
+        self.assertTrue(executor.pool_size < 32)
+
+    def test_interval_must_be_positive(self):
+        self.conf.register_opts(impl_eventlet._eventlet_opts)
+        self.config(rpc_thread_pool_autoscale=True,
+                    rpc_thread_pool_autoscale_interval=0)
+
+        self.assertRaises(ValueError, impl_eventlet.EventletExecutor,
+                          self.conf, mock.Mock(), mock.Mock())
+
+    @mock.patch.object(impl_eventlet, 'time')
+    def test_no_time_elapsed(self, mock_time):
+        mock_time.time.return_value = 1000.0
+        self.conf.register_opts(impl_eventlet._eventlet_opts)
+        self.config(rpc_thread_pool_autoscale=True,
+                    rpc_thread_pool_autoscale_interval=1)
+        listener = mock.Mock(spec=['poll'])
+        listener.poll.side_effect = lambda: eventlet.sleep(10)
+        executor = impl_eventlet.EventletExecutor(self.conf, listener,
+                                                  mock.Mock())
+
+        executor.start()
+        eventlet.sleep(1.5)
+        # The sample is skipped rather than killing the autoscaler.
+        self.assertFalse(executor._autoscale_thread.dead)
+        self.assertFalse(executor.autoscaler.decisions)
+        executor.stop()
+        executor.wait()
+
+
+class FakeListener(object):
+    def __init__(self):
+        self.queue = moves.queue.Queue()
+        self.polling = threading.Event()
+
+    def poll(self):
+        self.polling.set()
+        return self.queue.get()
+
+
+class Dispatcher(object):
+    def __init__(self, callback):
+        self.callback = callback
+
+    @contextlib.contextmanager
+    def __call__(self, incoming):
+        yield lambda: self.callback(incoming)
+
+
+@testtools.skipIf(impl_thread.futures is None, "futures not available")
+class TestThreadExecutor(test_utils.BaseTestCase):
+
+    def setUp(self):
+        super(TestThreadExecutor, self).setUp()
+        self.conf.register_opts(executor_base._pool_opts)
+        self.listener = FakeListener()
+
+    def _executor(self, callback):
+        executor = impl_thread.ThreadExecutor(self.conf, self.listener,
+                                              Dispatcher(callback))
+        executor.start()
+        self.addCleanup(executor.wait)
+        self.addCleanup(executor.stop)
+        return executor
+
+    def test_dispatch_concurrently(self):
+        started = []
+        both_started = threading.Event()
+
+        def callback(incoming):
+            started.append(incoming)
+            if len(started) == 2:
+                both_started.set()
+            # Only returns if the other message is handled at the same time.
+            self.assertTrue(both_started.wait(10))
+
+        self._executor(callback)
+        self.listener.queue.put(mock.Mock())
+        self.listener.queue.put(mock.Mock())
+
+        self.assertTrue(both_started.wait(10))
+
+    def test_wait_drains(self):
+        received = threading.Event()
+        release = threading.Event()
+        done = []
+
+        def callback(incoming):
+            received.set()
+            release.wait(10)
+            done.append(incoming)
+
+        executor = self._executor(callback)
+        incoming = mock.Mock()
+        self.listener.queue.put(incoming)
+        self.assertTrue(received.wait(10))
+
+        executor.stop()
+        threading.Timer(0.1, release.set).start()
+        executor.wait()
+
+        self.assertEqual([incoming], done)
+
+    def test_requeue_after_stop(self):
+        polling = threading.Event()
+        incoming = mock.Mock()
+
+        def poll():
+            polling.set()
+            return self.listener.queue.get()
+
+        self.listener.poll = poll
+        callback = mock.Mock()
+        executor = self._executor(callback)
+
+        # A message returned by a poll() in progress when we stopped.
+        self.assertTrue(polling.wait(10))
+        executor.stop()
+        self.listener.queue.put(incoming)
+        executor.wait()
+        for i in range(100):
+            if incoming.requeue.called:
+                break
+            time.sleep(0.1)
+
+        incoming.requeue.assert_called_once_with()
+        self.assertFalse(callback.called)
+
+    def test_restart(self):
+        callback = mock.Mock()
+        executor = self._executor(callback)
+        self.assertTrue(self.listener.polling.wait(10))
+        executor.stop()
+        executor.wait()
+
+        # The polling thread of the first run is still blocked in poll(),
+        # the new one polls another queue.
+        old_queue = self.listener.queue
+        self.listener.queue = moves.queue.Queue()
+        executor.start()
+        old, new = mock.Mock(requeue=mock.Mock()), mock.Mock()
+        old_queue.put(old)
+        self.listener.queue.put(new)
+        for i in range(100):
+            if old.requeue.called and callback.called:
+                break
+            time.sleep(0.1)
+
+        old.requeue.assert_called_once_with()
+        callback.assert_called_once_with(new)
+
+    def test_executor_pool(self):
+        self.config(rpc_thread_pool_size=1)
+        release = threading.Event()
+        done = []
+        all_done = threading.Event()
+
+        def callback(incoming):
+            if incoming.message['method'] == 'slow':
+                release.wait(10)
+            done.append(incoming.message['method'])
+            if len(done) == 3:
+                all_done.set()
+
+        dispatcher = Dispatcher(callback)
+        dispatcher.get_executor_pool = lambda incoming: (
+            ('slow', 1) if incoming.message['method'] == 'slow' else None)
+        executor = impl_thread.ThreadExecutor(self.conf, self.listener,
+                                              dispatcher)
+        executor.start()
+        self.addCleanup(executor.wait)
+        self.addCleanup(executor.stop)
+        self.addCleanup(release.set)
+
+        # The fast message is dispatched in the default pool while the slow
+        # pool is busy, the second slow message waits for the slow pool.
+        for method in ('slow', 'fast', 'slow'):
+            self.listener.queue.put(mock.Mock(message={'method': method}))
+        for i in range(100):
+            if done:
+                break
+            time.sleep(0.1)
+        self.assertEqual(['fast'], done)
+
+        release.set()
+        self.assertTrue(all_done.wait(10))
+        self.assertEqual(['fast', 'slow', 'slow'], done)
+
+    def test_executor_pool_backlog(self):
+        self.config(rpc_thread_pool_size=1)
+        release = threading.Event()
+        done = []
+
+        def callback(incoming):
+            if incoming.message['method'] == 'slow':
+                release.wait(10)
+            done.append(incoming.message['method'])
+
+        dispatcher = Dispatcher(callback)
+        dispatcher.get_executor_pool = lambda incoming: (
+            ('slow', 1) if incoming.message['method'] == 'slow' else None)
+        executor = impl_thread.ThreadExecutor(self.conf, self.listener,
+                                              dispatcher)
+        executor.start()
+        self.addCleanup(executor.wait)
+        self.addCleanup(executor.stop)
+        self.addCleanup(release.set)
+
+        # One slow message runs and one waits, then the backlog of the slow
+        # pool is full and the following messages are left with the listener.
+        for method in ('slow', 'slow', 'slow', 'fast'):
+            self.listener.queue.put(mock.Mock(message={'method': method}))
+        for i in range(100):
+            if self.listener.queue.qsize() == 2:
+                break
+            time.sleep(0.1)
+        time.sleep(0.2)
+        self.assertEqual(2, self.listener.queue.qsize())
+        self.assertEqual([], done)
+
+        release.set()
+        for i in range(100):
+            if len(done) == 4:
+                break
+            time.sleep(0.1)
+        self.assertEqual(3, done.count('slow'))
+        self.assertIn('fast', done)
+
+    def test_sequential(self):
+        self.config(rpc_thread_pool_size=4)
+        release = threading.Event()
+        done = []
+        all_done = threading.Event()
+
+        def callback(incoming):
+            key, n = incoming.message['key'], incoming.message['n']
+            if key == 'a' and n == 0:
+                release.wait(10)
+            done.append((key, n))
+            if len(done) == 4:
+                all_done.set()
+
+        dispatcher = Dispatcher(callback)
+        dispatcher.get_sequence_key = lambda incoming: (
+            incoming.message['key'])
+        executor = impl_thread.ThreadExecutor(self.conf, self.listener,
+                                              dispatcher)
+        executor.start()
+        self.addCleanup(executor.wait)
+        self.addCleanup(executor.stop)
+        self.addCleanup(release.set)
+
+        # The messages of the other key run while the first message of
+        # key 'a' holds up the following one.
+        for key, n in (('a', 0), ('a', 1), ('b', 0), ('b', 1)):
+            self.listener.queue.put(mock.Mock(message={'key': key, 'n': n}))
+        for i in range(100):
+            if len(done) == 2:
+                break
+            time.sleep(0.1)
+        self.assertEqual([('b', 0), ('b', 1)], done)
+
+        release.set()
+        self.assertTrue(all_done.wait(10))
+        self.assertEqual([('b', 0), ('b', 1), ('a', 0), ('a', 1)], done)
+
+    def test_sequential_backlog(self):
+        self.config(rpc_thread_pool_size=2)
+        release = threading.Event()
+        done = []
+
+        def callback(incoming):
+            if incoming.message['n'] == 0:
+                release.wait(10)
+            done.append(incoming.message['n'])
+
+        dispatcher = Dispatcher(callback)
+        dispatcher.get_sequence_key = lambda incoming: 'key'
+        executor = impl_thread.ThreadExecutor(self.conf, self.listener,
+                                              dispatcher)
+        executor.start()
+        self.addCleanup(executor.wait)
+        self.addCleanup(executor.stop)
+        self.addCleanup(release.set)
+
+        # One message runs and four wait behind it, then the backlog is full
+        # and the following messages are left with the listener.
+        for n in range(10):
+            self.listener.queue.put(mock.Mock(message={'n': n}))
+        for i in range(100):
+            if self.listener.queue.qsize() == 5:
+                break
+            time.sleep(0.1)
+        time.sleep(0.2)
+        self.assertEqual(5, self.listener.queue.qsize())
+        self.assertEqual([], done)
+
+        release.set()
+        for i in range(100):
+            if len(done) == 10:
+                break
+            time.sleep(0.1)
+        self.assertEqual(list(range(10)), done)
+
+
+class UnpicklableError(Exception):
+    def __init__(self, a, b):
+        super(UnpicklableError, self).__init__('%s %s' % (a, b))
+
+
+@testtools.skipIf(impl_thread.futures is None, "futures not available")
+class TestProcessExecutor(test_utils.BaseTestCase):
+
+    def setUp(self):
+        super(TestProcessExecutor, self).setUp()
+        self.conf.register_opts(impl_process._process_opts)
+        self.config(rpc_process_pool_size=2)
+        self.listener = FakeListener()
+
+        class Endpoint(object):
+            def getpid(self, ctxt):
+                return os.getpid()
+
+            def fail(self, ctxt):
+                raise ValueError('fail')
+
+            @messaging.expected_exceptions(ValueError)
+            def fail_expected(self, ctxt):
+                raise ValueError('expected')
+
+            def fail_unpicklable(self, ctxt):
+                raise UnpicklableError('a', 'b')
+
+            def deserialized_in(self, ctxt):
+                return ctxt['pid']
+
+        class Serializer(messaging.NoOpSerializer):
+            def deserialize_context(self, ctxt):
+                return dict(ctxt, pid=os.getpid())
+
+        dispatcher = rpc_dispatcher.RPCDispatcher(messaging.Target(),
+                                                  [Endpoint()], Serializer())
+        self.executor = impl_process.ProcessExecutor(
+            self.conf, self.listener, dispatcher)
+        self.executor.start()
+
+    def _call(self, method):
+        replied = threading.Event()
+        incoming = mock.Mock(ctxt={}, message={'method': method})
+        incoming.reply.side_effect = lambda *a, **kw: replied.set()
+
+        self.listener.queue.put(incoming)
+        self.assertTrue(replied.wait(30))
+        return incoming
+
+    def tearDown(self):
+        self.executor.stop()
+        self.executor.wait()
+        super(TestProcessExecutor, self).tearDown()
+
+    def test_dispatch_in_worker(self):
+        incoming = self._call('getpid')
+
+        incoming.acknowledge.assert_called_once_with()
+        pid = incoming.reply.call_args[0][0]
+        self.assertNotEqual(os.getpid(), pid)
+
+    def test_deserialize_in_worker(self):
+        incoming = self._call('deserialized_in')
+
+        pid = incoming.reply.call_args[0][0]
+        self.assertNotEqual(os.getpid(), pid)
+
+    def test_exception(self):
+        incoming = self._call('fail')
+
+        failure = incoming.reply.call_args[1]['failure']
+        self.assertEqual(ValueError, failure[0])
+        self.assertEqual('fail', str(failure[1]))
+
+    def test_expected_exception(self):
+        incoming = self._call('fail_expected')
+
+        kwargs = incoming.reply.call_args[1]
+        self.assertEqual(ValueError, kwargs['failure'][0])
+        self.assertFalse(kwargs['log_failure'])
+
+    def test_unpicklable_exception(self):
+        incoming = self._call('fail_unpicklable')
+
+        failure = incoming.reply.call_args[1]['failure']
+        self.assertEqual(RuntimeError, failure[0])
+        self.assertEqual('UnpicklableError: a b', str(failure[1]))
+
+
+@testtools.skipIf(impl_asyncio.asyncio is None, "asyncio not available")
+class TestAsyncioExecutor(test_utils.BaseTestCase):
+
+    def setUp(self):
+        super(TestAsyncioExecutor, self).setUp()
+        asyncio = impl_asyncio.asyncio
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.addCleanup(self.loop.close)
+        self.addCleanup(asyncio.set_event_loop, None)
+        self.listener = FakeListener()
+        self.waiting = []
+
+        test = self
+
+        class Endpoint(object):
+            def echo(self, ctxt, value):
+                return value
+
+            def later(self, ctxt, value):
+                future = asyncio.Future(loop=test.loop)
+                test.loop.call_later(0.01, future.set_result, value)
+                return future
+
+            def fail_later(self, ctxt):
+                future = asyncio.Future(loop=test.loop)
+                test.loop.call_soon(future.set_exception, ValueError('fail'))
+                return future
+
+            def wait_for_other(self, ctxt, value):
+                # Only completes once another call is waiting too.
+                future = asyncio.Future(loop=test.loop)
+                test.waiting.append((future, value))
+                if len(test.waiting) == 2:
+                    for f, v in test.waiting:
+                        f.set_result(v)
+                return future
+
+        dispatcher = rpc_dispatcher.RPCDispatcher(messaging.Target(),
+                                                  [Endpoint()], None)
+        self.executor = impl_asyncio.AsyncioExecutor(
+            self.conf, self.listener, dispatcher)
+        self.executor.start()
+
+    @staticmethod
+    def _incoming(method, **kwargs):
+        # Mocks aren't thread safe, the methods called by the polling
+        # thread are created before it gets the message.
+        return mock.Mock(ctxt={}, message={'method': method, 'args': kwargs},
+                         acknowledge=mock.Mock(), reply=mock.Mock(),
+                         requeue=mock.Mock())
+
+    def _call(self, method, **kwargs):
+        incoming = self._incoming(method, **kwargs)
+        self.listener.queue.put(incoming)
+        return incoming
+
+    def _run_until_replied(self, *incomings):
+        asyncio = impl_asyncio.asyncio
+        replied = asyncio.Future(loop=self.loop)
+
+        def reply(*args, **kwargs):
+            if all(i.reply.called for i in incomings):
+                replied.set_result(None)
+
+        for incoming in incomings:
+            incoming.reply.side_effect = reply
+        self.loop.run_until_complete(asyncio.wait_for(replied, 10))
+
+    def tearDown(self):
+        self.executor.stop()
+        self.executor.wait()
+        super(TestAsyncioExecutor, self).tearDown()
+
+    def test_dispatch(self):
+        incoming = self._call('echo', value='foo')
+        self._run_until_replied(incoming)
+
+        incoming.acknowledge.assert_called_once_with()
+        incoming.reply.assert_called_once_with('foo')
+
+    def test_restart(self):
+        self.assertTrue(self.listener.polling.wait(10))
+        self.executor.stop()
+        self.executor.wait()
+
+        # The polling thread of the first run is still blocked in poll(),
+        # the new one polls another queue.
+        old_queue = self.listener.queue
+        self.listener.queue = moves.queue.Queue()
+        self.executor.start()
+        old = self._incoming('echo', value='old')
+        old_queue.put(old)
+        new = self._call('echo', value='new')
+        self._run_until_replied(new)
+        for i in range(100):
+            if old.requeue.called:
+                break
+            time.sleep(0.1)
+
+        old.requeue.assert_called_once_with()
+        self.assertFalse(old.reply.called)
+
+    def test_future_result(self):
+        incoming = self._call('later', value='foo')
+        self._run_until_replied(incoming)
+
+        incoming.reply.assert_called_once_with('foo')
+
+    def test_future_exception(self):
+        incoming = self._call('fail_later')
+        self._run_until_replied(incoming)
+
+        failure = incoming.reply.call_args[1]['failure']
+        self.assertEqual(ValueError, failure[0])
+
+    def test_dispatch_concurrently(self):
+        first = self._call('wait_for_other', value=1)
+        second = self._call('wait_for_other', value=2)
+        self._run_until_replied(first, second)
+
+        first.reply.assert_called_once_with(1)
+        second.reply.assert_called_once_with(2)
+
+    def test_max_in_flight(self):
+        self.executor.stop()
+        self.executor.wait()
+        self.config(rpc_asyncio_max_in_flight=1)
+        self.listener = FakeListener()
+        self.executor = impl_asyncio.AsyncioExecutor(
+            self.conf, self.listener, self.executor.dispatcher)
+        self.executor.start()
+
+        first = self._call('wait_for_other', value=1)
+        second = self._call('echo', value=2)
+        while not first.acknowledge.called:
+            self.loop.run_until_complete(impl_asyncio.asyncio.sleep(0.01))
+        self.loop.run_until_complete(impl_asyncio.asyncio.sleep(0.1))
+
+        # The second message stays on the broker until the first is done.
+        self.assertEqual(1, self.listener.queue.qsize())
+        future, value = self.waiting[0]
+        future.set_result(value)
+        self._run_until_replied(first, second)
+
+        second.reply.assert_called_once_with(2)
+
+    def test_wait_drains(self):
+        incoming = self._call('later', value='foo')
+        while not incoming.acknowledge.called:
+            self.loop.run_until_complete(impl_asyncio.asyncio.sleep(0.01))
+
+        self.executor.stop()
+        self.executor.wait()
+
+        incoming.reply.assert_called_once_with('foo')
@@ -0,0 +1,631 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import socket
+import threading
+import time
+import zlib
+
+import eventlet
+import fixtures
+import mock
+import testscenarios
+import testtools
+
+from oslo import messaging
+from oslo.messaging._drivers import common as rpc_common
+from oslo.messaging._drivers import impl_zmq
+from oslo.messaging._drivers import matchmaker_ring
+from oslo.messaging._drivers import zmq_proxy
+from oslo.messaging._executors import impl_eventlet
+from oslo.messaging.openstack.common import jsonutils
+from tests import utils as test_utils
+
+load_tests = testscenarios.load_tests_apply_scenarios
+
+
+class FakeFrame(object):
+    """Mimics a zmq.Frame as returned by recv(copy=False)."""
+
+    def __init__(self, data):
+        self.bytes = data
+
+
+@testtools.skipIf(impl_zmq.zmq is None, "zmq not available")
+class ZmqBaseTestCase(test_utils.BaseTestCase):
+
+    def setUp(self):
+        super(ZmqBaseTestCase, self).setUp()
+        self.conf.register_opts(impl_zmq.zmq_opts)
+        self.conf.register_opts(impl_eventlet._eventlet_opts)
+
+
+class TestZmqFrames(ZmqBaseTestCase):
+
+    def test_frame_bytes(self):
+        self.assertEqual('foo', impl_zmq._frame_bytes(FakeFrame('foo')))
+        self.assertEqual('foo', impl_zmq._frame_bytes('foo'))
+
+    def test_unflatten_envelope_iterable(self):
+        frames = iter(['a', '1', 'b', '2'])
+        self.assertEqual({'a': '1', 'b': '2'},
+                         impl_zmq.unflatten_envelope(frames))
+
+    @mock.patch.object(impl_zmq, 'ZmqSocket')
+    def test_client_cast_envelope(self, sock_cls):
+        client = impl_zmq.ZmqClient('tcp://127.0.0.1:9501')
+        client.cast('msgid', 'topic', ['ctxt', {'method': 'foo'}], True)
+
+        frames = sock_cls.return_value.send.call_args[0][0]
+        kwargs = sock_cls.return_value.send.call_args[1]
+        self.assertEqual(['msgid', 'topic', 'impl_zmq_v2', 'ctxt'],
+                         frames[:4])
+        self.assertEqual({'method': 'foo'}, rpc_common.deserialize_msg(
+            impl_zmq.unflatten_envelope(frames[4:])))
+        self.assertFalse(kwargs['copy'])
+
+    def test_reactor_consume_frames(self):
+        reactor = impl_zmq.ZmqReactor(self.conf)
+        sock = mock.Mock()
+        proxy = mock.Mock()
+        reactor.proxies[sock] = proxy
+
+        envelope = rpc_common.serialize_msg({'method': 'foo'})
+        frames = ['0', 'topic', 'impl_zmq_v2',
+                  jsonutils.dumps({'user': 'alice'})]
+        for k, v in envelope.items():
+            frames.extend((k, v))
+        sock.recv.return_value = [FakeFrame(f) for f in frames]
+
+        with mock.patch.object(reactor.pool, 'spawn_n') as spawn_n:
+            reactor.consume(sock)
+
+        sock.recv.assert_called_once_with(copy=False)
+        process, p, ctx, request = spawn_n.call_args[0]
+        self.assertEqual(proxy, p)
+        self.assertEqual('alice', ctx.to_dict()['user'])
+        self.assertEqual({'method': 'foo'}, request)
+
+
+def _get_unused_port():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+@testtools.skipIf(zmq_proxy.zmq is None, "zmq not available")
+class TestZmqProxyDevice(ZmqBaseTestCase):
+
+    def setUp(self):
+        super(TestZmqProxyDevice, self).setUp()
+        self.ipc_dir = self.useFixture(fixtures.TempDir()).path
+        self.config(rpc_zmq_ipc_dir=self.ipc_dir,
+                    rpc_zmq_bind_address='127.0.0.1',
+                    rpc_zmq_port=_get_unused_port(),
+                    rpc_zmq_proxy_workers=2,
+                    rpc_zmq_proxy_stats_interval=0)
+
+        self.ctxt = zmq_proxy.zmq.Context()
+        self.addCleanup(self.ctxt.term)
+
+        self.proxy = zmq_proxy.ZmqProxyDevice(self.conf)
+        self.proxy.consume_in_thread()
+        self.addCleanup(self.proxy.close)
+
+        self.sender = self._socket(zmq_proxy.zmq.PUSH, 'tcp://127.0.0.1:%d' %
+                                   self.conf.rpc_zmq_port)
+
+    def _socket(self, sock_type, addr):
+        sock = self.ctxt.socket(sock_type)
+        sock.setsockopt(zmq_proxy.zmq.RCVTIMEO, 5000)
+        sock.connect(addr)
+        self.addCleanup(sock.close, 0)
+        return sock
+
+    def _wait_for_stats(self, topic, key, value):
+        for i in range(50):
+            stats = self.proxy.stats().get(topic, {})
+            if stats.get(key) == value:
+                return
+            time.sleep(0.1)
+        self.fail('%s of %s never reached %s' % (key, topic, value))
+
+    def test_forward(self):
+        consumer = self._socket(zmq_proxy.zmq.PULL,
+                                'ipc://%s/zmq_topic_topic.host' % self.ipc_dir)
+
+        for i in range(10):
+            self.sender.send_multipart(['0', 'topic.host', 'cast', str(i)])
+        for i in range(10):
+            self.assertEqual(['0', 'topic.host', 'cast', str(i)],
+                             consumer.recv_multipart())
+
+        self._wait_for_stats('topic.host', 'forwarded', 10)
+
+    def test_forward_ipv6(self):
+        self.proxy.close()
+        self.config(rpc_zmq_bind_address='::1')
+        self.proxy = zmq_proxy.ZmqProxyDevice(self.conf)
+        self.proxy.consume_in_thread()
+        self.addCleanup(self.proxy.close)
+
+        consumer = self._socket(zmq_proxy.zmq.PULL,
+                                'ipc://%s/zmq_topic_topic.host' % self.ipc_dir)
+        sender = self.ctxt.socket(zmq_proxy.zmq.PUSH)
+        sender.setsockopt(zmq_proxy.zmq.IPV6, 1)
+        sender.connect('tcp://[::1]:%d' % self.conf.rpc_zmq_port)
+        self.addCleanup(sender.close, 0)
+
+        sender.send_multipart(['0', 'topic.host', 'cast', 'data'])
+        self.assertEqual(['0', 'topic.host', 'cast', 'data'],
+                         consumer.recv_multipart())
+
+    def test_expired_message_dropped(self):
+        self.config(rpc_cast_timeout=0)
+
+        self.sender.send_multipart(['0', 'orphan.host', 'cast', 'data'])
+
+        self._wait_for_stats('orphan.host', 'dropped', 1)
+        self.assertEqual(0, self.proxy.stats()['orphan.host']['forwarded'])
+
+    def test_backed_up_shard_parked(self):
+        # The backlog is applied when the receiver starts.
+        self.proxy.close()
+        self.config(rpc_zmq_topic_backlog=1)
+        self.proxy = zmq_proxy.ZmqProxyDevice(self.conf)
+        self.proxy.consume_in_thread()
+        self.addCleanup(self.proxy.close)
+
+        topics = ['topic%d.host' % i for i in range(10)]
+        shards = dict((t, (zlib.crc32(t) & 0xffffffff) % 2) for t in topics)
+        stuck = [t for t in topics if shards[t] == 0][0]
+        other = [t for t in topics if shards[t] == 1][0]
+        consumer = self._socket(zmq_proxy.zmq.PULL,
+                                'ipc://%s/zmq_topic_%s' % (self.ipc_dir,
+                                                           other))
+
+        # Nothing consumes the first topic, so its worker backs up.
+        for i in range(50):
+            self.sender.send_multipart(['0', stuck, 'cast', str(i)])
+        self.sender.send_multipart(['0', other, 'cast', 'data'])
+
+        self.assertEqual(['0', other, 'cast', 'data'],
+                         consumer.recv_multipart())
+        # Drops are counted against the topic, not the shard.
+        self.assertEqual([stuck], list(self.proxy.dropped))
+        self._wait_for_stats(stuck, 'dropped', self.proxy.dropped[stuck])
+
+    def test_worker_process_stats(self):
+        self.proxy.close()
+        self.config(rpc_zmq_proxy_use_processes=True)
+        self.proxy = zmq_proxy.ZmqProxyDevice(self.conf)
+        self.proxy.consume_in_thread()
+        self.addCleanup(self.proxy.close)
+
+        consumer = self._socket(zmq_proxy.zmq.PULL,
+                                'ipc://%s/zmq_topic_topic.host' % self.ipc_dir)
+        for i in range(3):
+            self.sender.send_multipart(['0', 'topic.host', 'cast', str(i)])
+            consumer.recv_multipart()
+
+        self._wait_for_stats('topic.host', 'forwarded', 3)
+
+
+class TestZmqDirect(ZmqBaseTestCase):
+
+    def setUp(self):
+        super(TestZmqDirect, self).setUp()
+        self.config(rpc_zmq_direct=True, rpc_zmq_host='myhost')
+        self.matchmaker = mock.Mock()
+        self.useFixture(fixtures.MonkeyPatch(
+            'oslo.messaging._drivers.impl_zmq._get_matchmaker',
+            lambda: self.matchmaker))
+
+    def test_socket_bind_to_random_port(self):
+        self.addCleanup(impl_zmq.cleanup)
+        sock = impl_zmq.ZmqSocket('tcp://127.0.0.1', impl_zmq.zmq.PULL,
+                                  port_range=(50000, 50100))
+        self.addCleanup(sock.close)
+
+        self.assertTrue(50000 <= sock.port < 50100)
+        self.assertEqual('tcp://127.0.0.1:%d' % sock.port, sock.addr)
+
+    @mock.patch.object(impl_zmq.ZmqReactor, 'register')
+    def test_create_direct_consumer(self, register):
+        register.return_value.port = 12345
+        conn = impl_zmq.Connection(self.conf)
+        proxy = mock.Mock()
+
+        conn.create_consumer('topic', proxy)
+        conn.create_consumer('topic', proxy, fanout=True)
+        conn.create_consumer('topic.myhost', proxy)
+
+        register.assert_any_call(proxy, 'tcp://*', impl_zmq.zmq.PULL,
+                                 port_range=(49152, 65536))
+        self.assertEqual(2, register.call_count)
+        self.assertEqual([mock.call('topic', 'myhost:12345'),
+                          mock.call('topic.myhost', 'myhost')],
+                         self.matchmaker.register.call_args_list)
+
+        conn.close()
+        self.matchmaker.unregister.assert_any_call('topic', 'myhost:12345')
+
+    def test_multi_send_direct(self):
+        self.matchmaker.queues.return_value = [
+            ('topic.myhost:12345', 'myhost:12345'),
+            ('topic.other', 'other'),
+        ]
+        method = mock.Mock(__name__='_call')
+
+        impl_zmq._multi_send(method, mock.Mock(), 'topic', {})
+
+        addrs = [c[0][0] for c in method.call_args_list]
+        self.assertEqual(['tcp://myhost:12345', 'tcp://other:9501'], addrs)
+
+    def test_split_host_port(self):
+        self.assertEqual(('myhost', 12345),
+                         impl_zmq._split_host_port('myhost:12345'))
+        self.assertEqual(('myhost', None), impl_zmq._split_host_port('myhost'))
+        self.assertEqual(('::1', 12345),
+                         impl_zmq._split_host_port('[::1]:12345'))
+        self.assertEqual(('::1', None), impl_zmq._split_host_port('[::1]'))
+        self.assertEqual(('fe80::1', None),
+                         impl_zmq._split_host_port('fe80::1'))
+
+    @mock.patch.object(impl_zmq.ZmqReactor, 'register')
+    def test_create_direct_consumer_ipv6(self, register):
+        self.config(rpc_zmq_host='fe80::1', rpc_zmq_bind_address='::')
+        register.return_value.port = 12345
+        conn = impl_zmq.Connection(self.conf)
+
+        conn.create_consumer('topic', mock.Mock())
+
+        self.assertEqual('tcp://[::]', register.call_args[0][1])
+        self.matchmaker.register.assert_called_once_with(
+            'topic', '[fe80::1]:12345')
+
+    def test_multi_send_direct_ipv6(self):
+        self.matchmaker.queues.return_value = [
+            ('topic.[fe80::1]:12345', '[fe80::1]:12345'),
+            ('topic.fe80::2', 'fe80::2'),
+        ]
+        method = mock.Mock(__name__='_call')
+
+        impl_zmq._multi_send(method, mock.Mock(), 'topic', {})
+
+        addrs = [c[0][0] for c in method.call_args_list]
+        self.assertEqual(['tcp://[fe80::1]:12345', 'tcp://[fe80::2]:9501'],
+                         addrs)
+
+    def test_socket_bind_ipv6(self):
+        self.addCleanup(impl_zmq.cleanup)
+        try:
+            sock = impl_zmq.ZmqSocket('tcp://[::1]', impl_zmq.zmq.PULL,
+                                      port_range=(50000, 50100))
+        except impl_zmq.RPCException:
+            self.skipTest("IPv6 not available")
+        self.addCleanup(sock.close)
+
+        self.assertEqual(1, sock.sock.getsockopt(impl_zmq.zmq.IPV6))
+        self.assertEqual('tcp://[::1]:%d' % sock.port, sock.addr)
+
+
+@testtools.skipIf(zmq_proxy.zmq is None, "zmq not available")
+class TestZmqNative(ZmqBaseTestCase):
+
+    def setUp(self):
+        super(TestZmqNative, self).setUp()
+        self.config(rpc_zmq_concurrency='native',
+                    rpc_zmq_host='localhost',
+                    rpc_zmq_ipc_dir=self.useFixture(fixtures.TempDir()).path,
+                    rpc_zmq_bind_address='127.0.0.1',
+                    rpc_zmq_port=_get_unused_port(),
+                    rpc_zmq_proxy_stats_interval=0)
+        self.messaging_conf.transport_driver = 'zmq'
+        self.messaging_conf.response_timeout = 10
+
+        # The server's consumer threads outlive the test, so don't let the
+        # context they use leak into other tests.
+        self.useFixture(fixtures.MonkeyPatch(
+            'oslo.messaging._drivers.impl_zmq.ZMQ_CTX', None))
+        self.useFixture(fixtures.MonkeyPatch(
+            'oslo.messaging._drivers.impl_zmq.matchmaker', None))
+
+        proxy = zmq_proxy.ZmqProxyDevice(self.conf)
+        proxy.consume_in_thread()
+        self.addCleanup(proxy.close)
+
+    def test_call_and_cast(self):
+        transport = messaging.get_transport(self.conf)
+        casted = threading.Event()
+
+        class TestEndpoint(object):
+            def echo(self, ctxt, arg):
+                return arg
+
+            def ping(self, ctxt):
+                casted.set()
+
+        target = messaging.Target(topic='testtopic', server='localhost')
+        server = messaging.get_rpc_server(transport, target, [TestEndpoint()],
+                                          executor='blocking')
+        thread = threading.Thread(target=server.start)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(server.stop)
+
+        client = messaging.RPCClient(transport,
+                                     messaging.Target(topic='testtopic'))
+        self.assertEqual('foo', client.call({}, 'echo', arg='foo'))
+
+        client.cast({}, 'ping')
+        self.assertTrue(casted.wait(10))
+
+
+class TestZmqMultiSend(ZmqBaseTestCase):
+
+    scenarios = [
+        ('eventlet', dict(concurrency='eventlet')),
+        ('native', dict(concurrency='native')),
+    ]
+
+    def setUp(self):
+        super(TestZmqMultiSend, self).setUp()
+        self.config(rpc_zmq_concurrency=self.concurrency)
+        self.matchmaker = mock.Mock()
+        self.matchmaker.queues.return_value = [
+            ('topic.a', 'a'), ('topic.b', 'b'), ('topic.c', 'c'),
+        ]
+        self.useFixture(fixtures.MonkeyPatch(
+            'oslo.messaging._drivers.impl_zmq._get_matchmaker',
+            lambda: self.matchmaker))
+
+    def test_call_gathers_replies(self):
+        def call(addr, context, topic, msg, timeout, envelope):
+            if topic == 'topic.b':
+                raise ValueError(addr)
+            return [addr]
+
+        method = mock.Mock(__name__='_call', side_effect=call)
+
+        replies = impl_zmq._multi_send(method, mock.Mock(), 'topic', {})
+
+        self.assertEqual(['a', 'b', 'c'], [r.host for r in replies])
+        self.assertEqual(['tcp://a:9501'], replies[0].reply)
+        self.assertIsNone(replies[1].reply)
+        self.assertEqual(ValueError, replies[1].failure[0])
+        self.assertEqual(['tcp://c:9501'], replies[2].reply)
+        self.assertRaises(ValueError, impl_zmq._collect_reply, replies)
+
+    def test_call_records_host_load(self):
+        # Mocks aren't thread safe, the hosts are called from threads.
+        started = []
+        finished = []
+        lock = threading.Lock()
+
+        class HostLoad(object):
+            def started(self, host):
+                with lock:
+                    started.append(host)
+
+            def finished(self, host, elapsed):
+                with lock:
+                    finished.append(host)
+
+        self.matchmaker.host_load = HostLoad()
+        method = mock.Mock(__name__='_call')
+
+        impl_zmq._multi_send(method, mock.Mock(), 'topic', {})
+
+        self.assertEqual(['a', 'b', 'c'], sorted(started))
+        self.assertEqual(['a', 'b', 'c'], sorted(finished))
+
+    def test_cast_avoids_loaded_host(self):
+        self.config(matchmaker_load_aware=True)
+        self.matchmaker = matchmaker_ring.MatchMakerRing(
+            {'topic': ['a', 'b', 'c', 'd']})
+        topics = []
+
+        def cast(addr, context, topic, msg, timeout, envelope, _msg_id):
+            topics.append(topic)
+            if topic == 'topic.a':
+                # Host a pushes back, casts to it take a while to be sent.
+                time.sleep(0.1)
+
+        method = mock.Mock(__name__='_cast', side_effect=cast)
+        for i in range(50):
+            impl_zmq._multi_send(method, mock.Mock(), 'topic', {})
+
+        self.assertEqual(50, len(topics))
+        self.assertTrue(topics.count('topic.a') <= 1, topics)
+
+    def test_routing_key(self):
+        method = mock.Mock(__name__='_call')
+
+        impl_zmq._multi_send(method, mock.Mock(), 'topic', {},
+                             routing_key='key')
+
+        self.matchmaker.queues.assert_called_once_with('topic', 'key')
+
+    def test_call_is_parallel(self):
+        if self.concurrency == 'eventlet':
+            sleep = eventlet.sleep
+        else:
+            sleep = time.sleep
+        calls = []
+
+        def call(addr, context, topic, msg, timeout, envelope):
+            # Only returns early if all hosts are called at once.
+            calls.append(addr)
+            for i in range(500):
+                if len(calls) == 3:
+                    break
+                sleep(0.01)
+            return len(calls)
+
+        method = mock.Mock(__name__='_call', side_effect=call)
+        replies = impl_zmq._multi_send(method, mock.Mock(), 'topic', {})
+
+        self.assertEqual([3, 3, 3], [r.reply for r in replies])
+
+
+class TestZmqBackpressure(ZmqBaseTestCase):
+
+    def setUp(self):
+        super(TestZmqBackpressure, self).setUp()
+        # Don't let unsent messages block terminating the context.
+        self.config(rpc_zmq_linger=0,
+                    rpc_zmq_send_retries=2,
+                    rpc_zmq_send_retry_interval=0)
+        self.addCleanup(impl_zmq.cleanup)
+
+    def _socket(self):
+        sock = impl_zmq.ZmqSocket('tcp://127.0.0.1:%d' % _get_unused_port(),
+                                  impl_zmq.zmq.PUSH, bind=False)
+        self.addCleanup(sock.close)
+        return sock
+
+    def test_socket_options(self):
+        self.config(rpc_zmq_sndhwm=5, rpc_zmq_rcvhwm=7, rpc_zmq_linger=2)
+        sock = self._socket()
+
+        self.assertEqual(5, sock.sock.getsockopt(impl_zmq.zmq.SNDHWM))
+        self.assertEqual(7, sock.sock.getsockopt(impl_zmq.zmq.RCVHWM))
+        self.assertEqual(2000, sock.sock.getsockopt(impl_zmq.zmq.LINGER))
+
+    def test_send_retries(self):
+        sock = self._socket()
+        sock.sock.close()
+        sock.sock = mock.Mock()
+        sock.sock.send_multipart.side_effect = [impl_zmq.zmq.Again(), None]
+
+        sock.send(['foo'])
+
+        self.assertEqual(2, sock.sock.send_multipart.call_count)
+        sock.sock.send_multipart.assert_called_with(
+            ['foo'], flags=impl_zmq.zmq.NOBLOCK)
+
+    def test_send_backpressure(self):
+        self.config(rpc_zmq_sndhwm=1)
+        sock = self._socket()
+
+        # Nothing is listening, so the socket fills up after one message.
+        self.assertRaises(impl_zmq.ZmqBackpressureError,
+                          lambda: [sock.send(['foo']) for i in range(5)])
+
+    def test_cast_backpressure(self):
+        self.config(rpc_zmq_sndhwm=1, rpc_zmq_rcvhwm=1)
+        addr = 'tcp://127.0.0.1:%d' % _get_unused_port()
+        # Accepts the connection, but never reads.
+        receiver = impl_zmq.ZmqSocket(addr, impl_zmq.zmq.PULL, bind=True)
+        self.addCleanup(receiver.close)
+
+        # Large enough to fill the kernel's socket buffers quickly too.
+        msg = {'method': 'foo', 'args': {'data': 'x' * 2 ** 20}}
+
+        def cast():
+            for i in range(300):
+                impl_zmq._cast(addr, impl_zmq.RpcContext(), 'topic', msg)
+
+        self.assertRaises(impl_zmq.ZmqBackpressureError, cast)
+        self.assertEqual([addr], list(impl_zmq.cast_clients))
+
+    def test_cast_reuses_socket(self):
+        addr = 'tcp://127.0.0.1:%d' % _get_unused_port()
+        receiver = impl_zmq.ZmqSocket(addr, impl_zmq.zmq.PULL, bind=True)
+        self.addCleanup(receiver.close)
+
+        ctxt = impl_zmq.RpcContext()
+
+        impl_zmq._cast(addr, ctxt, 'topic', {'method': 'foo'})
+        conn, lock = impl_zmq.cast_clients[addr]
+        impl_zmq._cast(addr, ctxt, 'topic', {'method': 'bar'})
+
+        self.assertIs(conn, impl_zmq.cast_clients[addr][0])
+        self.assertEqual('foo', impl_zmq._deserialize(
+            receiver.recv()[-1])[1]['method'])
+
+    def test_cast_backpressure_reaches_caller(self):
+        matchmaker = mock.Mock()
+        matchmaker.queues.return_value = [('topic.a', 'a')]
+        self.useFixture(fixtures.MonkeyPatch(
+            'oslo.messaging._drivers.impl_zmq._get_matchmaker',
+            lambda: matchmaker))
+        method = mock.Mock(__name__='_cast',
+                           side_effect=impl_zmq.ZmqBackpressureError('full'))
+
+        self.assertRaises(impl_zmq.ZmqBackpressureError, impl_zmq._multi_send,
+                          method, mock.Mock(), 'topic', {})
+
+
+class TestZmqFork(ZmqBaseTestCase):
+
+    def setUp(self):
+        super(TestZmqFork, self).setUp()
+        self.useFixture(fixtures.MonkeyPatch(
+            'oslo.messaging._drivers.impl_zmq.ZMQ_CTX', None))
+        self.useFixture(fixtures.MonkeyPatch(
+            'oslo.messaging._drivers.impl_zmq.fanout_pool', None))
+        self.useFixture(fixtures.MonkeyPatch(
+            'oslo.messaging._drivers.impl_zmq.cast_clients',
+            {'tcp://127.0.0.1:9501': (mock.Mock(), mock.Mock())}))
+        self.useFixture(fixtures.MonkeyPatch(
+            'oslo.messaging._drivers.impl_zmq._pid', impl_zmq._pid))
+        self.addCleanup(impl_zmq.cleanup)
+
+    def test_globals_reset_after_fork(self):
+        ctxt = impl_zmq._get_ctxt()
+        fanout_pool = impl_zmq._get_fanout_pool()
+        self.addCleanup(ctxt.term)
+
+        with mock.patch('os.getpid', return_value=-1):
+            self.assertIsNot(ctxt, impl_zmq._get_ctxt())
+            self.assertIsNot(fanout_pool, impl_zmq._get_fanout_pool())
+            self.assertIs(impl_zmq.ZMQ_CTX, impl_zmq._get_ctxt())
+            self.assertEqual({}, impl_zmq.cast_clients)
+
+
+class TestZmqProxy(ZmqBaseTestCase):
+
+    def setUp(self):
+        super(TestZmqProxy, self).setUp()
+        self.config(rpc_zmq_ipc_dir=self.useFixture(fixtures.TempDir()).path)
+        self.proxy = impl_zmq.ZmqProxy(self.conf)
+        self.sock = mock.Mock()
+        self.sock.recv.return_value = [FakeFrame('0'), FakeFrame('topic')]
+
+    def test_full_topic_dropped(self):
+        self.proxy.topic_proxy['topic'] = eventlet.queue.LightQueue(1)
+        self.proxy.topic_proxy['topic'].put('queued')
+
+        # The message is dropped rather than blocking the other topics.
+        self.proxy.consume(self.sock)
+
+        self.assertEqual({'topic': 1}, self.proxy.dropped)
+        self.assertEqual(1, self.proxy.topic_proxy['topic'].qsize())
+
+    @mock.patch.object(impl_zmq, 'ZmqSocket')
+    def test_expired_message_dropped(self, sock_cls):
+        self.config(rpc_cast_timeout=0)
+        sock_cls.return_value.send.side_effect = (
+            impl_zmq.ZmqBackpressureError('full'))
+
+        self.proxy.consume(self.sock)
+        for i in range(10):
+            if self.proxy.dropped:
+                break
+            eventlet.sleep(0.01)
+
+        self.assertEqual({'topic': 1}, self.proxy.dropped)
+        self.assertEqual(1, sock_cls.return_value.send.call_count)
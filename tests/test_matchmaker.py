@@ -0,0 +1,101 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from oslo.messaging._drivers import matchmaker
+from oslo.messaging._drivers import matchmaker_ring
+from tests import utils as test_utils
+
+
+class TestHostLoad(test_utils.BaseTestCase):
+
+    def setUp(self):
+        super(TestHostLoad, self).setUp()
+        self.now = 100
+        patcher = mock.patch.object(matchmaker.time, 'time',
+                                    lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.host_load = matchmaker.HostLoad()
+
+    def test_unknown_host(self):
+        self.assertEqual(0, self.host_load.load('a'))
+
+    def test_moving_average(self):
+        self.host_load.started('a')
+        self.host_load.finished('a', 1.0)
+        self.assertEqual(1.0, self.host_load.load('a'))
+
+        self.host_load.started('a')
+        self.host_load.finished('a', 2.0)
+        self.assertAlmostEqual(1.3, self.host_load.load('a'))
+
+    def test_outstanding_calls(self):
+        self.host_load.started('a')
+        self.host_load.finished('a', 1.0)
+        self.host_load.started('a')
+        self.host_load.started('a')
+
+        self.assertEqual(3.0, self.host_load.load('a'))
+
+    def test_load_expires(self):
+        self.host_load.started('a')
+        self.host_load.finished('a', 1.0)
+
+        self.now += 31
+        self.assertEqual(0, self.host_load.load('a'))
+
+
+class TestLoadAwareQueues(test_utils.BaseTestCase):
+
+    def setUp(self):
+        super(TestLoadAwareQueues, self).setUp()
+        self.config(matchmaker_load_aware=True)
+        self.hosts = ['host%d' % i for i in range(4)]
+        self.matchmaker = matchmaker_ring.MatchMakerRing(
+            {'topic': self.hosts})
+
+    def _count(self, n=1000):
+        counts = dict((host, 0) for host in self.hosts)
+        for i in range(n):
+            [(topic, host)] = self.matchmaker.queues('topic')
+            counts[host] += 1
+        return counts
+
+    def test_slow_host_avoided(self):
+        self.matchmaker.host_load.started('host0')
+        self.matchmaker.host_load.finished('host0', 10.0)
+
+        counts = self._count()
+
+        # host0 is only picked when paired with itself, which never happens.
+        self.assertEqual(0, counts['host0'])
+        self.assertTrue(min(counts[h] for h in self.hosts[1:]) > 200, counts)
+
+    def test_routing_key_is_not_load_aware(self):
+        self.matchmaker.host_load.finished('host0', 10.0)
+        self.matchmaker.host_load.finished('host1', 10.0)
+        self.matchmaker.host_load.finished('host2', 10.0)
+        self.matchmaker.host_load.finished('host3', 10.0)
+
+        queues = self.matchmaker.queues('topic', 'key')
+        self.assertEqual(queues, self.matchmaker.queues('topic', 'key'))
+
+    def test_fanout_unaffected(self):
+        self.assertEqual(4, len(self.matchmaker.queues('fanout~topic')))
+
+    def test_single_candidate(self):
+        mm = matchmaker_ring.MatchMakerRing({'topic': ['a']})
+
+        self.assertEqual([('topic.a', 'a')], mm.queues('topic'))
@@ -0,0 +1,155 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+import testtools
+
+from oslo.messaging._drivers import matchmaker_redis
+from tests import utils as test_utils
+
+
+class FakePipeline(object):
+    """Queues commands and runs them against the (mock) client on execute."""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def multi(self):
+        pass
+
+    def __getattr__(self, name):
+        return lambda *args: self.commands.append((name, args))
+
+    def execute(self):
+        self.redis.executed += 1
+        return [getattr(self.redis, name)(*args)
+                for name, args in self.commands]
+
+
+@testtools.skipIf(matchmaker_redis.redis is None, "redis not available")
+class TestMatchMakerRedis(test_utils.BaseTestCase):
+
+    def setUp(self):
+        super(TestMatchMakerRedis, self).setUp()
+        self.config(cache_ttl=60, group='matchmaker_redis')
+
+        patcher = mock.patch.object(matchmaker_redis.redis, 'StrictRedis')
+        self.redis = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        self.redis.smembers.return_value = set(['topic.a'])
+        self.redis.ttl.return_value = 600
+        self.redis.executed = 0
+        self.redis.pipeline.side_effect = lambda **kw: FakePipeline(self.redis)
+
+        patcher = mock.patch.object(matchmaker_redis.MatchMakerRedis,
+                                    'start_cache')
+        self.start_cache = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.matchmaker = matchmaker_redis.MatchMakerRedis()
+        self.matchmaker._set_subscribed(True)
+
+    def test_cache_started_on_first_lookup(self):
+        self.assertFalse(self.start_cache.called)
+        self.matchmaker.queues('topic')
+        self.start_cache.assert_called_once_with()
+
+    def test_not_cached_without_ttl(self):
+        self.config(cache_ttl=0, group='matchmaker_redis')
+
+        self.matchmaker.queues('topic')
+        self.matchmaker.queues('topic')
+
+        self.assertFalse(self.start_cache.called)
+        self.assertEqual(2, self.redis.smembers.call_count)
+
+    def test_cleanup_stops_cache(self):
+        self.matchmaker._listener = mock.Mock()
+        stopped = self.matchmaker._listener_stopped = mock.Mock()
+
+        self.matchmaker.cleanup()
+
+        stopped.set.assert_called_once_with()
+        self.assertIsNone(self.matchmaker._listener)
+        self.matchmaker.queues('topic')
+        self.matchmaker.queues('topic')
+        self.assertEqual(2, self.redis.smembers.call_count)
+
+    def test_lookups_are_cached(self):
+        for i in range(3):
+            self.assertEqual([('topic.a', 'a')],
+                             self.matchmaker.queues('topic'))
+            self.assertEqual([('topic.a', 'a')],
+                             self.matchmaker.queues('fanout~topic'))
+
+        self.redis.smembers.assert_called_once_with('topic')
+
+    def test_invalidate(self):
+        self.matchmaker.queues('topic')
+        self.matchmaker.queues('other')
+        self.redis.smembers.return_value = set(['topic.b'])
+
+        self.matchmaker._invalidate({'type': 'message', 'data': 'topic'})
+        self.assertEqual([('topic.b', 'b')], self.matchmaker.queues('topic'))
+
+        self.matchmaker._invalidate({'type': 'pmessage', 'data': 'other.a'})
+        self.assertEqual([('topic.b', 'b')], self.matchmaker.queues('other'))
+        self.assertEqual(4, self.redis.smembers.call_count)
+
+    def test_not_cached_while_unsubscribed(self):
+        self.matchmaker._set_subscribed(False)
+
+        self.matchmaker.queues('topic')
+        self.matchmaker.queues('topic')
+
+        self.assertEqual(2, self.redis.smembers.call_count)
+
+    def test_expired_members_are_removed(self):
+        self.redis.smembers.return_value = set(['topic.%d' % i
+                                                for i in range(100)])
+        dead = set(['topic.1', 'topic.2'])
+        self.redis.ttl.side_effect = lambda key: -2 if key in dead else 1
+
+        hosts = self.matchmaker.queues('fanout~topic')
+
+        self.assertEqual(98, len(hosts))
+        self.assertFalse(dead & set(key for key, host in hosts))
+        self.assertEqual(set(dead), set(self.redis.delete.call_args[0]))
+        self.assertEqual(set(dead), set(self.redis.srem.call_args[0][1:]))
+        # One pipeline for the TTLs, one for expiring the dead members.
+        self.assertEqual(2, self.redis.executed)
+
+    def test_register_publishes_invalidation(self):
+        self.matchmaker.register('topic', 'c')
+
+        self.redis.publish.assert_called_once_with(
+            matchmaker_redis._INVALIDATE_CHANNEL, 'topic')
+
+    def test_send_heartbeats(self):
+        for i in range(50):
+            self.matchmaker.register('topic%d' % i, 'host')
+        self.redis.executed = 0
+        self.redis.expire.reset_mock()
+        self.redis.expire.side_effect = lambda key, ttl: key != 'topic7.host'
+
+        with mock.patch.object(self.matchmaker, 'register') as register:
+            self.matchmaker.send_heartbeats()
+
+        self.assertEqual(50, self.redis.expire.call_count)
+        self.assertEqual(1, self.redis.executed)
+        register.assert_called_once_with('topic7', 'host')
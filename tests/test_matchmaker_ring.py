@@ -0,0 +1,142 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+import os
+import uuid
+
+import fixtures
+import mock
+
+from oslo.messaging._drivers import matchmaker_ring
+from tests import utils as test_utils
+
+
+class TestConsistentHashRing(test_utils.BaseTestCase):
+
+    hosts = ['host%d' % i for i in range(10)]
+
+    def setUp(self):
+        super(TestConsistentHashRing, self).setUp()
+        self.keys = [str(uuid.uuid4()) for i in range(1000)]
+
+    def _route(self, hosts):
+        matchmaker = matchmaker_ring.MatchMakerRing({'topic': hosts})
+        return dict((key, matchmaker.queues('topic', key)[0][1])
+                    for key in self.keys)
+
+    def test_routing_key_is_sticky(self):
+        matchmaker = matchmaker_ring.MatchMakerRing({'topic': self.hosts})
+
+        for key in self.keys[:10]:
+            queues = matchmaker.queues('topic', key)
+            for i in range(5):
+                self.assertEqual(queues, matchmaker.queues('topic', key))
+
+    def test_keys_are_spread(self):
+        routes = self._route(self.hosts)
+
+        counts = dict((host, 0) for host in self.hosts)
+        for host in routes.values():
+            counts[host] += 1
+        # 100 keys per host on average.
+        self.assertTrue(min(counts.values()) > 50, counts)
+        self.assertTrue(max(counts.values()) < 150, counts)
+
+    def test_removing_host_moves_its_keys_only(self):
+        before = self._route(self.hosts)
+        after = self._route(self.hosts[1:])
+
+        for key in self.keys:
+            if before[key] != 'host0':
+                self.assertEqual(before[key], after[key])
+
+    def test_adding_host_moves_few_keys(self):
+        before = self._route(self.hosts)
+        after = self._route(self.hosts + ['host10'])
+
+        moved = [key for key in self.keys if before[key] != after[key]]
+        self.assertTrue(all(after[key] == 'host10' for key in moved))
+        self.assertTrue(len(moved) < 200, len(moved))
+
+    def test_no_routing_key_round_robin(self):
+        matchmaker = matchmaker_ring.MatchMakerRing({'topic': ['a', 'b']})
+
+        self.assertEqual([[('topic.a', 'a')], [('topic.b', 'b')]],
+                         [matchmaker.queues('topic') for i in range(2)])
+
+    def test_unknown_topic(self):
+        matchmaker = matchmaker_ring.MatchMakerRing({'topic': ['a']})
+
+        self.assertEqual([], matchmaker.queues('other', 'key'))
+        self.assertEqual([], matchmaker.queues('other'))
+
+
+class TestRingfileReload(test_utils.BaseTestCase):
+
+    def setUp(self):
+        super(TestRingfileReload, self).setUp()
+        self.ringfile = os.path.join(
+            self.useFixture(fixtures.TempDir()).path, 'ring.json')
+        self.config(ringfile=self.ringfile, ringfile_poll_interval=10,
+                    group='matchmaker_ring')
+        self.mtime = 1000
+        self._write({'topic': ['a']})
+
+        self.now = 0
+        patcher = mock.patch.object(matchmaker_ring.time, 'time',
+                                    lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.matchmaker = matchmaker_ring.MatchMakerRing()
+
+    def _write(self, ring, data=None):
+        with open(self.ringfile, 'w') as fh:
+            fh.write(data or json.dumps(ring))
+        self.mtime += 1
+        os.utime(self.ringfile, (self.mtime, self.mtime))
+
+    def _lookup(self):
+        return (self.matchmaker.queues('topic'),
+                self.matchmaker.queues('topic', 'key'),
+                self.matchmaker.queues('fanout~topic'))
+
+    def test_reload(self):
+        self.assertEqual(([('topic.a', 'a')], [('topic.a', 'a')],
+                          [('fanout~topic.a', 'a')]), self._lookup())
+
+        self._write({'topic': ['b']})
+        # Not checked again until the poll interval has passed.
+        self.now = 5
+        self.assertEqual([('topic.a', 'a')], self.matchmaker.queues('topic'))
+
+        self.now = 10
+        self.assertEqual(([('topic.b', 'b')], [('topic.b', 'b')],
+                          [('fanout~topic.b', 'b')]), self._lookup())
+
+    def test_invalid_ringfile_keeps_ring(self):
+        self._write(None, data='{"topic": [')
+        self.now = 10
+        self.assertEqual([('topic.a', 'a')], self.matchmaker.queues('topic'))
+
+        # Retried once the file is complete.
+        self._write({'topic': ['b']})
+        self.now = 20
+        self.assertEqual([('topic.b', 'b')], self.matchmaker.queues('topic'))
+
+    def test_reload_disabled(self):
+        self.config(ringfile_poll_interval=0, group='matchmaker_ring')
+        self._write({'topic': ['b']})
+        self.now = 10
+
+        self.assertEqual([('topic.a', 'a')], self.matchmaker.queues('topic'))
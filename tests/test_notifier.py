@@ -22,9 +22,11 @@ import fixtures
 import mock
 from stevedore import extension
 import testscenarios
+import testtools
 import yaml
 
 from oslo import messaging
+from oslo.messaging import _utils as utils
 from oslo.messaging.notify import _impl_log
 from oslo.messaging.notify import _impl_messaging
 from oslo.messaging.notify import _impl_routing as routing
@@ -247,6 +249,31 @@ class TestSerializer(test_utils.BaseTestCase):
                          _impl_test.NOTIFICATIONS)
 
 
+@testtools.skipIf(utils.asyncio is None, "asyncio not available")
+class TestAsyncNotifier(test_utils.BaseTestCase):
+
+    def setUp(self):
+        super(TestAsyncNotifier, self).setUp()
+        self.loop = utils.asyncio.new_event_loop()
+        utils.asyncio.set_event_loop(self.loop)
+        self.addCleanup(self.loop.close)
+        self.addCleanup(utils.asyncio.set_event_loop, None)
+        self.addCleanup(_impl_test.reset)
+
+    def test_ainfo(self):
+        self.config(notification_driver=['test'])
+        transport = _FakeTransport(self.conf)
+        notifier = messaging.Notifier(transport, 'test.localhost')
+
+        future = notifier.ainfo({}, 'test.notify', 'bar')
+
+        self.assertIsNone(self.loop.run_until_complete(future))
+        self.assertEqual(1, len(_impl_test.NOTIFICATIONS))
+        ctxt, message, priority = _impl_test.NOTIFICATIONS[0]
+        self.assertEqual('INFO', priority)
+        self.assertEqual('bar', message['payload'])
+
+
 class TestLogNotifier(test_utils.BaseTestCase):
 
     @mock.patch('oslo.messaging.openstack.common.timeutils.utcnow')
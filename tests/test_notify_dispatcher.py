@@ -14,11 +14,13 @@
 #    under the License.
 
 import itertools
+import threading
 
 import mock
 import testscenarios
 
 from oslo import messaging
+from oslo.messaging._drivers import batch
 from oslo.messaging.notify import dispatcher as notify_dispatcher
 from oslo.messaging.openstack.common import timeutils
 from tests import utils as test_utils
@@ -146,3 +148,84 @@ class TestDispatcher(test_utils.BaseTestCase):
         with dispatcher(mock.Mock(ctxt={}, message=msg)) as callback:
             callback()
         mylog.warning.assert_called_once_with('Unknown priority "what???"')
+
+
+class TestBatchDispatcher(test_utils.BaseTestCase):
+
+    def _incoming(self, priority, payload):
+        msg = notification_msg.copy()
+        msg['priority'] = priority
+        msg['payload'] = payload
+        return mock.Mock(ctxt={}, message=msg)
+
+    def test_dispatch_batch(self):
+        endpoint = mock.Mock(spec=['info', 'warn'])
+        endpoint.info.return_value = None
+        endpoint.warn.return_value = messaging.NotificationResult.REQUEUE
+        dispatcher = notify_dispatcher.BatchNotificationDispatcher(
+            [messaging.Target(topic='notifications')], [endpoint], None,
+            allow_requeue=True, batch_size=10)
+
+        messages = [self._incoming('info', 0),
+                    self._incoming('warn', 1),
+                    self._incoming('info', 2),
+                    self._incoming('what???', 3)]
+        with dispatcher(mock.Mock(messages=messages)) as callback:
+            callback()
+
+        args = [({}, msg['publisher_id'], msg['event_type'], i, mock.ANY)
+                for i, msg in enumerate(m.message for m in messages)]
+        endpoint.info.assert_called_once_with([args[0], args[2]])
+        endpoint.warn.assert_called_once_with([args[1]])
+
+        # Each priority is acknowledged or requeued as a whole, the message
+        # with an unknown priority is dropped.
+        for i, acknowledged in enumerate([True, False, True, True]):
+            self.assertEqual(int(acknowledged),
+                             messages[i].acknowledge.call_count)
+            self.assertEqual(int(not acknowledged),
+                             messages[i].requeue.call_count)
+
+    def test_batch_listener(self):
+        dispatcher = notify_dispatcher.BatchNotificationDispatcher(
+            [], [], None, allow_requeue=False, batch_size=10,
+            batch_timeout=0.1)
+        transport = mock.Mock()
+        incoming = [self._incoming('info', i) for i in range(4)]
+        polls = []
+
+        def poll(timeout=None):
+            # Connections can't be shared with a thread of the listener.
+            self.assertIs(threading.current_thread(), caller)
+            polls.append(timeout)
+            # The last message arrives once the first batch timed out.
+            if not incoming or (len(incoming) == 1 and len(polls) == 4):
+                return None
+            return incoming.pop(0)
+
+        caller = threading.current_thread()
+        listener = mock.Mock()
+        listener.poll.side_effect = poll
+        transport._listen_for_notifications.return_value = listener
+
+        batch_listener = dispatcher._listen(transport)
+        self.addCleanup(batch_listener.cleanup)
+
+        # The batch is returned once batch_timeout is over, the first
+        # message is waited for without a timeout.
+        messages = batch_listener.poll().messages
+        self.assertEqual([0, 1, 2], [m.message['payload'] for m in messages])
+        self.assertIsNone(polls[0])
+        for timeout in polls[1:]:
+            self.assertTrue(0 < timeout <= 0.1)
+
+        messages = batch_listener.poll().messages
+        self.assertEqual([3], [m.message['payload'] for m in messages])
+
+    def test_batch_listener_timeout(self):
+        listener = mock.Mock()
+        listener.poll.return_value = None
+        batch_listener = batch.BatchListener(listener, batch_size=10)
+
+        self.assertIsNone(batch_listener.poll(timeout=0.1))
+        listener.poll.assert_called_once_with(timeout=0.1)
@@ -248,3 +248,43 @@ class TestNotifyListener(test_utils.BaseTestCase, ListenerSetupMixin):
                       {'timestamp': mock.ANY, 'message_id': mock.ANY}),
             mock.call({}, 'testpublisher', 'an_event.start', 'test',
                       {'timestamp': mock.ANY, 'message_id': mock.ANY})])
+
+    def test_batch(self):
+        transport = messaging.get_transport(self.conf, url='fake:')
+        received = []
+
+        class BatchEndpoint(object):
+            def info(self, messages):
+                self._received('info', messages)
+
+            def warn(self, messages):
+                self._received('warn', messages)
+
+            def _received(self, priority, messages):
+                received.append((priority, messages))
+                if sum(len(m) for p, m in received) == 4:
+                    listener.stop()
+                    listener.wait()
+
+        listener = messaging.get_batch_notification_listener(
+            transport, [messaging.Target(topic='testtopic')],
+            [BatchEndpoint()], batch_size=10, batch_timeout=0.5)
+        self.assertIsInstance(listener.dispatcher,
+                              dispatcher.BatchNotificationDispatcher)
+
+        notifier = self._setup_notifier(transport)
+        for i in range(3):
+            notifier.info({}, 'an_event.start', i)
+        notifier.warn({}, 'an_event.start', 3)
+
+        thread = threading.Thread(target=listener.start)
+        thread.daemon = True
+        thread.start()
+        self._stop_listener(thread)
+
+        metadata = {'timestamp': mock.ANY, 'message_id': mock.ANY}
+        self.assertEqual([
+            ('info', [({}, 'testpublisher', 'an_event.start', i, metadata)
+                      for i in range(3)]),
+            ('warn', [({}, 'testpublisher', 'an_event.start', 3, metadata)]),
+        ], received)
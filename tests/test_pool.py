@@ -13,6 +13,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import os
 import threading
 import uuid
 
@@ -122,3 +123,20 @@ class PoolTestCase(test_utils.BaseTestCase):
 
 
 PoolTestCase.generate_scenarios()
+
+
+class PoolForkTestCase(test_utils.BaseTestCase):
+
+    def test_reset_after_fork(self):
+        self.stubs.Set(pool, '_inherited', [])
+        p = PoolTestCase.TestPool(max_size=1)
+        obj = p.get()
+        p.put(obj)
+
+        self.stubs.Set(os, 'getpid', lambda: -1)
+
+        # The item created by the parent is not handed out to the child,
+        # but it is kept referenced so that it isn't collected.
+        self.assertNotEqual(obj, p.get())
+        self.assertEqual([], list(p.iter_free()))
+        self.assertIn(obj, pool._inherited)
@@ -13,18 +13,22 @@
 #    under the License.
 
 import datetime
+import os
 import sys
 import threading
+import time
 import uuid
 
 import fixtures
 import kombu
+import mock
 import testscenarios
 
 from oslo import messaging
 from oslo.messaging._drivers import amqpdriver
 from oslo.messaging._drivers import common as driver_common
 from oslo.messaging._drivers import impl_rabbit as rabbit_driver
+from oslo.messaging._drivers import pool
 from oslo.messaging.openstack.common import jsonutils
 from tests import utils as test_utils
 
@@ -42,6 +46,14 @@ class TestRabbitDriverLoad(test_utils.BaseTestCase):
         transport = messaging.get_transport(self.conf)
         self.assertIsInstance(transport._driver, rabbit_driver.RabbitDriver)
 
+    def test_qos_prefetch_count(self):
+        self.config(rabbit_qos_prefetch_count=10)
+        transport = messaging.get_transport(self.conf)
+        self.addCleanup(transport.cleanup)
+
+        with transport._driver._get_connection() as conn:
+            self.assertEqual(10, conn.connection.channel.qos.prefetch_count)
+
 
 class TestRabbitTransportURL(test_utils.BaseTestCase):
 
@@ -249,6 +261,183 @@ class TestSendReceive(test_utils.BaseTestCase):
 TestSendReceive.generate_scenarios()
 
 
+class TestSendAsync(test_utils.BaseTestCase):
+
+    def setUp(self):
+        super(TestSendAsync, self).setUp()
+        self.messaging_conf.transport_driver = 'rabbit'
+        self.messaging_conf.in_memory = True
+
+        transport = messaging.get_transport(self.conf)
+        self.addCleanup(transport.cleanup)
+        self.driver = transport._driver
+        self.target = messaging.Target(topic='testtopic')
+        self.listener = self.driver.listen(self.target)
+
+    def _send_async(self, i, timeout=None):
+        replied = threading.Event()
+        result = {}
+
+        def callback(**kwargs):
+            result.update(kwargs)
+            replied.set()
+
+        self.driver.send_async(self.target, {}, {'tx_id': i}, callback,
+                               timeout=timeout)
+        return replied, result
+
+    def test_replies(self):
+        calls = [self._send_async(i) for i in range(3)]
+        msgs = [self.listener.poll() for i in range(3)]
+
+        # Reply out of order, and to a synchronous call in the middle.
+        msgs[2].reply({'rx_id': 2})
+        msgs[0].reply({'rx_id': 0})
+
+        sync_replies = []
+        sender = threading.Thread(target=lambda: sync_replies.append(
+            self.driver.send(self.target, {}, {'tx_id': 3},
+                             wait_for_reply=True, timeout=10)))
+        sender.start()
+        self.listener.poll().reply({'rx_id': 3})
+        sender.join()
+
+        try:
+            raise ZeroDivisionError
+        except Exception:
+            msgs[1].reply(failure=sys.exc_info(), log_failure=False)
+
+        for i, (replied, result) in enumerate(calls):
+            self.assertTrue(replied.wait(10))
+            if i == 1:
+                self.assertIsInstance(result['failure'], ZeroDivisionError)
+            else:
+                self.assertEqual({'reply': {'rx_id': i}}, result)
+        self.assertEqual([{'rx_id': 3}], sync_replies)
+        self.assertEqual({}, self.driver._waiter.callbacks)
+
+    def test_timeout(self):
+        replied, result = self._send_async(0, timeout=0.1)
+        msg = self.listener.poll()
+
+        self.assertTrue(replied.wait(10))
+        self.assertIsInstance(result['failure'], messaging.MessagingTimeout)
+
+        # A late reply is dropped.
+        msg.reply({'rx_id': 0})
+        self.assertEqual({}, self.driver._waiter.callbacks)
+
+
+class TestConsumers(test_utils.BaseTestCase):
+
+    def setUp(self):
+        super(TestConsumers, self).setUp()
+        self.messaging_conf.transport_driver = 'rabbit'
+        self.messaging_conf.in_memory = True
+
+        transport = messaging.get_transport(self.conf)
+        self.addCleanup(transport.cleanup)
+        self.driver = transport._driver
+
+    def _poll(self, listener, count):
+        msgs = [listener.poll() for i in range(count)]
+        for msg in msgs:
+            msg.acknowledge()
+        return msgs
+
+    def test_listen(self):
+        target = messaging.Target(topic='testtopic', server='testserver')
+        listener = self.driver.listen(target, consumers=2)
+        self.addCleanup(listener.cleanup)
+        self.assertIsInstance(listener, amqpdriver.AMQPConsumersListener)
+        self.assertEqual(2, len(listener.consumers()))
+
+        for i in range(4):
+            self.driver.send(target, {}, {'tx_id': i})
+        self.driver.send(messaging.Target(topic='testtopic', fanout=True),
+                         {}, {'tx_id': 4})
+        msgs = self._poll(listener, 5)
+
+        self.assertEqual([0, 1, 2, 3, 4],
+                         sorted(m.message['tx_id'] for m in msgs))
+        # Only one of the connections consumes fanout messages.
+        time.sleep(0.5)
+        self.assertTrue(listener.incoming.empty())
+
+        listener.cleanup()
+        for conn, consumer in listener.consumers():
+            self.assertTrue(consumer.deferred.empty())
+
+    def test_listen_for_notifications(self):
+        target = messaging.Target(topic='topic')
+        listener = self.driver.listen_for_notifications([(target, 'info')],
+                                                        consumers=2)
+        self.addCleanup(listener.cleanup)
+
+        for i in range(4):
+            self.driver.send_notification(
+                messaging.Target(topic='topic.info'), {}, {'tx_id': i}, 2.0)
+        msgs = self._poll(listener, 4)
+
+        self.assertEqual([0, 1, 2, 3],
+                         sorted(m.message['tx_id'] for m in msgs))
+
+    def test_poll_timeout(self):
+        target = messaging.Target(topic='testtopic', server='testserver')
+        for consumers in (1, 2):
+            listener = self.driver.listen(target, consumers=consumers)
+            self.addCleanup(listener.cleanup)
+
+            self.assertIsNone(listener.poll(timeout=0.1))
+
+            self.driver.send(target, {}, {'tx_id': consumers})
+            msg = listener.poll(timeout=5)
+            msg.acknowledge()
+            self.assertEqual(consumers, msg.message['tx_id'])
+
+
+class TestFork(test_utils.BaseTestCase):
+
+    def setUp(self):
+        super(TestFork, self).setUp()
+        self.messaging_conf.transport_driver = 'rabbit'
+        self.messaging_conf.in_memory = True
+
+        transport = messaging.get_transport(self.conf)
+        self.addCleanup(transport.cleanup)
+        self.driver = transport._driver
+
+    def test_reply_q(self):
+        reply_q = self.driver._get_reply_q()
+        waiter = self.driver._waiter
+        conn = self.driver._reply_q_conn
+
+        self.stubs.Set(os, 'getpid', lambda: -1)
+
+        self.assertNotEqual(reply_q, self.driver._get_reply_q())
+        self.assertIsNot(waiter, self.driver._waiter)
+        self.assertIsNot(conn, self.driver._reply_q_conn)
+
+    def test_connection_context(self):
+        self.stubs.Set(pool, '_inherited', [])
+        for pooled in (True, False):
+            conn = self.driver._get_connection(pooled=pooled)
+            connection = conn.connection
+            close = mock.Mock()
+            reset = mock.Mock()
+            self.stubs.Set(connection, 'close', close)
+            self.stubs.Set(connection, 'reset', reset)
+
+            with mock.patch.object(os, 'getpid', return_value=-1):
+                conn.close()
+
+            # The connection of the parent is neither reset nor closed.
+            self.assertFalse(close.called)
+            self.assertFalse(reset.called)
+            self.assertIsNone(conn.connection)
+            self.assertIn(connection, pool._inherited)
+
+
 class TestRacyWaitForReply(test_utils.BaseTestCase):
 
     def setUp(self):
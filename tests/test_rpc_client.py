@@ -13,10 +13,16 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import threading
+
+from mox3 import mox
 from oslo.config import cfg
 import testscenarios
+import testtools
 
 from oslo import messaging
+from oslo.messaging._drivers import base as driver_base
+from oslo.messaging import _utils as utils
 from oslo.messaging import serializer as msg_serializer
 from tests import utils as test_utils
 
@@ -31,6 +37,9 @@ class _FakeTransport(object):
     def _send(self, *args, **kwargs):
         pass
 
+    def _send_async(self, *args, **kwargs):
+        pass
+
 
 class TestCastCall(test_utils.BaseTestCase):
 
@@ -68,6 +77,80 @@ class TestCastCall(test_utils.BaseTestCase):
         method(self.ctxt, 'foo', **self.args)
 
 
+@testtools.skipIf(utils.asyncio is None, "asyncio not available")
+class TestAsyncCastCall(test_utils.BaseTestCase):
+
+    def setUp(self):
+        super(TestAsyncCastCall, self).setUp()
+        self.loop = utils.asyncio.new_event_loop()
+        utils.asyncio.set_event_loop(self.loop)
+        self.addCleanup(self.loop.close)
+        self.addCleanup(utils.asyncio.set_event_loop, None)
+
+        self.config(rpc_response_timeout=None)
+        self.transport = _FakeTransport(self.conf)
+        self.client = messaging.RPCClient(self.transport, messaging.Target())
+
+    def _reply_from_thread(self, **kwargs):
+        def send_async(target, ctxt, message, callback, timeout=None):
+            threading.Thread(target=callback, kwargs=kwargs).start()
+        self.transport._send_async = send_async
+
+    def test_acall(self):
+        self._reply_from_thread(reply='bar')
+
+        future = self.client.acall({}, 'foo')
+
+        self.assertEqual('bar', self.loop.run_until_complete(future))
+
+    def test_acall_failure(self):
+        self._reply_from_thread(failure=ValueError('bar'))
+
+        future = self.client.acall({}, 'foo')
+
+        self.assertRaises(ValueError, self.loop.run_until_complete, future)
+
+    def test_acall_message(self):
+        self.config(rpc_response_timeout=30)
+        sent = threading.Event()
+        self.mox.StubOutWithMock(self.transport, '_send_async')
+        msg = dict(method='foo', args=dict(bar='blaa'))
+        self.transport._send_async(
+            messaging.Target(), {'user': 'bob'}, msg, mox.IgnoreArg(),
+            timeout=30).WithSideEffects(lambda *a, **kw: sent.set())
+        self.mox.ReplayAll()
+
+        future = self.client.acall({'user': 'bob'}, 'foo', bar='blaa')
+
+        self.assertTrue(sent.wait(10))
+        self.assertFalse(future.done())
+
+    def test_acall_send_error(self):
+        def send_async(target, ctxt, message, callback, timeout=None):
+            raise driver_base.TransportDriverError('boom')
+        self.transport._send_async = send_async
+
+        future = self.client.acall({}, 'foo')
+
+        self.assertRaises(messaging.ClientSendError,
+                          self.loop.run_until_complete, future)
+
+    def test_acast(self):
+        threads = []
+
+        def send(target, ctxt, message):
+            threads.append(threading.current_thread())
+            self.assertEqual(dict(method='foo', args={}), message)
+        self.transport._send = send
+
+        future = self.client.acast({}, 'foo')
+
+        self.assertIsNone(self.loop.run_until_complete(future))
+        # The message isn't sent on the thread of the event loop.
+        self.assertEqual(1, len(threads))
+        self.assertIsNot(threading.current_thread(), threads[0])
+
+
 class TestCastToTarget(test_utils.BaseTestCase):
 
     _base = [
@@ -168,6 +251,14 @@ class TestCastToTarget(test_utils.BaseTestCase):
          dict(ctor=dict(fanout=True),
               prepare=dict(fanout=False),
               expect=dict(fanout=False))),
+        ('prepare_routing_key',
+         dict(ctor={},
+              prepare=dict(routing_key='testkey'),
+              expect=dict(routing_key='testkey'))),
+        ('prepare_routing_key_none',
+         dict(ctor=dict(routing_key='testkey'),
+              prepare=dict(routing_key=None),
+              expect={})),
     ]
 
     _prepare = [
@@ -13,10 +13,13 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import threading
+
 import mock
 import testscenarios
 
 from oslo import messaging
+from oslo.messaging.rpc import dispatcher as rpc_dispatcher
 from oslo.messaging import serializer as msg_serializer
 from tests import utils as test_utils
 
@@ -134,6 +137,41 @@ class TestDispatcher(test_utils.BaseTestCase):
         self.assertEqual(1, incoming.reply.call_count)
 
 
+class TestLookup(test_utils.BaseTestCase):
+
+    def setUp(self):
+        super(TestLookup, self).setUp()
+        self.endpoints = [_FakeEndpoint(messaging.Target(version='1.5')),
+                          _FakeEndpoint(messaging.Target(namespace='ns'))]
+        self.dispatcher = messaging.RPCDispatcher(messaging.Target(),
+                                                  self.endpoints, None)
+
+    def test_lookup_remembered(self):
+        with mock.patch.object(self.dispatcher, '_find_endpoint',
+                               wraps=self.dispatcher._find_endpoint) as find:
+            for i in range(3):
+                self.assertIs(self.endpoints[0],
+                              self.dispatcher._lookup('foo', None, '1.2'))
+                self.assertIs(self.endpoints[1],
+                              self.dispatcher._lookup('foo', 'ns', '1.0'))
+        self.assertEqual(2, find.call_count)
+
+    def test_failed_lookup_not_remembered(self):
+        for i in range(2):
+            self.assertRaises(messaging.NoSuchMethod,
+                              self.dispatcher._lookup, 'baz', None, '1.0')
+            self.assertRaises(messaging.UnsupportedVersion,
+                              self.dispatcher._lookup, 'foo', None, '1.6')
+        self.assertEqual({}, self.dispatcher._lookups)
+
+    def test_lookups_bounded(self):
+        self.stubs.Set(rpc_dispatcher, '_MAX_LOOKUPS', 2)
+        for version in ('1.0', '1.1', '1.2'):
+            self.dispatcher._lookup('foo', None, version)
+        self.assertEqual([('foo', None, '1.2')],
+                         list(self.dispatcher._lookups))
+
+
 class TestSerializer(test_utils.BaseTestCase):
 
     scenarios = [
@@ -174,3 +212,245 @@ class TestSerializer(test_utils.BaseTestCase):
                                                       args=self.args))
         if self.retval is not None:
             self.assertEqual('s' + self.retval, retval)
+
+
+class TestMaxConcurrency(test_utils.BaseTestCase):
+
+    scenarios = [
+        ('method', dict(endpoint_limit=None, first='foo', second='foo')),
+        ('endpoint', dict(endpoint_limit=1, first='bar', second='foo')),
+    ]
+
+    def setUp(self):
+        super(TestMaxConcurrency, self).setUp()
+
+        class Endpoint(object):
+            max_concurrency = self.endpoint_limit
+
+            @messaging.max_concurrency(1)
+            def foo(self, ctxt):
+                pass
+
+            def bar(self, ctxt):
+                pass
+
+        self.dispatcher = messaging.RPCDispatcher(messaging.Target(),
+                                                  [Endpoint()], None)
+
+    def _enter_in_thread(self, method):
+        incoming = mock.Mock(ctxt={}, message={'method': method})
+        release = threading.Event()
+
+        def run():
+            with self.dispatcher(incoming) as callback:
+                release.wait(10)
+                callback()
+
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+        return incoming, release, thread
+
+    def test_limit_blocks_acknowledge(self):
+        first, release_first, first_thread = self._enter_in_thread(
+            self.first)
+        while not first.acknowledge.called:
+            first_thread.join(0.01)
+
+        second, release_second, second_thread = self._enter_in_thread(
+            self.second)
+        release_second.set()
+        second_thread.join(0.1)
+        self.assertFalse(second.acknowledge.called)
+
+        release_first.set()
+        first_thread.join(10)
+        second_thread.join(10)
+        second.acknowledge.assert_called_once_with()
+        second.reply.assert_called_once_with(None)
+
+    def test_other_method_not_limited(self):
+        if self.endpoint_limit:
+            self.skipTest("all methods of the endpoint are limited")
+
+        first, release_first, first_thread = self._enter_in_thread('foo')
+        self.addCleanup(release_first.set)
+        while not first.acknowledge.called:
+            first_thread.join(0.01)
+
+        second, release_second, second_thread = self._enter_in_thread('bar')
+        release_second.set()
+        second_thread.join(10)
+        second.reply.assert_called_once_with(None)
+
+
+class TestExecutorPool(test_utils.BaseTestCase):
+
+    scenarios = [
+        ('method', dict(endpoint_pool=None, method='slow',
+                        pool=('slow', 2))),
+        ('endpoint', dict(endpoint_pool=('endpoint', 4), method='fast',
+                          pool=('endpoint', 4))),
+        ('method_overrides_endpoint', dict(endpoint_pool=('endpoint', 4),
+                                           method='slow', pool=('slow', 2))),
+        ('default', dict(endpoint_pool=None, method='fast', pool=None)),
+        ('invalid', dict(endpoint_pool='endpoint', method='fast', pool=None)),
+        ('no_such_method', dict(endpoint_pool=None, method='bar',
+                                pool=None)),
+    ]
+
+    def test_get_executor_pool(self):
+        class Endpoint(object):
+            executor_pool = self.endpoint_pool
+
+            @messaging.executor_pool('slow', 2)
+            def slow(self, ctxt):
+                pass
+
+            def fast(self, ctxt):
+                pass
+
+        dispatcher = messaging.RPCDispatcher(messaging.Target(),
+                                             [Endpoint()], None)
+        incoming = mock.Mock(ctxt={}, message={'method': self.method})
+
+        self.assertEqual(self.pool, dispatcher.get_executor_pool(incoming))
+
+
+class TestSequenceKey(test_utils.BaseTestCase):
+
+    scenarios = [
+        ('arg', dict(method='by_arg', ctxt={}, args={'uuid': 'a'},
+                     key=('arg', 'uuid', 'a'))),
+        ('context', dict(method='by_context', ctxt={'tenant': 't'}, args={},
+                         key=('context', 'tenant', 't'))),
+        ('missing', dict(method='by_arg', ctxt={}, args={}, key=None)),
+        ('unhashable', dict(method='by_arg', ctxt={}, args={'uuid': {}},
+                            key=None)),
+        ('not_sequential', dict(method='other', ctxt={}, args={'uuid': 'a'},
+                                key=None)),
+        ('no_such_method', dict(method='bar', ctxt={}, args={}, key=None)),
+    ]
+
+    def test_get_sequence_key(self):
+        class Endpoint(object):
+            @messaging.sequential(arg='uuid')
+            def by_arg(self, ctxt, uuid=None):
+                pass
+
+            @messaging.sequential(context='tenant')
+            def by_context(self, ctxt):
+                pass
+
+            def other(self, ctxt, uuid):
+                pass
+
+        dispatcher = messaging.RPCDispatcher(messaging.Target(),
+                                             [Endpoint()], None)
+        incoming = mock.Mock(ctxt=self.ctxt,
+                             message={'method': self.method,
+                                      'args': self.args})
+
+        self.assertEqual(self.key, dispatcher.get_sequence_key(incoming))
+
+
+class TestSequentialDecorator(test_utils.BaseTestCase):
+
+    def test_arg_or_context_required(self):
+        self.assertRaises(ValueError, messaging.sequential)
+        self.assertRaises(ValueError, messaging.sequential,
+                          arg='uuid', context='tenant')
+
+
+class TestBatched(test_utils.BaseTestCase):
+
+    def setUp(self):
+        super(TestBatched, self).setUp()
+        self.requests = []
+        self.failure = None
+
+        test = self
+
+        class Endpoint(object):
+            @messaging.batched(size=2, timeout=10)
+            def report(self, requests):
+                test.requests.append(requests)
+                if test.failure is not None:
+                    raise test.failure
+
+            @messaging.batched(size=10, timeout=0.1)
+            def report_slowly(self, requests):
+                test.requests.append(requests)
+
+        self.dispatcher = messaging.RPCDispatcher(messaging.Target(),
+                                                  [Endpoint()], None)
+
+    def _dispatch(self, method, **kwargs):
+        incoming = mock.Mock(ctxt={'user': 'u'},
+                             message={'method': method, 'args': kwargs})
+        with self.dispatcher(incoming) as callback:
+            callback()
+        return incoming
+
+    def _dispatch_in_thread(self, method, **kwargs):
+        thread = threading.Thread(target=self._dispatch, args=(method,),
+                                  kwargs=kwargs)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def test_full_batch(self):
+        thread = self._dispatch_in_thread('report', state=1)
+        while not self.dispatcher._batches:
+            thread.join(0.01)
+        self.assertEqual([], self.requests)
+
+        second = self._dispatch('report', state=2)
+        thread.join(10)
+        self.assertFalse(thread.is_alive())
+
+        self.assertEqual([[({'user': 'u'}, {'state': 1}),
+                           ({'user': 'u'}, {'state': 2})]], self.requests)
+        second.acknowledge.assert_called_once_with()
+        second.reply.assert_called_once_with(None)
+        self.assertEqual({}, self.dispatcher._batches)
+
+    def test_added_on_enter(self):
+        first = mock.Mock(ctxt={}, message={'method': 'report', 'args': {}})
+        second = mock.Mock(ctxt={}, message={'method': 'report', 'args': {}})
+
+        # The second message joins the batch as soon as it is received,
+        # before the first one started waiting in a worker.
+        with self.dispatcher(first) as wait_for_batch:
+            with self.dispatcher(second) as callback:
+                callback()
+            self.assertEqual([], self.requests)
+            wait_for_batch()
+
+        self.assertEqual(1, len(self.requests))
+        self.assertEqual(2, len(self.requests[0]))
+        second.reply.assert_called_once_with(None)
+
+    def test_timeout(self):
+        incoming = self._dispatch('report_slowly', state=1)
+
+        self.assertEqual([[({'user': 'u'}, {'state': 1})]], self.requests)
+        incoming.acknowledge.assert_called_once_with()
+        self.assertEqual({}, self.dispatcher._batches)
+
+    def test_failure(self):
+        self.failure = ValueError()
+        thread = self._dispatch_in_thread('report', state=1)
+        while not self.dispatcher._batches:
+            thread.join(0.01)
+
+        second = self._dispatch('report', state=2)
+        thread.join(10)
+
+        second.acknowledge.assert_called_once_with()
+        failure = second.reply.call_args[1]['failure']
+        self.assertIs(self.failure, failure[1])
+
+    def test_invalid_bounds(self):
+        self.assertRaises(ValueError, messaging.batched, 0, 1)
+        self.assertRaises(ValueError, messaging.batched, 1, 0)
@@ -13,12 +13,19 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import os
+import signal
 import threading
+import time
 
+import mock
 from oslo.config import cfg
 import testscenarios
+import testtools
 
 from oslo import messaging
+from oslo.messaging._executors import impl_thread
+from oslo.messaging import server as msg_server
 from tests import utils as test_utils
 
 load_tests = testscenarios.load_tests_apply_scenarios
@@ -110,6 +117,23 @@ class TestRPCServer(test_utils.BaseTestCase, ServerSetupMixin):
         self.assertIs(server.dispatcher.serializer, serializer)
         self.assertIs(server.executor, 'blocking')
 
+    def test_consumers(self):
+        transport = messaging.get_transport(self.conf, url='fake:')
+        target = messaging.Target(topic='foo', server='bar')
+        server = messaging.get_rpc_server(transport, target, [],
+                                          consumers=4)
+        self.assertEqual(4, server.consumers)
+
+        server._executor_cls = mock.Mock()
+        self.mox.StubOutWithMock(transport._driver, 'listen')
+        transport._driver.listen(target, consumers=4).AndReturn('listener')
+        self.mox.ReplayAll()
+
+        server.start()
+
+        server._executor_cls.assert_called_once_with(self.conf, 'listener',
+                                                     server.dispatcher)
+
     def test_no_target_server(self):
         transport = messaging.get_transport(self.conf, url='fake:')
 
@@ -196,6 +220,21 @@ class TestRPCServer(test_utils.BaseTestCase, ServerSetupMixin):
         else:
             self.assertTrue(False)
 
+    def test_batched_needs_concurrent_executor(self):
+        transport = messaging.get_transport(self.conf, url='fake:')
+        target = messaging.Target(topic='foo', server='bar')
+
+        class Endpoint(object):
+            @messaging.batched(size=10, timeout=1.0)
+            def report(self, requests):
+                pass
+
+        self.assertRaises(ValueError, messaging.get_rpc_server, transport,
+                          target, [Endpoint()], executor='blocking')
+        server = messaging.get_rpc_server(transport, target, [Endpoint()],
+                                          executor='eventlet')
+        self.assertEqual('eventlet', server.executor)
+
     def test_cast(self):
         transport = messaging.get_transport(self.conf, url='fake:')
 
@@ -315,6 +354,94 @@ class TestRPCServer(test_utils.BaseTestCase, ServerSetupMixin):
         self._stop_server(client, server_thread)
 
 
+@testtools.skipIf(impl_thread.futures is None, "futures not available")
+class TestWorkers(test_utils.BaseTestCase):
+
+    def setUp(self):
+        super(TestWorkers, self).setUp(conf=cfg.ConfigOpts())
+        self.stubs.Set(msg_server, '_SUPERVISE_INTERVAL', 0.1)
+
+    def _wait_for(self, predicate):
+        for i in range(100):
+            if predicate():
+                return
+            time.sleep(0.1)
+        self.fail('timed out')
+
+    def test_workers(self):
+        transport = messaging.get_transport(self.conf, url='fake:')
+        target = messaging.Target(topic='foo', server='bar')
+        server = messaging.get_rpc_server(transport, target, [],
+                                          executor='threading', workers=2)
+        server.start()
+        self.addCleanup(server.wait)
+        self.addCleanup(server.stop)
+
+        pids = list(server._worker_pids)
+        self.assertEqual(2, len(set(pids)))
+        self.assertNotIn(os.getpid(), pids)
+
+        # A worker which dies is replaced.
+        os.kill(pids[0], signal.SIGKILL)
+        self._wait_for(lambda: server._worker_pids[0] not in (None, pids[0]))
+        self.assertEqual(pids[1], server._worker_pids[1])
+
+        pids = list(server._worker_pids)
+        server.stop()
+        server.wait()
+
+        self.assertEqual([None, None], server._worker_pids)
+        for pid in pids:
+            self.assertRaises(OSError, os.kill, pid, 0)
+
+    def test_workers_need_background_executor(self):
+        transport = messaging.get_transport(self.conf, url='fake:')
+        target = messaging.Target(topic='foo', server='bar')
+
+        for executor in ('blocking', 'asyncio'):
+            self.assertRaises(ValueError, messaging.get_rpc_server,
+                              transport, target, [], executor=executor,
+                              workers=2)
+        # One worker is this process, which runs the executor itself.
+        messaging.get_rpc_server(transport, target, [], executor='blocking',
+                                 workers=1)
+
+    def test_worker_restart_backoff(self):
+        self.stubs.Set(msg_server, '_SUPERVISE_INTERVAL', 0.01)
+        self.stubs.Set(msg_server, '_RESTART_DELAY', 0.1)
+        self.stubs.Set(msg_server, '_MAX_RESTARTS', 3)
+        transport = messaging.get_transport(self.conf, url='fake:')
+        target = messaging.Target(topic='foo', server='bar')
+        server = messaging.get_rpc_server(transport, target, [],
+                                          executor='threading', workers=2)
+
+        # The workers fail as soon as they are started.
+        forks = []
+        fork_worker = server._fork_worker
+
+        def record_fork(slot):
+            forks.append(time.time())
+            fork_worker(slot)
+
+        server._run_worker = lambda: os._exit(1)
+        server._fork_worker = record_fork
+        server.start()
+        self.addCleanup(server.wait)
+        self.addCleanup(server.stop)
+
+        self._wait_for(lambda: server._worker_restarts == [3, 3] and
+                       server._worker_pids == [None, None] and
+                       server._worker_restart_at == [None, None])
+
+        # Each worker was forked once and restarted 3 times, each restart
+        # waiting twice as long as the previous one.
+        self.assertEqual(8, len(forks))
+        first, restarts = forks[0], forks[2::2]
+        self.assertTrue(restarts[0] - first >= 0.1, forks)
+        self.assertTrue(restarts[1] - restarts[0] >= 0.2, forks)
+        self.assertTrue(restarts[2] - restarts[1] >= 0.4, forks)
+
+
 class TestMultipleServers(test_utils.BaseTestCase, ServerSetupMixin):
 
     _exchanges = [
@@ -31,6 +31,7 @@ class TargetConstructorTestCase(test_utils.BaseTestCase):
         ('version', dict(kwargs=dict(version='3.4'))),
         ('server', dict(kwargs=dict(server='testserver'))),
         ('fanout', dict(kwargs=dict(fanout=True))),
+        ('routing_key', dict(kwargs=dict(routing_key='testkey'))),
     ]
 
     def test_constructor(self):
@@ -38,7 +39,7 @@ class TargetConstructorTestCase(test_utils.BaseTestCase):
         for k in self.kwargs:
             self.assertEqual(self.kwargs[k], getattr(target, k))
         for k in ['exchange', 'topic', 'namespace',
-                  'version', 'server', 'fanout']:
+                  'version', 'server', 'fanout', 'routing_key']:
             if k in self.kwargs:
                 continue
             self.assertIsNone(getattr(target, k))
@@ -84,6 +85,12 @@ class TargetCallableTestCase(test_utils.BaseTestCase):
         ('fanout_arg', dict(attrs=dict(),
                             kwargs=dict(fanout=True),
                             vals=dict(fanout=True))),
+        ('routing_key_attr', dict(attrs=dict(routing_key='testkey'),
+                                  kwargs=dict(),
+                                  vals=dict(routing_key='testkey'))),
+        ('routing_key_arg', dict(attrs=dict(),
+                                 kwargs=dict(routing_key='testkey'),
+                                 vals=dict(routing_key='testkey'))),
     ]
 
     def test_callable(self):
@@ -92,7 +99,7 @@ class TargetCallableTestCase(test_utils.BaseTestCase):
         for k in self.vals:
             self.assertEqual(self.vals[k], getattr(target, k))
         for k in ['exchange', 'topic', 'namespace',
-                  'version', 'server', 'fanout']:
+                  'version', 'server', 'fanout', 'routing_key']:
             if k in self.vals:
                 continue
             self.assertIsNone(getattr(target, k))
@@ -114,6 +121,8 @@ class TargetReprTestCase(test_utils.BaseTestCase):
                         repr='server=testserver')),
         ('fanout', dict(kwargs=dict(fanout=True),
                         repr='fanout=True')),
+        ('routing_key', dict(kwargs=dict(routing_key='testkey'),
+                             repr='routing_key=testkey')),
         ('exchange_and_fanout', dict(kwargs=dict(exchange='testexchange',
                                                  fanout=True),
                                      repr='exchange=testexchange, '
@@ -139,6 +148,7 @@ class EqualityTestCase(test_utils.BaseTestCase):
             ('version', dict(attr='version')),
             ('server', dict(attr='server')),
             ('fanout', dict(attr='fanout')),
+            ('routing_key', dict(attr='routing_key')),
         ]
         a = [
             ('a_notset', dict(a_value=_notset)),
@@ -47,3 +47,12 @@ class VersionIsCompatibleTestCase(test_utils.BaseTestCase):
 
     def test_version_is_compatible_no_rev_is_zero(self):
         self.assertTrue(utils.version_is_compatible('1.23.0', '1.23'))
+
+    def test_parsed_versions_bounded(self):
+        self.stubs.Set(utils, '_parsed_versions', {})
+        self.stubs.Set(utils, '_MAX_PARSED_VERSIONS', 2)
+        self.assertTrue(utils.version_is_compatible('1.24', '1.23'))
+        self.assertTrue(utils.version_is_compatible('1.24', '1.22'))
+        # The cache was cleared before parsing 1.22.
+        self.assertEqual({'1.22': (1, 22, 0), '1.24': (1, 24, 0)},
+                         utils._parsed_versions)